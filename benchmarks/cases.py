@@ -0,0 +1,184 @@
+"""Benchmark cases of the market data lookups and the FAA3 computation.
+
+Every case has a setup returning the operation to time and the number of lookups
+that operation does, so results are comparable as per operation times.
+"""
+import atexit
+import functools
+import random
+import shutil
+import tempfile
+import typing as t
+from dataclasses import dataclass
+
+from models.purchase import Price, Purchase
+from parser.itr import faa3_parser
+from utils import date_utils
+from utils.market_data import MarketDataService
+from utils.run_options import RunOptions
+from utils.ticker_mapping import ticker_currency_info
+
+TICKER = "goog"
+# inside both the share prices and the RBI rates present in historic_data
+START_TIME_IN_MS = date_utils.parse_named_mon("01-Jan-2023")["time_in_millis"]
+END_TIME_IN_MS = date_utils.parse_named_mon("31-Dec-2024")["time_in_millis"]
+DAY_IN_MS = date_utils.ONE_DAY_IN_MS
+LOOKUP_COUNT = 1000
+LOT_COUNTS = [10, 100, 1000]
+SEED = 7
+# every case shares the loaded market data of the repo's historic_data
+MARKET_DATA = MarketDataService()
+
+
+@dataclass
+class Case:
+    name: str
+    # returns the operation to time, it runs once before the timed runs
+    setup: t.Callable[[], t.Callable[[], t.Any]]
+    ops_per_call: int = 1
+
+
+def random_times(count: int, seed: int = SEED) -> t.List[int]:
+    rng = random.Random(seed)
+    return [
+        START_TIME_IN_MS
+        + rng.randrange((END_TIME_IN_MS - START_TIME_IN_MS) // DAY_IN_MS) * DAY_IN_MS
+        for _ in range(count)
+    ]
+
+
+def random_ranges(count: int, seed: int = SEED) -> t.List[t.Tuple[int, int]]:
+    rng = random.Random(seed)
+    ranges = []
+    for start_time_in_ms in random_times(count, seed):
+        end_time_in_ms = min(
+            END_TIME_IN_MS, start_time_in_ms + rng.randrange(1, 365) * DAY_IN_MS
+        )
+        ranges.append((start_time_in_ms, end_time_in_ms))
+    return ranges
+
+
+def synthetic_purchases(lot_count: int, seed: int = SEED) -> t.List[Purchase]:
+    rng = random.Random(seed)
+    # lots of the previous and the current period of the 2025 assessment year
+    lot_start = date_utils.parse_named_mon("01-Jan-2023")["time_in_millis"]
+    lot_days = (END_TIME_IN_MS - lot_start) // DAY_IN_MS
+    purchases = [
+        Purchase(
+            date_utils.parse_named_mon(
+                date_utils.display_time(lot_start + rng.randrange(lot_days) * DAY_IN_MS)
+            ),
+            Price(round(rng.uniform(80, 200), 2), ticker_currency_info[TICKER]),
+            round(rng.uniform(0.5, 20), 3),
+            TICKER,
+        )
+        for _ in range(lot_count)
+    ]
+    purchases.sort(key=lambda purchase: purchase.date["time_in_millis"])
+    return purchases
+
+
+def __warm(ticker: str = TICKER):
+    MARKET_DATA.get_price_series(ticker)
+    MARKET_DATA.load_rates(ticker_currency_info[ticker])
+
+
+def __fmv_lookups():
+    __warm()
+    times = random_times(LOOKUP_COUNT)
+    return lambda: [MARKET_DATA.get_fmv(TICKER, time_in_ms) for time_in_ms in times]
+
+
+def __closing_price_lookups():
+    __warm()
+    times = random_times(LOOKUP_COUNT)
+    return lambda: [
+        MARKET_DATA.get_closing_price(TICKER, time_in_ms) for time_in_ms in times
+    ]
+
+
+def __peak_price_lookups():
+    __warm()
+    ranges = random_ranges(LOOKUP_COUNT // 10)
+    return lambda: [
+        MARKET_DATA.get_peak_price_in_inr(TICKER, start_time_in_ms, end_time_in_ms)
+        for start_time_in_ms, end_time_in_ms in ranges
+    ]
+
+
+def __rbi_rate_lookups():
+    __warm()
+    currency_code = ticker_currency_info[TICKER]
+    times = random_times(LOOKUP_COUNT)
+    return lambda: [
+        MARKET_DATA.get_rate_for_prev_mon_for_time_in_ms(currency_code, time_in_ms)
+        for time_in_ms in times
+    ]
+
+
+def __matrix_rate_lookups():
+    __warm()
+    rate_source = MARKET_DATA.rate_source(ticker_currency_info[TICKER])
+    times = random_times(LOOKUP_COUNT)
+    return lambda: [rate_source.rate_at(time_in_ms) for time_in_ms in times]
+
+
+def __conversion_matrix_load():
+    MARKET_DATA.conversion_matrix_cache.pop(MARKET_DATA.rate_policy, None)
+    return MARKET_DATA.conversion_matrix()
+
+
+def __share_data_load(cold: bool):
+    def load():
+        if cold:
+            MARKET_DATA.price_series_cache.pop(TICKER, None)
+        return MARKET_DATA.get_price_series(TICKER)
+
+    return load
+
+
+def __rbi_rates_load(cold: bool):
+    currency_code = ticker_currency_info[TICKER]
+
+    def load():
+        if cold:
+            MARKET_DATA.rate_map_cache.pop(currency_code, None)
+        return MARKET_DATA.load_rates(currency_code)
+
+    return load
+
+
+def __parse_org_purchases(lot_count: int):
+    def setup():
+        __warm()
+        purchases = synthetic_purchases(lot_count)
+        output_folder = tempfile.mkdtemp(prefix="sefa-benchmark-")
+        atexit.register(functools.partial(shutil.rmtree, output_folder, ignore_errors=True))
+        return lambda: faa3_parser.parse_org_purchases(
+            TICKER,
+            "calendar",
+            purchases,
+            2025,
+            output_folder,
+            market_data=MARKET_DATA,
+            options=RunOptions(write_debug_artifacts=False),
+        )
+
+    return setup
+
+
+CASES: t.List[Case] = [
+    Case("share_data.get_fmv", __fmv_lookups, LOOKUP_COUNT),
+    Case("share_data.get_closing_price", __closing_price_lookups, LOOKUP_COUNT),
+    Case("share_data.get_peak_price_in_inr", __peak_price_lookups, LOOKUP_COUNT // 10),
+    Case("rbi_rates.get_rate_for_prev_mon", __rbi_rate_lookups, LOOKUP_COUNT),
+    Case("share_data.init_map.cold", lambda: __share_data_load(True)),
+    Case("share_data.init_map.warm", lambda: __share_data_load(False)),
+    Case("rbi_rates.init_map.cold", lambda: __rbi_rates_load(True)),
+    Case("rbi_rates.init_map.warm", lambda: __rbi_rates_load(False)),
+    Case("rates.matrix_rate_at", __matrix_rate_lookups, LOOKUP_COUNT),
+    Case("rates.conversion_matrix.cold", lambda: __conversion_matrix_load),
+] + [
+    Case(f"faa3.parse_org_purchases.{lot_count}_lots", __parse_org_purchases(lot_count))
+    for lot_count in LOT_COUNTS
+]
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""Times the market data lookups and the FAA3 computation, offline on historic_data.
+
+Usage:
+  python benchmarks/run_benchmarks.py [-k get_fmv] [-o results.json]
+      [--baseline benchmarks/baseline.json] [--save-baseline]
+
+Results are written as JSON. With a baseline(saved earlier with --save-baseline on the
+same machine) every case is compared with it and the exit code is 1 when a case got
+slower by more than --tolerance.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import typing as t
+
+# Ensure project root is on sys.path
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from benchmarks import cases as benchmark_cases
+
+BENCHMARKS_FOLDER = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_RESULTS_FILE = os.path.join(BENCHMARKS_FOLDER, "results", "latest.json")
+DEFAULT_BASELINE_FILE = os.path.join(BENCHMARKS_FOLDER, "baseline.json")
+DEFAULT_REPEAT = 5
+DEFAULT_TOLERANCE = 0.25
+RESULTS_VERSION = 1
+
+
+def __git_revision() -> t.Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=PROJECT_ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_case(case: benchmark_cases.Case, repeat: int) -> t.Dict[str, t.Any]:
+    operation = case.setup()
+    # the first call warms up what the case does not measure on purpose
+    operation()
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        operation()
+        durations.append(time.perf_counter() - start)
+    return {
+        "repeat": repeat,
+        "ops_per_call": case.ops_per_call,
+        "min_s": min(durations),
+        "median_s": statistics.median(durations),
+        "median_per_op_us": statistics.median(durations) / case.ops_per_call * 1e6,
+    }
+
+
+def run(name_filter: t.Optional[str], repeat: int) -> t.Dict[str, t.Any]:
+    results = {}
+    for case in benchmark_cases.CASES:
+        if name_filter and name_filter not in case.name:
+            continue
+        # the pipeline logs a lot, which would be measured too
+        with contextlib.redirect_stdout(io.StringIO()):
+            results[case.name] = run_case(case, repeat)
+        print(f"{case.name:<45} {results[case.name]['median_per_op_us']:>14.2f} us/op")
+    return {
+        "version": RESULTS_VERSION,
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "git_revision": __git_revision(),
+            "timestamp": int(time.time()),
+        },
+        "benchmarks": results,
+    }
+
+
+def compare(
+    results: t.Dict[str, t.Any], baseline: t.Dict[str, t.Any], tolerance: float
+) -> t.List[str]:
+    """
+    Returns the names of the cases whose median is slower than the baseline by
+    more than tolerance(0.25 = 25%)
+    """
+    regressions = []
+    print(f"\n{'case':<45} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, result in results["benchmarks"].items():
+        if name not in baseline["benchmarks"]:
+            continue
+        baseline_us = baseline["benchmarks"][name]["median_per_op_us"]
+        current_us = result["median_per_op_us"]
+        change = current_us / baseline_us - 1
+        marker = ""
+        if change > tolerance:
+            regressions.append(name)
+            marker = "  REGRESSION"
+        print(f"{name:<45} {baseline_us:>12.2f} {current_us:>12.2f} {change:>+8.1%}{marker}")
+    return regressions
+
+
+def write_json(file_abs_path: str, obj):
+    os.makedirs(os.path.dirname(file_abs_path), exist_ok=True)
+    with open(file_abs_path, "w", encoding="utf-8") as f:
+        json.dump(obj, f, indent=2, sort_keys=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks of the market data lookups and FAA3")
+    parser.add_argument(
+        "-k", dest="name_filter", default=None, help="Only run the cases whose name contains this"
+    )
+    parser.add_argument(
+        "-r", "--repeat", type=int, default=DEFAULT_REPEAT, help=f"default = {DEFAULT_REPEAT}"
+    )
+    parser.add_argument(
+        "-o", "--output", default=DEFAULT_RESULTS_FILE, help=f"default = {DEFAULT_RESULTS_FILE}"
+    )
+    parser.add_argument(
+        "--baseline", default=DEFAULT_BASELINE_FILE, help=f"default = {DEFAULT_BASELINE_FILE}"
+    )
+    parser.add_argument(
+        "--save-baseline", action="store_true", help="Store the results as the new baseline"
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=DEFAULT_TOLERANCE,
+        help=f"Allowed slowdown against the baseline, default = {DEFAULT_TOLERANCE}",
+    )
+    args = parser.parse_args()
+
+    results = run(args.name_filter, args.repeat)
+    write_json(os.path.abspath(args.output), results)
+    print(f"Results written to {os.path.abspath(args.output)}")
+    if args.save_baseline:
+        write_json(os.path.abspath(args.baseline), results)
+        print(f"Baseline written to {os.path.abspath(args.baseline)}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}, run with --save-baseline to create one")
+        return 0
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"{len(regressions)} cases regressed: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""End to end load test on synthetic workloads of growing size.
+
+Every scale gets a workload from workload_generator, which is then parsed and
+computed(calendar mode of assessment year end_year + 1) employee by employee in a
+fresh process with a market data service of the synthetic historic_data, so peak
+memory and the market data caches are per scale.
+
+Usage:
+  python benchmarks/run_load_test.py --employees 10 100 1000 --lots 24 [-o results.json]
+      [--keep-workloads /tmp/workloads]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import typing as t
+
+# Ensure project root is on sys.path
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from benchmarks import workload_generator
+from utils import profiler
+from utils.market_data import MarketDataService
+
+BENCHMARKS_FOLDER = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_RESULTS_FILE = os.path.join(BENCHMARKS_FOLDER, "results", "load_test.json")
+DEFAULT_SCALES = [10, 100]
+CALENDAR_MODE = "calendar"
+
+
+def run_workload(workload_folder_abs_path: str) -> t.Dict[str, t.Any]:
+    """
+    Parses and computes every input of a generated workload against its synthetic
+    historic_data
+    """
+    from parser.demat import source_merger
+    from parser.itr import faa3_parser
+
+    with open(
+        os.path.join(workload_folder_abs_path, workload_generator.MANIFEST_FILE_NAME),
+        encoding="utf-8",
+    ) as f:
+        manifest = json.load(f)
+    periods = [(CALENDAR_MODE, manifest["end_year"] + 1)]
+    market_data = MarketDataService(os.path.join(workload_folder_abs_path, "historic_data"))
+    parse_seconds = 0.0
+    compute_seconds = 0.0
+    lots = 0
+    with tempfile.TemporaryDirectory() as output_folder, profiler.profiling() as report:
+        for employee, each_input in enumerate(manifest["inputs"]):
+            employee_output_folder = os.path.join(output_folder, str(employee))
+            os.makedirs(employee_output_folder)
+            start = time.perf_counter()
+            purchases = source_merger.parse_inputs(
+                [each_input["file"]],
+                employee_output_folder,
+                each_input["source_mode"],
+                market_data=market_data,
+            )
+            parse_end = time.perf_counter()
+            faa3_parser.parse_periods(
+                periods, purchases, employee_output_folder, market_data=market_data
+            )
+            compute_end = time.perf_counter()
+            parse_seconds += parse_end - start
+            compute_seconds += compute_end - parse_end
+            lots += len(purchases)
+    total_seconds = parse_seconds + compute_seconds
+    return {
+        "employees": len(manifest["inputs"]),
+        "lots": lots,
+        "parse_s": parse_seconds,
+        "compute_s": compute_seconds,
+        "total_s": total_seconds,
+        "employees_per_s": len(manifest["inputs"]) / total_seconds if total_seconds else None,
+        "lots_per_s": lots / total_seconds if total_seconds else None,
+        "peak_rss_mb": report["peak_rss_mb"],
+        # per stage times and lookup counters of the whole scale
+        "profile": {"spans": report["spans"], "counters": report["counters"]},
+    }
+
+
+def run_scale(workload_folder_abs_path: str) -> t.Dict[str, t.Any]:
+    completed = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--run-workload", workload_folder_abs_path],
+        capture_output=True,
+        text=True,
+    )
+    if completed.returncode != 0:
+        raise AssertionError(
+            f"Load test of {workload_folder_abs_path} failed\n{completed.stderr}"
+        )
+    # the result is the last line, the pipeline logs before it
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End to end load test on synthetic workloads")
+    parser.add_argument(
+        "--employees",
+        nargs="+",
+        type=int,
+        default=DEFAULT_SCALES,
+        help=f"Scales to run, default = {DEFAULT_SCALES}",
+    )
+    parser.add_argument(
+        "--lots", type=int, default=24, dest="lots_per_employee", help="Lots per employee"
+    )
+    parser.add_argument("--tickers", nargs="+", default=workload_generator.DEFAULT_TICKERS)
+    parser.add_argument("--start-year", type=int, default=2022)
+    parser.add_argument("--end-year", type=int, default=2024)
+    parser.add_argument("--seed", type=int, default=workload_generator.DEFAULT_SEED)
+    parser.add_argument(
+        "-o", "--output", default=DEFAULT_RESULTS_FILE, help=f"default = {DEFAULT_RESULTS_FILE}"
+    )
+    parser.add_argument(
+        "--keep-workloads", default=None, help="Generate the workloads in this folder and keep them"
+    )
+    parser.add_argument("--run-workload", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_workload:
+        # the pipeline logs a lot, only the result goes to stdout
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = run_workload(os.path.abspath(args.run_workload))
+        print(json.dumps(result))
+        return 0
+
+    workloads_folder = (
+        os.path.abspath(args.keep_workloads) if args.keep_workloads else tempfile.mkdtemp()
+    )
+    results = []
+    try:
+        print(
+            f"{'employees':>10} {'lots':>8} {'generate_s':>11} {'parse_s':>9} {'compute_s':>10} "
+            + f"{'lots/s':>9} {'peak_rss_mb':>12}"
+        )
+        for employees in args.employees:
+            workload_folder = os.path.join(workloads_folder, f"employees_{employees}")
+            start = time.perf_counter()
+            workload_generator.generate_workload(
+                workload_folder,
+                employees,
+                args.lots_per_employee,
+                args.tickers,
+                args.start_year,
+                args.end_year,
+                seed=args.seed,
+            )
+            result = run_scale(workload_folder)
+            result["generate_s"] = time.perf_counter() - start
+            results.append(result)
+            print(
+                f"{result['employees']:>10} {result['lots']:>8} {result['generate_s']:>11.2f} "
+                + f"{result['parse_s']:>9.2f} {result['compute_s']:>10.2f} "
+                + f"{result['lots_per_s']:>9.1f} {result['peak_rss_mb']:>12.1f}"
+            )
+    finally:
+        if not args.keep_workloads:
+            shutil.rmtree(workloads_folder, ignore_errors=True)
+
+    output_file_abs_path = os.path.abspath(args.output)
+    os.makedirs(os.path.dirname(output_file_abs_path), exist_ok=True)
+    with open(output_file_abs_path, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "meta": {
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "lots_per_employee": args.lots_per_employee,
+                    "tickers": args.tickers,
+                    "years": [args.start_year, args.end_year],
+                    "seed": args.seed,
+                    "timestamp": int(time.time()),
+                },
+                "scales": results,
+            },
+            f,
+            indent=2,
+        )
+    print(f"Results written to {output_file_abs_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
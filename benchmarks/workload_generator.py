@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+"""Generates synthetic broker exports and historic_data for load tests.
+
+Nothing in the output comes from real employees or markets: prices are random walks,
+RBI rates drift around a base rate and every employee gets random ESPP/RSU lots.
+
+Usage:
+  python benchmarks/workload_generator.py -o /tmp/workload --employees 100 --lots 24
+      --tickers adbe goog --start-year 2022 --end-year 2024
+
+Output:
+  <output>/historic_data/shares/<ticker>/data.csv   same layout as the checked in data.csv
+  <output>/historic_data/rates/rbi/rates.xls        'Reference Rates' sheet like the RBI/FBIL
+                                                    download
+  <output>/inputs/employee_<n>.(xlsx|csv)           BenefitHistory, ByStatus(Sellable) or
+                                                    Morgan Stanley
+  <output>/manifest.json                            parameters, inputs and lot counts
+"""
+import argparse
+import csv
+import datetime
+import json
+import math
+import os
+import random
+import sys
+import typing as t
+
+# Ensure project root is on sys.path
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from utils.runtime_utils import warn_missing_module
+
+warn_missing_module("openpyxl")
+import openpyxl
+
+from parser.demat import source_parser
+from parser.demat.etrade import etrade_benefit_history_parser
+from parser.demat.etrade import etrade_holdings_bystatus_parser
+from utils.ticker_mapping import ticker_currency_info
+
+DEFAULT_SEED = 42
+DEFAULT_TICKERS = ["adbe", "goog"]
+DEFAULT_SOURCE_MODES = [
+    source_parser.ETRADE_BENEFIT_HISTORY_MODE,
+    source_parser.ETRADE_HOLDINGS_BYSTATUS_MODE,
+    source_parser.MORGAN_STANLEY_MODE,
+]
+BASE_INR_RATES = {"USD": 82.0, "GBP": 104.0, "EUR": 89.0}
+RBI_CURRENCY_PAIRS = {"USD": "INR / 1 USD", "GBP": "INR / 1 GBP", "EUR": "INR / 1 EUR"}
+MANIFEST_FILE_NAME = "manifest.json"
+
+
+def weekdays(start: datetime.date, end: datetime.date) -> t.Iterator[datetime.date]:
+    day = start
+    while day <= end:
+        if day.weekday() < 5:
+            yield day
+        day += datetime.timedelta(days=1)
+
+
+def generate_price_series(
+    file_abs_path: str, start: datetime.date, end: datetime.date, rng: random.Random
+) -> t.Dict[datetime.date, float]:
+    """
+    Geometric random walk of closing prices on every weekday, written newest first
+    like the Nasdaq download of data.csv
+    """
+    price = rng.uniform(50, 500)
+    prices: t.Dict[datetime.date, float] = {}
+    for day in weekdays(start, end):
+        price *= math.exp(rng.gauss(0.0003, 0.02))
+        prices[day] = round(price, 2)
+    os.makedirs(os.path.dirname(file_abs_path), exist_ok=True)
+    with open(file_abs_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Date", "Close/Last", "Volume", "Open", "High", "Low"])
+        for day in sorted(prices, reverse=True):
+            close = prices[day]
+            writer.writerow(
+                [
+                    day.strftime("%m/%d/%Y"),
+                    f"${close:.2f}",
+                    rng.randrange(1_000_000, 30_000_000),
+                    f"${close * rng.uniform(0.98, 1.02):.2f}",
+                    f"${close * rng.uniform(1.0, 1.03):.2f}",
+                    f"${close * rng.uniform(0.97, 1.0):.2f}",
+                ]
+            )
+    return prices
+
+
+def generate_rbi_rates(
+    file_abs_path: str,
+    currency_codes: t.Iterable[str],
+    start: datetime.date,
+    end: datetime.date,
+    rng: random.Random,
+):
+    """
+    Daily reference rates in the layout read by rbi_rates_utils: two title rows,
+    then Date, Time, Currency Pairs, Rate and Comments newest first
+    """
+    rates: t.Dict[str, t.List[t.Tuple[datetime.date, float]]] = {}
+    for currency_code in currency_codes:
+        rate = BASE_INR_RATES.get(currency_code, 80.0)
+        rates[currency_code] = []
+        for day in weekdays(start, end):
+            rate *= math.exp(rng.gauss(0.0001, 0.003))
+            rates[currency_code].append((day, round(rate, 4)))
+
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet("Reference Rates")
+    sheet.append(["Financial Benchmarks India Pvt Ltd"])
+    sheet.append(["Reference Rates"])
+    sheet.append(["Date", "Time", "Currency Pairs", "Rate", "Comments"])
+    rows = [
+        (day, RBI_CURRENCY_PAIRS.get(currency_code, f"INR / 1 {currency_code}"), rate)
+        for currency_code, daily_rates in rates.items()
+        for day, rate in daily_rates
+    ]
+    for day, currency_pair, rate in sorted(rows, key=lambda row: row[0], reverse=True):
+        sheet.append([day.strftime("%d %b %Y"), "1:30:00 PM", currency_pair, rate, None])
+    os.makedirs(os.path.dirname(file_abs_path), exist_ok=True)
+    # the checked in rates.xls is an xlsx workbook too
+    with open(file_abs_path, "wb") as f:
+        workbook.save(f)
+
+
+Lot = t.Tuple[datetime.date, float, float]
+
+
+def random_lots(
+    lot_count: int,
+    prices: t.Dict[datetime.date, float],
+    start: datetime.date,
+    end: datetime.date,
+    rng: random.Random,
+) -> t.List[Lot]:
+    """(date, quantity, fmv) of lots acquired on random trading days"""
+    trading_days = [day for day in prices if start <= day <= end]
+    lots = []
+    for day in sorted(rng.choice(trading_days) for _ in range(lot_count)):
+        lots.append((day, round(rng.uniform(0.5, 40), 3), prices[day]))
+    return lots
+
+
+def write_benefit_history(file_abs_path: str, ticker: str, lots: t.List[Lot], rng: random.Random):
+    """
+    ESPP and Restricted Stock sheets with the columns read by
+    etrade_benefit_history_parser, about a third of the lots are ESPP purchases
+    """
+    workbook = openpyxl.Workbook(write_only=True)
+    espp_sheet = workbook.create_sheet(etrade_benefit_history_parser.ESPP_SHEET_NAME)
+    espp_sheet.append(
+        ["Record Type", "Symbol", "Purchase Date", "Purchase Date FMV", "Sellable Qty."]
+    )
+    rsu_sheet = workbook.create_sheet(etrade_benefit_history_parser.RSU_SHEET_NAME)
+    rsu_sheet.append(
+        ["Record Type", "Symbol", "Grant Number", "Event Type", "Date", "Qty. or Amount"]
+    )
+    rsu_sheet.append(["Grant", ticker.upper(), f"RSU{rng.randrange(10**6)}", None, None, None])
+    for day, quantity, fmv in lots:
+        if rng.random() < 1 / 3:
+            espp_sheet.append(
+                [
+                    "Purchase",
+                    ticker.upper(),
+                    day.strftime("%d-%b-%Y").upper(),
+                    f"${fmv:.2f}",
+                    quantity,
+                ]
+            )
+        else:
+            rsu_sheet.append(
+                ["Event", None, None, "Shares released", day.strftime("%m/%d/%Y"), quantity]
+            )
+    workbook.save(file_abs_path)
+
+
+def write_holdings_bystatus(file_abs_path: str, ticker: str, lots: t.List[Lot]):
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet(etrade_holdings_bystatus_parser.SELLABLE_SHEET_NAME)
+    sheet.append(["Symbol", "Plan Type", "Date Acquired", "Purchase Date FMV", "Sellable Qty."])
+    for day, quantity, fmv in lots:
+        sheet.append([ticker.upper(), "RS", day.strftime("%d-%b-%Y"), f"${fmv:.2f}", quantity])
+    workbook.save(file_abs_path)
+
+
+def write_morgan_stanley(file_abs_path: str, ticker: str, lots: t.List[Lot]):
+    with open(file_abs_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(
+            ["Date", "Order Number", "Plan", "Type", "Order Status", "Price", "Quantity", "Symbol"]
+        )
+        # activity exports list the newest rows first
+        for day, quantity, fmv in reversed(lots):
+            writer.writerow(
+                [
+                    day.strftime("%d-%b-%Y"),
+                    "N/A",
+                    "GSU",
+                    "Released Shares",
+                    "Completed",
+                    f"${fmv:,.2f}",
+                    quantity,
+                    ticker.upper(),
+                ]
+            )
+
+
+def generate_workload(
+    output_folder_abs_path: str,
+    employees: int,
+    lots_per_employee: int,
+    tickers: t.List[str],
+    start_year: int,
+    end_year: int,
+    source_modes: t.List[str] = None,
+    seed: int = DEFAULT_SEED,
+) -> t.Dict[str, t.Any]:
+    """
+    Writes the synthetic historic_data and one export per employee, employees take
+    the source modes in turns. Returns the manifest which is written too
+    """
+    source_modes = source_modes or DEFAULT_SOURCE_MODES
+    for ticker in tickers:
+        if ticker not in ticker_currency_info:
+            raise AssertionError(f"Ticker {ticker} is not present in ticker_mapping")
+    rng = random.Random(seed)
+    # the rates of the month before the first lot and prices after the last period end
+    data_start = datetime.date(start_year - 1, 12, 1)
+    data_end = datetime.date(end_year + 1, 1, 31)
+    lots_start = datetime.date(start_year, 1, 1)
+    lots_end = datetime.date(end_year, 12, 31)
+
+    historic_data_folder = os.path.join(output_folder_abs_path, "historic_data")
+    ticker_prices = {
+        ticker: generate_price_series(
+            os.path.join(historic_data_folder, "shares", ticker, "data.csv"),
+            data_start,
+            data_end,
+            rng,
+        )
+        for ticker in tickers
+    }
+    generate_rbi_rates(
+        os.path.join(historic_data_folder, "rates", "rbi", "rates.xls"),
+        sorted({ticker_currency_info[ticker] for ticker in tickers}),
+        data_start,
+        data_end,
+        rng,
+    )
+
+    inputs_folder = os.path.join(output_folder_abs_path, "inputs")
+    os.makedirs(inputs_folder, exist_ok=True)
+    inputs = []
+    for employee in range(employees):
+        source_mode = source_modes[employee % len(source_modes)]
+        ticker = rng.choice(tickers)
+        lots = random_lots(lots_per_employee, ticker_prices[ticker], lots_start, lots_end, rng)
+        extension = "csv" if source_mode == source_parser.MORGAN_STANLEY_MODE else "xlsx"
+        input_file_abs_path = os.path.join(inputs_folder, f"employee_{employee:05d}.{extension}")
+        if source_mode == source_parser.ETRADE_BENEFIT_HISTORY_MODE:
+            write_benefit_history(input_file_abs_path, ticker, lots, rng)
+        elif source_mode == source_parser.ETRADE_HOLDINGS_BYSTATUS_MODE:
+            write_holdings_bystatus(input_file_abs_path, ticker, lots)
+        elif source_mode == source_parser.MORGAN_STANLEY_MODE:
+            write_morgan_stanley(input_file_abs_path, ticker, lots)
+        else:
+            raise AssertionError(f"Unsupported source_mode = {source_mode}")
+        inputs.append(
+            {
+                "file": input_file_abs_path,
+                "source_mode": source_mode,
+                "ticker": ticker,
+                "lots": len(lots),
+            }
+        )
+
+    manifest = {
+        "seed": seed,
+        "employees": employees,
+        "lots_per_employee": lots_per_employee,
+        "tickers": tickers,
+        "start_year": start_year,
+        "end_year": end_year,
+        "historic_data": historic_data_folder,
+        "inputs": inputs,
+    }
+    with open(os.path.join(output_folder_abs_path, MANIFEST_FILE_NAME), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def create_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="Generate synthetic broker exports and historic_data"
+    )
+    parser.add_argument("-o", "--output", required=True, dest="output_folder")
+    parser.add_argument("--employees", type=int, default=10)
+    parser.add_argument(
+        "--lots", type=int, default=24, dest="lots_per_employee", help="Lots per employee"
+    )
+    parser.add_argument("--tickers", nargs="+", default=DEFAULT_TICKERS)
+    parser.add_argument("--start-year", type=int, default=2022)
+    parser.add_argument("--end-year", type=int, default=2024)
+    parser.add_argument(
+        "--source-modes", nargs="+", default=DEFAULT_SOURCE_MODES, choices=DEFAULT_SOURCE_MODES
+    )
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    return parser
+
+
+def main():
+    args = create_arg_parser().parse_args()
+    manifest = generate_workload(
+        os.path.abspath(args.output_folder),
+        args.employees,
+        args.lots_per_employee,
+        args.tickers,
+        args.start_year,
+        args.end_year,
+        args.source_modes,
+        args.seed,
+    )
+    print(
+        f"Generated {len(manifest['inputs'])} inputs with "
+        + f"{sum(each['lots'] for each in manifest['inputs'])} lots under {args.output_folder}"
+    )
+
+
+if __name__ == "__main__":
+    main()
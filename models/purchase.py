@@ -1,4 +1,5 @@
 from dataclasses import dataclass
+import typing as t
 from utils.date_utils import DateObj
 
 
@@ -14,3 +15,5 @@ class Purchase:
     purchase_fmv: Price
     quantity: float
     ticker: str
+    # identity of the row in the broker export(e.g. an order number) if it has one
+    source_ref: t.Optional[str] = None
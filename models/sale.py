@@ -0,0 +1,14 @@
+from dataclasses import dataclass
+import typing as t
+from models.purchase import Price
+from utils.date_utils import DateObj
+
+
+@dataclass
+class Sale:
+    date: DateObj
+    quantity: float
+    ticker: str
+    sale_price: t.Optional[Price] = None
+    # acquisition date of the sold lot, only used for specific-ID depletion
+    lot_date: t.Optional[DateObj] = None
@@ -1,6 +1,7 @@
 import operator
 from utils.runtime_utils import warn_missing_module
-from utils import logger, file_utils, date_utils, share_data_utils
+from utils import logger, output_sinks, date_utils, ticker_mapping
+from utils.market_data import MarketDataService, default_service
 from utils.ticker_mapping import ticker_currency_info
 
 warn_missing_module("pandas")
@@ -10,8 +11,6 @@ import itertools
 
 # from openpyxl import load_workbook
 
-DEBUG = False
-
 from models.purchase import Purchase, Price
 
 ESPP_SHEET_NAME = "ESPP"
@@ -35,6 +34,9 @@ def parse_espp_row(data: pd.Series) -> t.Optional[Purchase]:
 def parse_espp(xl: pd.ExcelFile) -> t.List[Purchase]:
     logger.debug_log(f"Currently parsing {ESPP_SHEET_NAME} sheet")
     sheet_pd = xl.parse(sheet_name=ESPP_SHEET_NAME, skiprows=0, header=0)
+    ticker_mapping.validate_tickers(
+        sheet_pd.loc[sheet_pd["Record Type"] == "Purchase", "Symbol"], f"{ESPP_SHEET_NAME} sheet"
+    )
     purchases = []
     for _, data in sheet_pd.iterrows():
         parsed_purchase = parse_espp_row(data)
@@ -43,13 +45,16 @@ def parse_espp(xl: pd.ExcelFile) -> t.List[Purchase]:
     return purchases
 
 
-def parse_rsu_row(data: pd.Series, ticker: str) -> t.Optional[Purchase]:
+def parse_rsu_row(
+    data: pd.Series, ticker: str, market_data: t.Optional[MarketDataService] = None
+) -> t.Optional[Purchase]:
     if data["Event Type"] == "Shares released":
         ticker_in_lower = ticker.lower()
+        market_data = market_data or default_service()
         return Purchase(
             date=date_utils.parse_mm_dd(data["Date"]),
             purchase_fmv=Price(
-                share_data_utils.get_fmv(
+                market_data.get_fmv(
                     ticker_in_lower,
                     date_utils.parse_mm_dd(data["Date"])["time_in_millis"],
                 ),
@@ -61,9 +66,12 @@ def parse_rsu_row(data: pd.Series, ticker: str) -> t.Optional[Purchase]:
     return None
 
 
-def parse_rsu(xl: pd.ExcelFile):
+def parse_rsu(xl: pd.ExcelFile, market_data: t.Optional[MarketDataService] = None):
     logger.debug_log(f"Currently parsing {RSU_SHEET_NAME} sheet")
     sheet_pd = xl.parse(sheet_name=RSU_SHEET_NAME, skiprows=0, header=0)
+    ticker_mapping.validate_tickers(
+        sheet_pd.loc[sheet_pd["Record Type"] == "Grant", "Symbol"], f"{RSU_SHEET_NAME} sheet"
+    )
     purchases: t.List[Purchase] = []
     current_ticker = None
     for _, data in sheet_pd.iterrows():
@@ -74,49 +82,56 @@ def parse_rsu(xl: pd.ExcelFile):
                 "There is RSU event without Grant event(which contains the ticker info)"
                 + f" hence no ticker info is found while parsing {RSU_SHEET_NAME}"
             )
-            parsed_purchase = parse_rsu_row(data, current_ticker)
+            parsed_purchase = parse_rsu_row(data, current_ticker, market_data)
             if parsed_purchase is not None:
                 purchases.append(parsed_purchase)
     return purchases
 
 
-def parse(input_file_abs_path: str, output_folder_abs_path: str) -> t.List[Purchase]:
-    logger.DEBUG = DEBUG
-    purchases: t.List[Purchase] = []
-    with pd.ExcelFile(input_file_abs_path, engine="openpyxl") as xl:
-        sheet_names = xl.sheet_names
-        logger.log(f"Total sheets being process {sheet_names}")
-        if ESPP_SHEET_NAME not in sheet_names and RSU_SHEET_NAME not in sheet_names:
-            logger.log(
-                f"Excel sheet don't have either {ESPP_SHEET_NAME} or {RSU_SHEET_NAME}"
-            )
-            return []
-        espp_purchases = parse_espp(xl)
-        purchases.extend(espp_purchases)
-
-        rsu_purchases = parse_rsu(xl)
-        purchases.extend(rsu_purchases)
-
-        # logger.log_json(espp_purchases)
-        # logger.log_json(rsu_purchases)
-
-    purchases.sort(
-        key=lambda purchase: purchase.date["time_in_millis"],
-    )
-    file_utils.write_to_file(
-        output_folder_abs_path,
-        "purchases.json",
-        purchases,
-        True,
-    )
-
-    ticker_shares_map: t.Dict[str, list[Purchase]] = {}
-    for ticker, ticker_purchases in itertools.groupby(
-        purchases, key=operator.attrgetter("ticker")
-    ):
-        ticker_shares_map[ticker] = list(ticker_purchases)
-        print(
-            f"{ticker}: Total shares present in the sheet "
-            + f"= {sum(map(lambda x:x.quantity, ticker_shares_map[ticker]))}"
+def parse(
+    input_file_abs_path: str,
+    output_folder_abs_path: str,
+    market_data: t.Optional[MarketDataService] = None,
+    write_debug_artifacts: bool = True,
+    debug: bool = False,
+) -> t.List[Purchase]:
+    # debug only adds to the debug logs of the caller
+    with logger.debug_context(debug or logger.is_debug()):
+        purchases: t.List[Purchase] = []
+        with pd.ExcelFile(input_file_abs_path, engine="openpyxl") as xl:
+            sheet_names = xl.sheet_names
+            logger.log(f"Total sheets being process {sheet_names}")
+            if ESPP_SHEET_NAME not in sheet_names and RSU_SHEET_NAME not in sheet_names:
+                logger.log(
+                    f"Excel sheet don't have either {ESPP_SHEET_NAME} or {RSU_SHEET_NAME}"
+                )
+                return []
+            espp_purchases = parse_espp(xl)
+            purchases.extend(espp_purchases)
+
+            rsu_purchases = parse_rsu(xl, market_data)
+            purchases.extend(rsu_purchases)
+
+            # logger.log_json(espp_purchases)
+            # logger.log_json(rsu_purchases)
+
+        purchases.sort(
+            key=lambda purchase: purchase.date["time_in_millis"],
         )
-    return purchases
+        output_sinks.write_debug_artifact(
+            output_folder_abs_path,
+            "purchases.json",
+            purchases,
+            write_debug_artifacts,
+        )
+
+        ticker_shares_map: t.Dict[str, list[Purchase]] = {}
+        for ticker, ticker_purchases in itertools.groupby(
+            purchases, key=operator.attrgetter("ticker")
+        ):
+            ticker_shares_map[ticker] = list(ticker_purchases)
+            print(
+                f"{ticker}: Total shares present in the sheet "
+                + f"= {sum(map(lambda x:x.quantity, ticker_shares_map[ticker]))}"
+            )
+        return purchases
@@ -0,0 +1,97 @@
+from utils.runtime_utils import warn_missing_module
+from utils.ticker_mapping import ticker_currency_info
+from utils import logger, output_sinks, date_utils, ticker_mapping
+
+warn_missing_module("pandas")
+warn_missing_module("openpyxl")
+import pandas as pd
+import typing as t
+
+from models.purchase import Price
+from models.sale import Sale
+
+GAINS_AND_LOSSES_SHEET_NAME = "G&L_Expanded"
+SELL_RECORD_TYPE = "Sell"
+
+
+def __parse_date(value) -> t.Optional[date_utils.DateObj]:
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    # Excel may store the dates as real dates instead of 04/15/2021 strings
+    if hasattr(value, "strftime"):
+        return date_utils.parse_mm_dd(value.strftime("%m/%d/%Y"))
+    return date_utils.parse_mm_dd(str(value).strip())
+
+
+def __parse_price(value) -> t.Optional[float]:
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    if isinstance(value, str):
+        return float(value.strip().replace("$", "").replace(",", ""))
+    return float(value)
+
+
+def parse_sell_row(data: pd.Series) -> t.Optional[Sale]:
+    if data["Record Type"] != SELL_RECORD_TYPE:
+        return None
+    ticker = data["Symbol"].lower()
+    proceeds_per_share = __parse_price(data.get("Proceeds Per Share"))
+    return Sale(
+        date=__parse_date(data["Date Sold"]),
+        quantity=float(data["Qty."]),
+        ticker=ticker,
+        sale_price=(
+            Price(proceeds_per_share, ticker_currency_info[ticker])
+            if proceeds_per_share is not None
+            else None
+        ),
+        lot_date=__parse_date(data.get("Date Acquired")),
+    )
+
+
+def parse_sells(xl: pd.ExcelFile) -> t.List[Sale]:
+    logger.debug_log(f"Currently parsing {GAINS_AND_LOSSES_SHEET_NAME} sheet")
+    sheet_pd = xl.parse(sheet_name=GAINS_AND_LOSSES_SHEET_NAME, skiprows=0, header=0)
+    ticker_mapping.validate_tickers(
+        sheet_pd.loc[sheet_pd["Record Type"] == SELL_RECORD_TYPE, "Symbol"],
+        f"{GAINS_AND_LOSSES_SHEET_NAME} sheet",
+    )
+    sales = []
+    for _, data in sheet_pd.iterrows():
+        parsed_sale = parse_sell_row(data)
+        if parsed_sale is not None:
+            sales.append(parsed_sale)
+    return sales
+
+
+def parse(
+    input_file_abs_path: str,
+    output_folder_abs_path: str,
+    write_debug_artifacts: bool = True,
+    debug: bool = False,
+) -> t.List[Sale]:
+    """
+    Parses the sell records of the `Gains & Losses` export(G&L_Expanded.xlsx) of
+    ETRADE, they are used to deplete the lots of the other exports
+    """
+    # debug only adds to the debug logs of the caller
+    with logger.debug_context(debug or logger.is_debug()):
+        sales: t.List[Sale] = []
+        with pd.ExcelFile(input_file_abs_path, engine="openpyxl") as xl:
+            sheet_names = xl.sheet_names
+            logger.log(f"Total sheets being process {sheet_names}")
+            if GAINS_AND_LOSSES_SHEET_NAME not in sheet_names:
+                logger.log(f"Excel sheet don't have {GAINS_AND_LOSSES_SHEET_NAME}")
+                return []
+            sales = parse_sells(xl)
+
+        sales.sort(
+            key=lambda sale: sale.date["time_in_millis"],
+        )
+        output_sinks.write_debug_artifact(
+            output_folder_abs_path,
+            "sales.json",
+            sales,
+            write_debug_artifacts,
+        )
+        return sales
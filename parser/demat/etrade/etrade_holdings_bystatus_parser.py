@@ -1,7 +1,7 @@
 import operator
 from utils.runtime_utils import warn_missing_module
 from utils.ticker_mapping import ticker_currency_info
-from utils import logger, file_utils, date_utils
+from utils import logger, output_sinks, date_utils, ticker_mapping
 
 warn_missing_module("pandas")
 warn_missing_module("openpyxl")
@@ -11,8 +11,6 @@ import itertools
 
 # from openpyxl import load_workbook
 
-DEBUG = False
-
 from models.purchase import Purchase, Price
 
 SELLABLE_SHEET_NAME = "Sellable"
@@ -38,6 +36,10 @@ def parse_sellable_row(data: pd.Series) -> t.Optional[Purchase]:
 def parse_sellable(xl: pd.ExcelFile) -> t.List[Purchase]:
     logger.debug_log(f"Currently parsing {SELLABLE_SHEET_NAME} sheet")
     sheet_pd = xl.parse(sheet_name=SELLABLE_SHEET_NAME, skiprows=0, header=0)
+    ticker_mapping.validate_tickers(
+        sheet_pd.loc[sheet_pd["Date Acquired"].map(lambda date: isinstance(date, str)), "Symbol"],
+        f"{SELLABLE_SHEET_NAME} sheet",
+    )
     purchases = []
     for _, data in sheet_pd.iterrows():
         parsed_purchase = parse_sellable_row(data)
@@ -46,37 +48,43 @@ def parse_sellable(xl: pd.ExcelFile) -> t.List[Purchase]:
     return purchases
 
 
-def parse(input_file_abs_path: str, output_folder_abs_path: str) -> t.List[Purchase]:
-    logger.DEBUG = DEBUG
-    purchases: t.List[Purchase] = []
-    with pd.ExcelFile(input_file_abs_path, engine="openpyxl") as xl:
-        sheet_names = xl.sheet_names
-        logger.log(f"Total sheets being process {sheet_names}")
-        if SELLABLE_SHEET_NAME not in sheet_names:
-            logger.log(f"Excel sheet don't have either {SELLABLE_SHEET_NAME}")
-            return []
-        purchases = parse_sellable(xl)
+def parse(
+    input_file_abs_path: str,
+    output_folder_abs_path: str,
+    write_debug_artifacts: bool = True,
+    debug: bool = False,
+) -> t.List[Purchase]:
+    # debug only adds to the debug logs of the caller
+    with logger.debug_context(debug or logger.is_debug()):
+        purchases: t.List[Purchase] = []
+        with pd.ExcelFile(input_file_abs_path, engine="openpyxl") as xl:
+            sheet_names = xl.sheet_names
+            logger.log(f"Total sheets being process {sheet_names}")
+            if SELLABLE_SHEET_NAME not in sheet_names:
+                logger.log(f"Excel sheet don't have either {SELLABLE_SHEET_NAME}")
+                return []
+            purchases = parse_sellable(xl)
 
-        # logger.log_json(espp_purchases)
-        # logger.log_json(rsu_purchases)
-
-    # purchases.sort(
-    #    key=lambda purchase: purchase.date["time_in_millis"],
-    # )
-    file_utils.write_to_file(
-        output_folder_abs_path,
-        "purchases.json",
-        purchases,
-        True,
-    )
+            # logger.log_json(espp_purchases)
+            # logger.log_json(rsu_purchases)
 
-    ticker_shares_map: t.Dict[str, list[Purchase]] = {}
-    for ticker, ticker_purchases in itertools.groupby(
-        purchases, key=operator.attrgetter("ticker")
-    ):
-        ticker_shares_map[ticker] = list(ticker_purchases)
-        print(
-            f"{ticker}: Total shares present in the "
-            + f"sheet = {sum(map(lambda x:x.quantity, ticker_shares_map[ticker]))}"
+        purchases.sort(
+            key=lambda purchase: purchase.date["time_in_millis"],
         )
-    return purchases
+        output_sinks.write_debug_artifact(
+            output_folder_abs_path,
+            "purchases.json",
+            purchases,
+            write_debug_artifacts,
+        )
+
+        ticker_shares_map: t.Dict[str, list[Purchase]] = {}
+        for ticker, ticker_purchases in itertools.groupby(
+            purchases, key=operator.attrgetter("ticker")
+        ):
+            ticker_shares_map[ticker] = list(ticker_purchases)
+            print(
+                f"{ticker}: Total shares present in the "
+                + f"sheet = {sum(map(lambda x:x.quantity, ticker_shares_map[ticker]))}"
+            )
+        return purchases
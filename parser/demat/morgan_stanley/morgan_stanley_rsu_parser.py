@@ -1,10 +1,68 @@
 import typing as t
-from utils import date_utils, share_data_utils
+from utils import date_utils, ticker_mapping
+from utils.market_data import MarketDataService, default_service
 from utils.ticker_mapping import ticker_currency_info
 from models.purchase import Purchase, Price
+from models.sale import Sale
 
 import pandas as pd
 
+# candidate headers of every field in order of preference
+DATE_COLUMNS = ["Date", "Vest Date", "VestDate", "Trade Date", "Transaction Date"]
+SALE_DATE_COLUMNS = ["Date", "Trade Date", "Transaction Date", "Settlement Date"]
+TYPE_COLUMNS = ["Type", "Order Type"]
+STATUS_COLUMNS = ["Order Status", "Status"]
+QUANTITY_COLUMNS = ["Net Share Proceeds", "Quantity", "Qty. or Amount", "Qty"]
+PRICE_COLUMNS = ["Price"]
+SYMBOL_COLUMNS = ["Symbol"]
+ORDER_NUMBER_COLUMNS = ["Order Number"]
+
+ColumnMapping = t.TypedDict(
+    "ColumnMapping",
+    {
+        "date": t.Optional[str],
+        "sale_date": t.Optional[str],
+        "type": t.Optional[str],
+        "status": t.Optional[str],
+        # all the present quantity headers, the first non empty one is used per row
+        "quantity": t.List[str],
+        "price": t.Optional[str],
+        "symbol": t.Optional[str],
+        "order_number": t.Optional[str],
+    },
+)
+
+
+def resolve_columns(columns: t.Iterable[str]) -> ColumnMapping:
+    """
+    Maps the header row of an export to the columns used by the parser, it only
+    needs the header so it can be resolved without loading the rows
+    """
+    present = [str(column) for column in columns]
+
+    def first(candidates: t.List[str]) -> t.Optional[str]:
+        return next((c for c in candidates if c in present), None)
+
+    return ColumnMapping(
+        date=first(DATE_COLUMNS),
+        sale_date=first(SALE_DATE_COLUMNS),
+        type=first(TYPE_COLUMNS),
+        status=first(STATUS_COLUMNS),
+        quantity=[c for c in QUANTITY_COLUMNS if c in present],
+        price=first(PRICE_COLUMNS),
+        symbol=first(SYMBOL_COLUMNS),
+        order_number=first(ORDER_NUMBER_COLUMNS),
+    )
+
+
+def used_columns(columns: ColumnMapping) -> t.List[str]:
+    used = [
+        columns[field]
+        for field in ("date", "sale_date", "type", "status", "price", "symbol", "order_number")
+        if columns[field] is not None
+    ]
+    return list(dict.fromkeys(used + columns["quantity"]))
+
 
 def _parse_number(val) -> float:
     if val is None:
@@ -20,19 +78,7 @@ def _parse_number(val) -> float:
         return 0.0
 
 
-def parse_rsu_df(df: pd.DataFrame, ticker: t.Optional[str] = None) -> t.List[Purchase]:
-    """Parse a Morgan Stanley RSU-like DataFrame and return list of Purchase objects.
-
-    Assumptions / behaviour:
-    - The DataFrame should have columns: 'Date', 'Type' (with 'Released Shares'),
-      'Order Status' (ideally 'Completed') and 'Quantity'.
-    - If `ticker` is not provided, the parser will try to read a 'Symbol' column.
-      If neither is available it will raise AssertionError.
-    - Date format expected: 25-Dec-2024 (%%d-%%b-%%Y)
-    """
-    purchases: t.List[Purchase] = []
-
-    # determine ticker
+def _determine_ticker(df: pd.DataFrame, ticker: t.Optional[str]) -> str:
     determined_ticker = None
     if ticker:
         determined_ticker = ticker.lower()
@@ -45,32 +91,60 @@ def parse_rsu_df(df: pd.DataFrame, ticker: t.Optional[str] = None) -> t.List[Pur
     assert (
         determined_ticker is not None
     ), "Ticker not found: please pass `ticker` or include a 'Symbol' column"
-    # normalize some common column name variants locally
-    # prefer date header variants like 'Vest Date', 'Date'
-    date_candidates = ["Date", "Vest Date", "VestDate", "Trade Date", "Transaction Date"]
-    status_candidates = ["Order Status", "Status"]
-    qty_candidates = ["Net Share Proceeds", "Quantity", "Qty. or Amount", "Qty"]
-
-    # rename detected date column to 'Date' so parsing below is consistent
-    for c in date_candidates:
-        if c in df.columns and c != "Date":
-            df.rename(columns={c: "Date"}, inplace=True)
-            break
-
-    # rename status column to 'Order Status' if needed
-    for c in status_candidates:
-        if c in df.columns and c != "Order Status":
-            df.rename(columns={c: "Order Status"}, inplace=True)
-            break
+    return determined_ticker
 
-    for _, row in df.iterrows():
-        typ = None
-        if "Type" in df.columns:
-            typ = row.get("Type")
-        elif "Order Type" in df.columns:
-            typ = row.get("Order Type")
 
-        status = row.get("Order Status") if "Order Status" in df.columns else None
+def _parse_date(date_str) -> t.Optional[date_utils.DateObj]:
+    if date_str is None or str(date_str).strip() == "" or pd.isna(date_str):
+        return None
+    # date_str may already be a string in DD-Mon-YYYY or a datetime object
+    if hasattr(date_str, "strftime"):
+        return date_utils.parse_named_mon(date_str.strftime("%d-%b-%Y"))
+    return date_utils.parse_named_mon(str(date_str).strip())
+
+
+def _order_number(row: pd.Series, columns: ColumnMapping) -> t.Optional[str]:
+    if columns["order_number"] is None:
+        return None
+    value = row.get(columns["order_number"])
+    if value is None or pd.isna(value) or str(value).strip() in ("", "N/A"):
+        return None
+    return f"ms:{str(value).strip()}"
+
+
+def parse_rsu_df(
+    df: pd.DataFrame,
+    ticker: t.Optional[str] = None,
+    columns: t.Optional[ColumnMapping] = None,
+    market_data: t.Optional[MarketDataService] = None,
+) -> t.List[Purchase]:
+    """Parse a Morgan Stanley RSU-like DataFrame and return list of Purchase objects.
+
+    Assumptions / behaviour:
+    - The DataFrame should have columns: 'Date', 'Type' (with 'Released Shares'),
+      'Order Status' (ideally 'Completed') and 'Quantity'.
+    - If `ticker` is not provided, the parser will try to read a 'Symbol' column.
+      If neither is available it will raise AssertionError.
+    - Date format expected: 25-Dec-2024 (%%d-%%b-%%Y)
+    - `columns` is the mapping of the header(see resolve_columns), it is resolved
+      from df when not passed
+    - FMV of the release dates is looked up in `market_data`, the default
+      service(repo historic_data) when not passed
+    """
+    purchases: t.List[Purchase] = []
+    market_data = market_data or default_service()
+
+    # determine ticker
+    determined_ticker = _determine_ticker(df, ticker)
+    ticker_mapping.validate_tickers([determined_ticker], "the Morgan Stanley file")
+    if columns is None:
+        columns = resolve_columns(df.columns)
+    if columns["type"] is None:
+        return purchases
+
+    for _, row in df.iterrows():
+        typ = row.get(columns["type"])
+        status = row.get(columns["status"]) if columns["status"] is not None else None
 
         if typ is None:
             continue
@@ -80,7 +154,7 @@ def parse_rsu_df(df: pd.DataFrame, ticker: t.Optional[str] = None) -> t.List[Pur
         if ("release" in typ_s) and (
             status is None or "complete" in str(status).strip().lower()
         ):
-            date_str = row.get("Date")
+            date_str = row.get(columns["date"]) if columns["date"] is not None else None
             if not date_str or str(date_str).strip() == "":
                 continue
             # date_str may already be a string in DD-Mon-YYYY or a datetime object
@@ -92,16 +166,16 @@ def parse_rsu_df(df: pd.DataFrame, ticker: t.Optional[str] = None) -> t.List[Pur
 
             # find quantity from preferred candidates (Net Share Proceeds first)
             qty_val = None
-            for qc in qty_candidates:
-                if qc in df.columns:
-                    qty_val = row.get(qc)
-                    if qty_val is not None and str(qty_val).strip() != "":
-                        break
+            for qc in columns["quantity"]:
+                qty_val = row.get(qc)
+                # empty Excel cells are read as NaN
+                if qty_val is not None and not pd.isna(qty_val) and str(qty_val).strip() != "":
+                    break
 
             quantity = _parse_number(qty_val)
 
-            # obtain FMV using share_data_utils (consistent with other parsers)
-            fmv = share_data_utils.get_fmv(determined_ticker, date_obj["time_in_millis"])
+            # obtain FMV using the market data (consistent with other parsers)
+            fmv = market_data.get_fmv(determined_ticker, date_obj["time_in_millis"])
             currency = ticker_currency_info.get(determined_ticker, "USD")
             purchases.append(
                 Purchase(
@@ -109,34 +183,111 @@ def parse_rsu_df(df: pd.DataFrame, ticker: t.Optional[str] = None) -> t.List[Pur
                     purchase_fmv=Price(fmv, currency),
                     quantity=quantity,
                     ticker=determined_ticker,
+                    source_ref=_order_number(row, columns),
                 )
             )
 
+    # activity exports may list the newest rows first, callers merge date sorted streams
+    purchases.sort(key=lambda purchase: purchase.date["time_in_millis"])
     return purchases
 
 
+def parse_sales_df(
+    df: pd.DataFrame,
+    ticker: t.Optional[str] = None,
+    columns: t.Optional[ColumnMapping] = None,
+) -> t.List[Sale]:
+    """Parse the completed sale rows of a Morgan Stanley activity DataFrame.
+
+    Rows whose 'Type'(or 'Order Type') mentions a sale/sell are picked, the sold
+    quantity is read from 'Quantity' and the price per share from 'Price'.
+    """
+    determined_ticker = _determine_ticker(df, ticker)
+    if columns is None:
+        columns = resolve_columns(df.columns)
+    type_col = columns["type"]
+    status_col = columns["status"]
+    date_col = columns["sale_date"]
+    if type_col is None or date_col is None or "Quantity" not in df.columns:
+        return []
+
+    currency = ticker_currency_info.get(determined_ticker, "USD")
+    sales: t.List[Sale] = []
+    for _, row in df.iterrows():
+        typ_s = str(row.get(type_col)).strip().lower()
+        status = row.get(status_col) if status_col is not None else None
+        if not any(word in typ_s for word in ("sale", "sell", "sold")):
+            continue
+        if status is not None and "complete" not in str(status).strip().lower():
+            continue
+        date_obj = _parse_date(row.get(date_col))
+        if date_obj is None:
+            continue
+        sales.append(
+            Sale(
+                date=date_obj,
+                # sale quantities may be reported as negative numbers
+                quantity=abs(_parse_number(row.get("Quantity"))),
+                ticker=determined_ticker,
+                sale_price=(
+                    Price(_parse_number(row.get(columns["price"])), currency)
+                    if columns["price"] is not None
+                    else None
+                ),
+            )
+        )
+    sales.sort(key=lambda sale: sale.date["time_in_millis"])
+    return sales
+
+
+def read_df(
+    input_file_abs_path: str, columns: t.Optional[ColumnMapping] = None
+) -> pd.DataFrame:
+    """
+    Reads the first sheet(or the CSV), with a column mapping only its columns are
+    loaded
+    """
+    usecols = used_columns(columns) if columns is not None else None
+    if str(input_file_abs_path).lower().endswith(".csv"):
+        return pd.read_csv(input_file_abs_path, usecols=usecols)
+    # try excel
+    with pd.ExcelFile(input_file_abs_path, engine="openpyxl") as xl:
+        # pick first sheet by default
+        return xl.parse(xl.sheet_names[0], skiprows=0, header=0, usecols=usecols)
+
+
+def parse_sales(
+    input_file_abs_path: str,
+    ticker: t.Optional[str] = None,
+    columns: t.Optional[ColumnMapping] = None,
+) -> t.List[Sale]:
+    """Reads CSV or Excel and returns the parsed sales, see parse_sales_df"""
+    return parse_sales_df(
+        read_df(input_file_abs_path, columns), ticker=ticker, columns=columns
+    )
+
+
 def parse(
-    input_file_abs_path: str, output_folder_abs_path: str, ticker: t.Optional[str] = None
+    input_file_abs_path: str,
+    output_folder_abs_path: str,
+    ticker: t.Optional[str] = None,
+    columns: t.Optional[ColumnMapping] = None,
+    market_data: t.Optional[MarketDataService] = None,
 ) -> t.List[Purchase]:
     """Reads CSV or Excel and returns parsed purchases.
 
     This helper supports .csv and .xlsx/.xls files. For CSV it reads directly.
     If the DataFrame contains real datetime values in the 'Date' column they are
     converted to 'DD-Mon-YYYY' string format before parsing. Optionally pass
-    `ticker` when the sheet lacks a Symbol column.
+    `ticker` when the sheet lacks a Symbol column, and `columns` when the header
+    was already resolved(e.g. by source_detector).
     """
-    if str(input_file_abs_path).lower().endswith(".csv"):
-        df = pd.read_csv(input_file_abs_path)
-    else:
-        # try excel
-        xl = pd.ExcelFile(input_file_abs_path, engine="openpyxl")
-        # pick first sheet by default
-        df = xl.parse(xl.sheet_names[0], skiprows=0, header=0)
+    df = read_df(input_file_abs_path, columns)
 
     # normalize Date if it's a datetime dtype
     if "Date" in df.columns and pd.api.types.is_datetime64_any_dtype(df["Date"]):
         df["Date"] = df["Date"].dt.strftime("%d-%b-%Y")
 
-    purchases = parse_rsu_df(df, ticker=ticker)
+    purchases = parse_rsu_df(df, ticker=ticker, columns=columns, market_data=market_data)
 
     return purchases
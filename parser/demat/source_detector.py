@@ -0,0 +1,158 @@
+import csv
+import os
+import posixpath
+import typing as t
+import xml.etree.ElementTree as ET
+import zipfile
+from dataclasses import dataclass
+
+from parser.demat import source_parser
+from parser.demat.etrade import etrade_benefit_history_parser
+from parser.demat.etrade import etrade_holdings_bystatus_parser
+from parser.demat.morgan_stanley import morgan_stanley_rsu_parser
+
+SPREADSHEET_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+RELATIONSHIP_ID_ATTR = (
+    "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id"
+)
+PACKAGE_RELATIONSHIP_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+EXCEL_EXTENSIONS = (".xlsx", ".xlsm")
+
+
+@dataclass
+class Detection:
+    source_mode: str
+    # header mapping of the sources which have no fixed layout(Morgan Stanley)
+    columns: t.Optional[morgan_stanley_rsu_parser.ColumnMapping] = None
+
+
+def __column_index(cell_reference: str) -> int:
+    index = 0
+    for char in cell_reference:
+        if not char.isalpha():
+            break
+        index = index * 26 + ord(char.upper()) - ord("A") + 1
+    return index - 1
+
+
+def __element_text(element: ET.Element) -> str:
+    # rich text cells are split in runs, each with its own <t>
+    return "".join(text.text or "" for text in element.iter(f"{SPREADSHEET_NS}t"))
+
+
+def __workbook_sheets(xlsx: zipfile.ZipFile) -> t.List[t.Tuple[str, str]]:
+    """
+    Names of the sheets of the workbook in order, along with their part names
+    """
+    workbook = ET.fromstring(xlsx.read("xl/workbook.xml"))
+    relationships = ET.fromstring(xlsx.read("xl/_rels/workbook.xml.rels"))
+    targets = {
+        relationship.get("Id"): relationship.get("Target")
+        for relationship in relationships.iter(f"{PACKAGE_RELATIONSHIP_NS}Relationship")
+    }
+    sheets = []
+    for sheet in workbook.iter(f"{SPREADSHEET_NS}sheet"):
+        target = targets[sheet.get(RELATIONSHIP_ID_ATTR)]
+        part_name = (
+            target.lstrip("/") if target.startswith("/") else posixpath.join("xl", target)
+        )
+        sheets.append((sheet.get("name"), posixpath.normpath(part_name)))
+    return sheets
+
+
+def __shared_strings(xlsx: zipfile.ZipFile, indices: t.Set[int]) -> t.Dict[int, str]:
+    """
+    Streams the shared strings table only up to the largest of indices
+    """
+    strings: t.Dict[int, str] = {}
+    if not indices or "xl/sharedStrings.xml" not in xlsx.namelist():
+        return strings
+    last_index = max(indices)
+    with xlsx.open("xl/sharedStrings.xml") as f:
+        index = 0
+        for _, element in ET.iterparse(f):
+            if element.tag != f"{SPREADSHEET_NS}si":
+                continue
+            if index in indices:
+                strings[index] = __element_text(element)
+            element.clear()
+            if index == last_index:
+                break
+            index += 1
+    return strings
+
+
+def __first_row(xlsx: zipfile.ZipFile, part_name: str) -> t.List[str]:
+    """
+    Values of the first row of a sheet, the rest of the sheet is never decompressed
+    """
+    cells: t.Dict[int, t.Tuple[t.Optional[str], str]] = {}
+    with xlsx.open(part_name) as f:
+        for _, element in ET.iterparse(f):
+            if element.tag == f"{SPREADSHEET_NS}c":
+                cell_type = element.get("t")
+                if cell_type == "inlineStr":
+                    value = __element_text(element)
+                else:
+                    value_element = element.find(f"{SPREADSHEET_NS}v")
+                    value = value_element.text if value_element is not None else ""
+                cells[__column_index(element.get("r", ""))] = (cell_type, value or "")
+            elif element.tag == f"{SPREADSHEET_NS}row":
+                break
+    shared_strings = __shared_strings(
+        xlsx, {int(value) for cell_type, value in cells.values() if cell_type == "s"}
+    )
+    row = [""] * (max(cells) + 1 if cells else 0)
+    for column, (cell_type, value) in cells.items():
+        row[column] = shared_strings.get(int(value), "") if cell_type == "s" else value
+    return row
+
+
+def read_excel_layout(input_file_abs_path: str) -> t.Tuple[t.List[str], t.List[str]]:
+    """
+    Sheet names of a workbook and the header row of its first sheet, read straight
+    from the zip parts instead of loading the workbook
+    """
+    with zipfile.ZipFile(input_file_abs_path) as xlsx:
+        sheets = __workbook_sheets(xlsx)
+        header = __first_row(xlsx, sheets[0][1]) if sheets else []
+    return [sheet_name for sheet_name, _ in sheets], header
+
+
+def read_csv_header(input_file_abs_path: str) -> t.List[str]:
+    with open(input_file_abs_path, newline="", encoding="utf-8-sig") as f:
+        return next(csv.reader(f), [])
+
+
+def detect_from_layout(
+    sheet_names: t.List[str], header: t.List[str]
+) -> t.Optional[Detection]:
+    if (
+        etrade_benefit_history_parser.ESPP_SHEET_NAME in sheet_names
+        or etrade_benefit_history_parser.RSU_SHEET_NAME in sheet_names
+    ):
+        return Detection(source_parser.ETRADE_BENEFIT_HISTORY_MODE)
+    if etrade_holdings_bystatus_parser.SELLABLE_SHEET_NAME in sheet_names:
+        return Detection(source_parser.ETRADE_HOLDINGS_BYSTATUS_MODE)
+    columns = morgan_stanley_rsu_parser.resolve_columns(header)
+    if columns["type"] is not None and columns["date"] is not None and columns["quantity"]:
+        return Detection(source_parser.MORGAN_STANLEY_MODE, columns)
+    return None
+
+
+def detect(input_file_abs_path: str) -> t.Optional[Detection]:
+    """
+    Sniffs the source mode of a broker export from its sheet names or header row,
+    None is returned for files which none of the parsers understand
+    """
+    extension = os.path.splitext(input_file_abs_path)[1].lower()
+    if extension == ".json":
+        return Detection(source_parser.PURCHASES_JSON_MODE)
+    if extension == ".csv":
+        return detect_from_layout([], read_csv_header(input_file_abs_path))
+    if extension in EXCEL_EXTENSIONS:
+        try:
+            return detect_from_layout(*read_excel_layout(input_file_abs_path))
+        except (zipfile.BadZipFile, KeyError, ET.ParseError):
+            return None
+    return None
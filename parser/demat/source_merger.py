@@ -0,0 +1,254 @@
+import heapq
+import typing as t
+
+from models.purchase import Purchase
+from models.sale import Sale
+from parser.demat import source_detector, source_parser
+from parser.demat.etrade import etrade_gains_and_losses_parser
+from parser.demat.morgan_stanley import morgan_stanley_rsu_parser
+from utils import logger, output_sinks, profiler
+from utils.market_data import MarketDataService
+from utils.run_options import RunOptions
+
+ETRADE_GAINS_AND_LOSSES_SALES_MODE = "etrade_gains_and_losses"
+MORGAN_STANLEY_SALES_MODE = "morgan_stanley"
+SALES_MODES = [ETRADE_GAINS_AND_LOSSES_SALES_MODE, MORGAN_STANLEY_SALES_MODE]
+
+# purchases and sales, both carry a date
+DatedRecord = t.TypeVar("DatedRecord")
+
+
+def __date_of(record) -> int:
+    return record.date["time_in_millis"]
+
+
+def __checked_date_sorted(
+    source_name: str, records: t.Iterable[DatedRecord]
+) -> t.Iterator[DatedRecord]:
+    previous_time_in_ms = None
+    for record in records:
+        time_in_ms = __date_of(record)
+        if previous_time_in_ms is not None and time_in_ms < previous_time_in_ms:
+            raise AssertionError(
+                f"Records of {source_name} are not sorted by date, {record.date['disp_time']} "
+                + "comes after a later date"
+            )
+        previous_time_in_ms = time_in_ms
+        yield record
+
+
+def merge_by_date(
+    streams: t.Sequence[t.Tuple[str, t.Iterable[DatedRecord]]]
+) -> t.Iterator[DatedRecord]:
+    """
+    k-way heap merge of the date sorted streams of every source(name, records),
+    records of the same date keep the order of the streams. It costs O(n log k)
+    for n records of k sources instead of sorting the concatenation
+    """
+    return heapq.merge(
+        *(__checked_date_sorted(source_name, records) for source_name, records in streams),
+        key=__date_of,
+    )
+
+
+PurchaseIdentity = t.Tuple[str, int, float, float, str, t.Optional[str]]
+SaleIdentity = t.Tuple[str, int, float, t.Optional[float], t.Optional[str], t.Optional[int]]
+
+
+def purchase_identity(purchase: Purchase) -> PurchaseIdentity:
+    return (
+        purchase.ticker,
+        purchase.date["time_in_millis"],
+        float(purchase.quantity),
+        float(purchase.purchase_fmv.price),
+        purchase.purchase_fmv.currency_code,
+        purchase.source_ref,
+    )
+
+
+def sale_identity(sale: Sale) -> SaleIdentity:
+    return (
+        sale.ticker,
+        sale.date["time_in_millis"],
+        float(sale.quantity),
+        float(sale.sale_price.price) if sale.sale_price is not None else None,
+        sale.sale_price.currency_code if sale.sale_price is not None else None,
+        sale.lot_date["time_in_millis"] if sale.lot_date is not None else None,
+    )
+
+
+class Deduplicator:
+    """
+    Hash index dropping the records which an earlier source already provided,
+    e.g. the overlapping months of two BenefitHistory or Gains & Losses downloads.
+    Exports without a row identity can legitimately hold identical rows, so the
+    n-th occurrence of an identity within a source is only a duplicate when
+    another source already provided n of them
+    """
+
+    def __init__(self, identity: t.Callable[[t.Any], t.Hashable]):
+        self.identity = identity
+        self.__accepted_counts: t.Dict[t.Hashable, int] = {}
+        self.__source_counts: t.Dict[t.Tuple[int, t.Hashable], int] = {}
+        self.duplicate_count = 0
+
+    def accept(self, source_index: int, record) -> bool:
+        identity = self.identity(record)
+        occurrence = self.__source_counts.get((source_index, identity), 0) + 1
+        self.__source_counts[(source_index, identity)] = occurrence
+        if occurrence <= self.__accepted_counts.get(identity, 0):
+            self.duplicate_count += 1
+            return False
+        self.__accepted_counts[identity] = occurrence
+        return True
+
+
+class PurchaseDeduplicator(Deduplicator):
+    """Deduplicator of the purchases, the source_ref of a row is part of its identity"""
+
+    def __init__(self):
+        super().__init__(purchase_identity)
+
+
+class SaleDeduplicator(Deduplicator):
+    """Deduplicator of the sales, identified by ticker, date, quantity, price and lot date"""
+
+    def __init__(self):
+        super().__init__(sale_identity)
+
+
+def __tagged(
+    source_index: int, records: t.Iterable[DatedRecord]
+) -> t.Iterator[t.Tuple[int, DatedRecord]]:
+    for record in records:
+        yield source_index, record
+
+
+def merge_unique(
+    streams: t.Sequence[t.Tuple[str, t.Iterable[DatedRecord]]], deduplicator: Deduplicator
+) -> t.Iterator[DatedRecord]:
+    """
+    merge_by_date of the streams which skips the duplicates across them in the
+    same pass
+    """
+    tagged_streams = [
+        __tagged(source_index, __checked_date_sorted(source_name, records))
+        for source_index, (source_name, records) in enumerate(streams)
+    ]
+    for source_index, record in heapq.merge(
+        *tagged_streams, key=lambda tagged: __date_of(tagged[1])
+    ):
+        if deduplicator.accept(source_index, record):
+            yield record
+
+
+def merge_unique_purchases(
+    streams: t.Sequence[t.Tuple[str, t.Iterable[Purchase]]],
+    deduplicator: t.Optional[PurchaseDeduplicator] = None,
+) -> t.Iterator[Purchase]:
+    return merge_unique(streams, deduplicator or PurchaseDeduplicator())
+
+
+def merge_unique_sales(
+    streams: t.Sequence[t.Tuple[str, t.Iterable[Sale]]],
+    deduplicator: t.Optional[SaleDeduplicator] = None,
+) -> t.Iterator[Sale]:
+    return merge_unique(streams, deduplicator or SaleDeduplicator())
+
+
+def parse_inputs(
+    input_file_abs_paths: t.List[str],
+    output_folder_abs_path: str,
+    source_mode: t.Optional[str] = None,
+    ticker: t.Optional[str] = None,
+    market_data: t.Optional[MarketDataService] = None,
+    options: t.Optional[RunOptions] = None,
+) -> t.List[Purchase]:
+    """
+    Parses every input with its parser(source_mode or the detected one) and merges
+    their purchases into a single date sorted stream, without the purchases which
+    overlapping inputs provide more than once
+    """
+    options = options or RunOptions()
+    streams: t.List[t.Tuple[str, t.List[Purchase]]] = []
+    for input_file_abs_path in input_file_abs_paths:
+        with profiler.span("detect_source"):
+            detection = (
+                source_detector.Detection(source_mode)
+                if source_mode is not None
+                else source_detector.detect(input_file_abs_path)
+            )
+        if detection is None:
+            raise AssertionError(
+                f"Can't detect the source mode of {input_file_abs_path}, please pass it with -m"
+            )
+        logger.log(f"Parsing {input_file_abs_path} as {detection.source_mode}")
+        with profiler.span("parse_input"):
+            purchases = source_parser.parse(
+                detection.source_mode,
+                input_file_abs_path,
+                output_folder_abs_path,
+                ticker,
+                detection.columns,
+                market_data,
+                options,
+            )
+        streams.append((input_file_abs_path, purchases))
+    if len(streams) == 1:
+        return streams[0][1]
+
+    deduplicator = PurchaseDeduplicator()
+    with profiler.span("merge_inputs"):
+        purchases = list(merge_unique_purchases(streams, deduplicator))
+    if deduplicator.duplicate_count:
+        logger.log(
+            f"Skipped {deduplicator.duplicate_count} purchases which are present in more than one "
+            + "input"
+        )
+    # the parsers write the purchases.json of their own input only
+    output_sinks.write_debug_artifact(
+        output_folder_abs_path, "purchases.json", purchases, options.write_debug_artifacts
+    )
+    return purchases
+
+
+def parse_sales_inputs(
+    sales_input_file_abs_paths: t.List[str],
+    sales_mode: str,
+    output_folder_abs_path: str,
+    ticker: t.Optional[str] = None,
+    options: t.Optional[RunOptions] = None,
+) -> t.List[Sale]:
+    """
+    Parses every sales input with the parser of sales_mode and merges their sales
+    into a single date sorted stream, without the sales which overlapping inputs
+    provide more than once
+    """
+    if sales_mode not in SALES_MODES:
+        raise AssertionError(f"Unsupported sales mode = {sales_mode}, supported = {SALES_MODES}")
+    options = options or RunOptions()
+    sales_streams: t.List[t.Tuple[str, t.List[Sale]]] = []
+    for sales_input_file_abs_path in sales_input_file_abs_paths:
+        if sales_mode == MORGAN_STANLEY_SALES_MODE:
+            sales = morgan_stanley_rsu_parser.parse_sales(sales_input_file_abs_path, ticker=ticker)
+        else:
+            # the merged sales are written once below, not the ones of every input
+            sales = etrade_gains_and_losses_parser.parse(
+                sales_input_file_abs_path,
+                output_folder_abs_path,
+                write_debug_artifacts=False,
+                debug=options.debug,
+            )
+        sales_streams.append((sales_input_file_abs_path, sales))
+    deduplicator = SaleDeduplicator()
+    with profiler.span("merge_sales_inputs"):
+        sales = list(merge_unique_sales(sales_streams, deduplicator))
+    if deduplicator.duplicate_count:
+        logger.log(
+            f"Skipped {deduplicator.duplicate_count} sales which are present in more than one input"
+        )
+    if sales_streams:
+        output_sinks.write_debug_artifact(
+            output_folder_abs_path, "sales.json", sales, options.write_debug_artifacts
+        )
+    return sales
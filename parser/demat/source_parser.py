@@ -0,0 +1,111 @@
+import json
+import typing as t
+
+from models.purchase import Price, Purchase
+from parser.demat.etrade import etrade_benefit_history_parser
+from parser.demat.etrade import etrade_holdings_bystatus_parser
+from parser.demat.morgan_stanley import morgan_stanley_rsu_parser
+from utils import logger, profiler
+from utils.market_data import MarketDataService
+from utils.run_options import RunOptions
+
+ETRADE_BENEFIT_HISTORY_MODE = "etrade_benefit_history"
+ETRADE_HOLDINGS_BYSTATUS_MODE = "etrade_holdings_bystatus"
+MORGAN_STANLEY_MODE = "morgan_stanley"
+# purchases.json written by an earlier run
+PURCHASES_JSON_MODE = "purchases_json"
+SOURCE_MODES = [
+    ETRADE_BENEFIT_HISTORY_MODE,
+    ETRADE_HOLDINGS_BYSTATUS_MODE,
+    MORGAN_STANLEY_MODE,
+    PURCHASES_JSON_MODE,
+]
+
+
+def read_purchases_json(input_file_abs_path: str) -> t.List[Purchase]:
+    with open(input_file_abs_path, encoding="utf-8") as f:
+        purchases = [
+            Purchase(
+                date=purchase["date"],
+                purchase_fmv=Price(
+                    purchase["purchase_fmv"]["price"],
+                    purchase["purchase_fmv"]["currency_code"],
+                ),
+                quantity=purchase["quantity"],
+                ticker=purchase["ticker"],
+                source_ref=purchase.get("source_ref"),
+            )
+            for purchase in json.load(f)
+        ]
+    purchases.sort(key=lambda purchase: purchase.date["time_in_millis"])
+    return purchases
+
+
+def parse(
+    source_mode: str,
+    input_file_abs_path: str,
+    output_folder_abs_path: str,
+    ticker: t.Optional[str] = None,
+    columns: t.Optional[morgan_stanley_rsu_parser.ColumnMapping] = None,
+    market_data: t.Optional[MarketDataService] = None,
+    options: t.Optional[RunOptions] = None,
+) -> t.List[Purchase]:
+    """
+    Parses the purchases of input_file_abs_path with the parser of source_mode,
+    ticker and columns(the resolved header, see source_detector) are only used by
+    the Morgan Stanley files which lack a Symbol column and a fixed layout.
+    market_data provides the FMV of the RSU releases
+    """
+    options = options or RunOptions()
+    with logger.debug_context(options.debug or logger.is_debug()):
+        purchases = __parse_purchases(
+            source_mode,
+            input_file_abs_path,
+            output_folder_abs_path,
+            ticker,
+            columns,
+            market_data,
+            options,
+        )
+    profiler.count("files_parsed", source_mode=source_mode)
+    profiler.count("purchases_parsed", len(purchases), source_mode=source_mode)
+    return purchases
+
+
+def __parse_purchases(
+    source_mode: str,
+    input_file_abs_path: str,
+    output_folder_abs_path: str,
+    ticker: t.Optional[str],
+    columns: t.Optional[morgan_stanley_rsu_parser.ColumnMapping],
+    market_data: t.Optional[MarketDataService],
+    options: RunOptions,
+) -> t.List[Purchase]:
+    if source_mode == ETRADE_BENEFIT_HISTORY_MODE:
+        return etrade_benefit_history_parser.parse(
+            input_file_abs_path,
+            output_folder_abs_path,
+            market_data,
+            options.write_debug_artifacts,
+            options.debug,
+        )
+    if source_mode == ETRADE_HOLDINGS_BYSTATUS_MODE:
+        return etrade_holdings_bystatus_parser.parse(
+            input_file_abs_path,
+            output_folder_abs_path,
+            options.write_debug_artifacts,
+            options.debug,
+        )
+    if source_mode == MORGAN_STANLEY_MODE:
+        return morgan_stanley_rsu_parser.parse(
+            input_file_abs_path,
+            output_folder_abs_path,
+            ticker=ticker,
+            columns=columns,
+            market_data=market_data,
+        )
+    if source_mode == PURCHASES_JSON_MODE:
+        return read_purchases_json(input_file_abs_path)
+    raise AssertionError(
+        f"Unsupported source_mode = {source_mode}, supported = {SOURCE_MODES}"
+    )
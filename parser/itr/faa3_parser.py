@@ -1,204 +1,736 @@
 import os
+import functools
 import typing as t
-from itertools import groupby
-import operator
+from dataclasses import dataclass
 
-from utils import date_utils, share_data_utils, file_utils
+from utils import (
+    date_utils,
+    share_data_utils,
+    output_sinks,
+    file_utils,
+    logger,
+    result_cache,
+    lot_ledger,
+    profiler,
+    ticker_mapping,
+)
+from utils.holdings_timeline import HoldingsTimeline
 from utils.ticker_mapping import ticker_org_info, ticker_currency_info
-from utils.rates import rbi_rates_utils
+from utils.market_data import MarketDataService, default_service
 from models.purchase import Purchase, Price
 from models.itr.faa3 import FAA3
+from models.sale import Sale
+from parser.itr import faa3_state
+from utils import period_snapshot
+from utils.run_options import RunOptions
 
+# (calendar_mode, assessment_year) of a report
+Period = t.Tuple[str, int]
 
-def parse_org_purchases(
+FA_ENTRY_KEYS = [
+    "Country/Region Name and Code",
+    "Name of Entity",
+    "Address of Entity",
+    "ZIP Code",
+    "Nature of Entity",
+    "Date of acquiring the interest",
+    # explicit ITR field: total gross amount paid/credited during the period (INR)
+    "Total gross amount paid/credited with respect to the holding during the period",
+    "Initial value of the investment",
+    "Peak value of the investment during the Period",
+    "Closing Value",
+]
+
+
+def fa_entry_row(entry: FAA3) -> t.Tuple:
+    return (
+        entry.org.country_name,
+        entry.org.name,
+        entry.org.address,
+        entry.org.zip_code,
+        entry.org.nature,
+        entry.purchase.date["disp_time"],
+        # purchase_price is already computed in INR for each entry
+        round(entry.purchase_price),
+        # keep original 'Initial value' for backward compatibility (duplicate of purchase_price)
+        round(entry.purchase_price),
+        round(entry.peak_price),
+        round(entry.closing_price),
+    )
+
+
+def __split_by_period(
+    lot_slices: t.Iterable[lot_ledger.LotSlice], time_ranges: t.List[t.Tuple[int, int]]
+) -> t.List[t.Tuple[t.List[lot_ledger.LotSlice], t.List[lot_ledger.LotSlice]]]:
+    """
+    Splits lot slices in a single pass into (held at period start, acquired within
+    period) lists for every time range. Slices sold before a period are left out
+    """
+    splits: t.List[t.Tuple[t.List[lot_ledger.LotSlice], t.List[lot_ledger.LotSlice]]] = [
+        ([], []) for _ in time_ranges
+    ]
+    for lot_slice in lot_slices:
+        purchase_time_in_ms = lot_slice.purchase.date["time_in_millis"]
+        sale_time_in_ms = lot_slice.sale_time_in_ms()
+        for (start_time_in_ms, end_time_in_ms), (before, after) in zip(
+            time_ranges, splits
+        ):
+            if purchase_time_in_ms < start_time_in_ms:
+                if sale_time_in_ms is None or sale_time_in_ms >= start_time_in_ms:
+                    before.append(lot_slice)
+            elif purchase_time_in_ms <= end_time_in_ms:
+                after.append(lot_slice)
+    return splits
+
+
+@dataclass(frozen=True)
+class LotValuation:
+    """
+    Quantity of a lot(or of the accumulated holdings of the previous period) with
+    the prices it is valued at and the window it peaks within
+    """
+
+    quantity: float
+    fmv_price: float
+    rbi_rate: float
+    peak_start_time_in_ms: int
+    peak_end_time_in_ms: int
+    # 0 for lots sold within the period
+    closing_inr_price: float
+    # already known peak price(e.g. from a snapshot), looked up when None
+    peak_inr_price: t.Optional[float] = None
+
+
+def __compute_values(
+    ticker: str,
+    market_data: MarketDataService,
+    lot: LotValuation,
+    inr_series: t.Callable[[], share_data_utils.InrSeries],
+) -> faa3_state.LotValues:
+    profiler.count("lots_computed")
+    quantity = lot.quantity
+    purchase_price = quantity * lot.fmv_price * lot.rbi_rate
+    peak_inr_price = lot.peak_inr_price
+    if peak_inr_price is None and lot.peak_start_time_in_ms <= lot.peak_end_time_in_ms:
+        peak_inr_price = market_data.get_peak_price_in_inr(
+            ticker, lot.peak_start_time_in_ms, lot.peak_end_time_in_ms, inr_series
+        )
+    return {
+        # compute peak price in INR for the holding: find the maximum
+        # (FMV * INR rate) while it is held within the period. This ensures
+        # peak reflects both price and FX movement correctly. If the window
+        # is empty(e.g. purchase on the last day, or sold on the day after
+        # the purchase) fall back to the purchase price as the effective peak.
+        "peak_price": (
+            quantity * peak_inr_price if peak_inr_price is not None else purchase_price
+        ),
+        "purchase_price": purchase_price,
+        "closing_price": quantity * lot.closing_inr_price,
+    }
+
+
+def __before_purchases_last_date(assessment_year: int) -> str:
+    return f"31-Dec-{assessment_year - 2}"
+
+
+def __compute_period_values(
+    ticker: str,
+    currency_code: str,
+    end_time_in_ms: int,
+    before_purchases_last_date: str,
+    market_data: MarketDataService,
+) -> faa3_state.PeriodValues:
+    closing_rbi_rate = market_data.get_rate(currency_code, end_time_in_ms)
+    closing_share_price = market_data.get_closing_price(ticker, end_time_in_ms)
+    fmv_price_on_start = market_data.get_fmv(
+        ticker, date_utils.parse_named_mon(before_purchases_last_date)["time_in_millis"]
+    )
+    return {
+        "closing_rbi_rate": closing_rbi_rate,
+        "closing_share_price": closing_share_price,
+        "fmv_price_on_start": fmv_price_on_start,
+    }
+
+
+def compute_org_entries(
     ticker: str,
     calendar_mode: str,
-    purchases: t.List[Purchase],
+    before_slices: t.List[lot_ledger.LotSlice],
+    after_slices: t.List[lot_ledger.LotSlice],
     assessment_year: int,
-    output_folder_abs_path: str,
-):
+    inr_series: t.Callable[[], share_data_utils.InrSeries],
+    state: t.Optional[faa3_state.Faa3State] = None,
+    market_data: t.Optional[MarketDataService] = None,
+    timeline: t.Optional[HoldingsTimeline] = None,
+    snapshot: t.Optional[period_snapshot.PeriodSnapshot] = None,
+) -> t.List[FAA3]:
+    """
+    Computes FA entries of one period for lot slices already split around the
+    period start. Slices sold within the period peak until the sale date and have
+    no closing value. inr_series returns the per-day INR series covering the
+    period, it is only called when some value is not already present in state(from
+    an earlier incremental run) and the series can be shared with other periods.
+    The totals of the period are looked up in timeline(the one of all the lot
+    slices) when present instead of summing the slices and the market values of
+    the period are taken from snapshot when it holds them
+    """
+    market_data = market_data or default_service()
     start_time_in_ms, end_time_in_ms = date_utils.calendar_range(
         calendar_mode, assessment_year
     )
     org = ticker_org_info[ticker]
     currency_code = ticker_currency_info[ticker]
-    before_purchases = list(
-        filter(
-            lambda purchase: purchase.date["time_in_millis"] < start_time_in_ms,
-            purchases,
-        )
-    )
-    after_purchases = list(
-        filter(
-            lambda purchase: purchase.date["time_in_millis"] >= start_time_in_ms
-            and purchase.date["time_in_millis"] <= end_time_in_ms,
-            purchases,
-        )
+    # resolved once by the first lot missing in state, the others use it directly
+    rate_source = functools.lru_cache(maxsize=None)(
+        lambda: market_data.rate_source(currency_code)
     )
-    # for a in before_purchases:
-    #     t = a.date["disp_time"]
-    #     print(f"a = {a.quantity} on da = {t}")
 
-    previous_sum = sum(map(lambda purchase: purchase.quantity, before_purchases))
+    previous_sum = (
+        timeline.held_at(start_time_in_ms - 1)
+        if timeline is not None
+        else sum(lot_slice.quantity for lot_slice in before_slices)
+    )
     print(
         f"{ticker}: Previous period(before {date_utils.display_time(start_time_in_ms)}) total share = {previous_sum}"
     )
 
-    after_sum = sum(map(lambda purchase: purchase.quantity, after_purchases))
+    after_sum = (
+        timeline.acquired_between(start_time_in_ms, end_time_in_ms)
+        if timeline is not None
+        else sum(lot_slice.quantity for lot_slice in after_slices)
+    )
     print(
         f"{ticker}: This period(from {date_utils.display_time(start_time_in_ms)} to {date_utils.display_time(end_time_in_ms)}) total share = {after_sum}"
     )
 
+    def is_sold_in_period(lot_slice: lot_ledger.LotSlice) -> bool:
+        sale_time_in_ms = lot_slice.sale_time_in_ms()
+        return sale_time_in_ms is not None and sale_time_in_ms <= end_time_in_ms
+
     fa_entries: t.List[FAA3] = []
-    before_purchases_last_date = f"31-Dec-{assessment_year - 2}"
+    before_purchases_last_date = __before_purchases_last_date(assessment_year)
     before_purchase_date = date_utils.parse_named_mon(before_purchases_last_date)
-    closing_rbi_rate = rbi_rates_utils.get_rate_for_prev_mon_for_time_in_ms(
-        currency_code, end_time_in_ms
+    snapshot_values = (
+        snapshot.get(ticker, calendar_mode, assessment_year, __data_versions(ticker, market_data))
+        if snapshot is not None
+        else None
     )
-    closing_share_price = share_data_utils.get_closing_price(ticker, end_time_in_ms)
+    period_values = state.period_values if state is not None else None
+    if period_values is None and snapshot_values is not None:
+        period_values = {
+            "closing_rbi_rate": snapshot_values["closing_rbi_rate"],
+            "closing_share_price": snapshot_values["closing_share_price"],
+            "fmv_price_on_start": snapshot_values["fmv_price_on_start"],
+        }
+    if period_values is None:
+        period_values = __compute_period_values(
+            ticker, currency_code, end_time_in_ms, before_purchases_last_date, market_data
+        )
+        if state is not None:
+            state.period_values = period_values
+    closing_rbi_rate = period_values["closing_rbi_rate"]
+    closing_share_price = period_values["closing_share_price"]
     closing_inr_price = closing_share_price * closing_rbi_rate
     print(
         f"{ticker}: Closing price(INR) = {closing_inr_price}, closing_share_price({ticker_currency_info[ticker]}) = {closing_share_price} closing_rbi_rate(INR) = {closing_rbi_rate}"
     )
-    fmv_price_on_start = share_data_utils.get_fmv(
-        ticker, before_purchase_date["time_in_millis"]
-    )
+    fmv_price_on_start = period_values["fmv_price_on_start"]
     print(
         f"{ticker}: Queried FMV on {before_purchases_last_date} is {fmv_price_on_start}. This is used for accumulated sum for previous purchases"
     )
-    if previous_sum != 0:
-        fa_entries.append(
-            FAA3(
-                org,
-                purchase=Purchase(
-                    before_purchase_date,
-                    Price(
-                        fmv_price_on_start,
-                        ticker_currency_info[ticker],
-                    ),
-                    quantity=previous_sum,
-                    ticker=ticker,
-                ),
-                purchase_price=previous_sum
-                * fmv_price_on_start
-                * rbi_rates_utils.get_rate_for_prev_mon_for_time_in_ms(
-                    currency_code, start_time_in_ms
-                ),
-                # compute peak price in INR correctly: find the date-wise max of
-                # (FMV * INR rate) within the period. Previously we took the
-                # peak USD FMV and multiplied it with the purchase month's FX
-                # rate which could make the peak INR smaller than the initial
-                # INR value if FX moved unfavourably. Use helper that returns
-                # the effective peak in INR directly.
-                peak_price=previous_sum
-                * share_data_utils.get_peak_price_in_inr(
-                    ticker, start_time_in_ms, end_time_in_ms
-                ),
-                closing_price=previous_sum * closing_inr_price,
-            )
+
+    def start_rbi_rate() -> float:
+        if snapshot_values is not None:
+            return snapshot_values["start_rbi_rate"]
+        return rate_source().rate_at(start_time_in_ms)
+
+    def previous_period_purchase(quantity: float) -> Purchase:
+        return Purchase(
+            before_purchase_date,
+            Price(
+                fmv_price_on_start,
+                ticker_currency_info[ticker],
+            ),
+            quantity=quantity,
+            ticker=ticker,
         )
 
-    for purchase in after_purchases:
-        fa_entries.append(
-            FAA3(
-                org,
-                purchase=purchase,
-                # compute peak price in INR for the holding: find the maximum
-                # (FMV * INR rate) between purchase date and period end. This
-                # ensures peak reflects both price and FX movement correctly.
-                # For a given purchase we should consider peak only after the
-                # stock is acquired (i.e. strictly after the purchase date).
-                # Use the next day as the start; if that falls outside the
-                # reporting period (e.g. purchase on the last day) fall back
-                # to the purchase price as the effective peak.
-                peak_price=(
-                    purchase.quantity
-                    * share_data_utils.get_peak_price_in_inr(
-                        ticker,
-                        purchase.date["time_in_millis"] + date_utils.ONE_DAY_IN_MS,
-                        end_time_in_ms,
-                    )
-                    if purchase.date["time_in_millis"] + date_utils.ONE_DAY_IN_MS <= end_time_in_ms
-                    else purchase.quantity
-                    * purchase.purchase_fmv.price
-                    * rbi_rates_utils.get_rate_for_prev_mon_for_time_in_ms(
-                        currency_code, purchase.date["time_in_millis"]
-                    )
+    # holdings of the previous period which are still held at the end of the
+    # period are reported as one accumulated entry valued at the FMV of the
+    # last day of the previous calendar year
+    held_sum = sum(
+        lot_slice.quantity
+        for lot_slice in before_slices
+        if not is_sold_in_period(lot_slice)
+    )
+    if held_sum != 0:
+        held_purchase = previous_period_purchase(held_sum)
+        previous_values = (
+            state.get_previous_period(held_purchase) if state is not None else None
+        )
+        if previous_values is None:
+            # compute peak price in INR correctly: find the date-wise max of
+            # (FMV * INR rate) within the period. Previously we took the
+            # peak USD FMV and multiplied it with the purchase month's FX
+            # rate which could make the peak INR smaller than the initial
+            # INR value if FX moved unfavourably.
+            previous_values = __compute_values(
+                ticker,
+                market_data,
+                LotValuation(
+                    held_sum,
+                    fmv_price_on_start,
+                    start_rbi_rate(),
+                    start_time_in_ms,
+                    end_time_in_ms,
+                    closing_inr_price,
+                    snapshot_values["peak_inr_price"] if snapshot_values is not None else None,
                 ),
-                purchase_price=purchase.quantity
-                * purchase.purchase_fmv.price
-                * rbi_rates_utils.get_rate_for_prev_mon_for_time_in_ms(
-                    currency_code, purchase.date["time_in_millis"]
+                inr_series,
+            )
+            if state is not None:
+                state.put_previous_period(held_purchase, previous_values)
+        fa_entries.append(FAA3(org, purchase=held_purchase, **previous_values))
+
+    for lot_slice in before_slices:
+        if not is_sold_in_period(lot_slice):
+            continue
+        purchase = previous_period_purchase(lot_slice.quantity)
+        sale_time_in_ms = t.cast(int, lot_slice.sale_time_in_ms())
+        lot_values = (
+            state.get_lot(purchase, sale_time_in_ms) if state is not None else None
+        )
+        if lot_values is None:
+            lot_values = __compute_values(
+                ticker,
+                market_data,
+                LotValuation(
+                    lot_slice.quantity,
+                    fmv_price_on_start,
+                    start_rbi_rate(),
+                    start_time_in_ms,
+                    sale_time_in_ms,
+                    0.0,
                 ),
-                closing_price=purchase.quantity * closing_inr_price,
+                inr_series,
             )
+            if state is not None:
+                state.put_lot(purchase, lot_values, sale_time_in_ms)
+        fa_entries.append(FAA3(org, purchase=purchase, **lot_values))
+
+    for lot_slice in after_slices:
+        purchase = lot_slice.as_purchase()
+        sold_in_period = is_sold_in_period(lot_slice)
+        sale_time_in_ms = lot_slice.sale_time_in_ms() if sold_in_period else None
+        lot_values = (
+            state.get_lot(purchase, sale_time_in_ms) if state is not None else None
         )
+        if lot_values is None:
+            # For a given purchase we should consider peak only after the
+            # stock is acquired (i.e. strictly after the purchase date).
+            lot_values = __compute_values(
+                ticker,
+                market_data,
+                LotValuation(
+                    purchase.quantity,
+                    purchase.purchase_fmv.price,
+                    rate_source().rate_at(purchase.date["time_in_millis"]),
+                    purchase.date["time_in_millis"] + date_utils.ONE_DAY_IN_MS,
+                    sale_time_in_ms if sale_time_in_ms is not None else end_time_in_ms,
+                    0.0 if sold_in_period else closing_inr_price,
+                ),
+                inr_series,
+            )
+            if state is not None:
+                state.put_lot(purchase, lot_values, sale_time_in_ms)
+        fa_entries.append(FAA3(org, purchase=purchase, **lot_values))
+
+    profiler.count("fa_entries_computed", len(fa_entries), calendar_mode=calendar_mode)
+    return fa_entries
+
 
-    file_utils.write_to_file(
+def write_org_entries(
+    ticker: str,
+    fa_entries: t.List[FAA3],
+    output_folder_abs_path: str,
+    options: t.Optional[RunOptions] = None,
+) -> t.List[str]:
+    options = options or RunOptions()
+    raw_entries_path = output_sinks.write_debug_artifact(
         os.path.join(output_folder_abs_path, ticker),
         "raw_fa_entries.json",
         fa_entries,
-        True,
+        options.write_debug_artifacts,
     )
-    file_utils.write_to_file(
+    fa_entries_paths = output_sinks.write_rows(
         os.path.join(output_folder_abs_path, ticker),
-        "raw_fa_entries.json",
-        fa_entries,
+        "fa_entries",
+        FA_ENTRY_KEYS,
+        map(fa_entry_row, fa_entries),
         True,
+        options.output_formats,
+        print_path_to_console=True,
     )
-    file_utils.write_csv_to_file(
-        os.path.join(output_folder_abs_path, ticker),
-        "fa_entries.csv",
-        [
-            "Country/Region Name and Code",
-            "Name of Entity",
-            "Address of Entity",
-            "ZIP Code",
-            "Nature of Entity",
-            "Date of acquiring the interest",
-            # explicit ITR field: total gross amount paid/credited during the period (INR)
-            "Total gross amount paid/credited with respect to the holding during the period",
-            "Initial value of the investment",
-            "Peak value of the investment during the Period",
-            "Closing Value",
+    return fa_entries_paths + ([raw_entries_path] if raw_entries_path else [])
+
+
+def __data_versions(ticker: str, market_data: MarketDataService) -> t.Dict[str, t.Any]:
+    return {
+        "org": ticker_org_info[ticker],
+        "currency_code": ticker_currency_info[ticker],
+        # only the data files used by this ticker, so updating the prices of
+        # one share invalidates only the entries of that share
+        "share_data": file_utils.file_fingerprint(market_data.share_file_path(ticker)),
+        "rate_policy": market_data.rate_policy,
+        "rates": [
+            file_utils.file_fingerprint(rate_file_abs_path)
+            for rate_file_abs_path in market_data.rate_file_paths()
         ],
-        map(
-            lambda entry: (
-                entry.org.country_name,
-                entry.org.name,
-                entry.org.address,
-                entry.org.zip_code,
-                entry.org.nature,
-                entry.purchase.date["disp_time"],
-                # purchase_price is already computed in INR for each entry
-                round(entry.purchase_price),
-                # keep original 'Initial value' for backward compatibility (duplicate of purchase_price)
-                round(entry.purchase_price),
-                round(entry.peak_price),
-                round(entry.closing_price),
-            ),
-            fa_entries,
+    }
+
+
+def __cache_key(
+    ticker: str,
+    period: Period,
+    lot_slices: t.List[lot_ledger.LotSlice],
+    market_data: MarketDataService,
+    options: RunOptions,
+) -> str:
+    calendar_mode, assessment_year = period
+    return result_cache.compute_key(
+        {
+            "ticker": ticker,
+            "calendar_mode": calendar_mode,
+            "assessment_year": assessment_year,
+            # slices cover the purchases, the sales and the lot method together
+            "lot_slices": lot_slices,
+            **__data_versions(ticker, market_data),
+            "output_formats": sorted(options.output_formats),
+            "debug_artifacts": options.write_debug_artifacts,
+        }
+    )
+
+
+def __parse_org_periods(
+    ticker: str,
+    periods: t.List[Period],
+    ledger: lot_ledger.LotLedger,
+    output_folder_of_period: t.Callable[[Period], str],
+    market_data: MarketDataService,
+    options: RunOptions,
+):
+    """
+    Writes the FA entries of the periods, periods already present in the result
+    cache are copied from it and only the remaining ones are computed
+    """
+    cache_keys = (
+        {
+            period: __cache_key(ticker, period, ledger.slices, market_data, options)
+            for period in periods
+        }
+        if options.cache_folder_abs_path is not None
+        else {}
+    )
+    missed_periods = []
+    for period in periods:
+        restored_paths = (
+            result_cache.restore(
+                options.cache_folder_abs_path,
+                cache_keys[period],
+                os.path.join(output_folder_of_period(period), ticker),
+            )
+            if cache_keys
+            else None
+        )
+        if restored_paths is None:
+            if cache_keys:
+                profiler.count("cache_lookups", cache="fa_results", result="miss")
+            missed_periods.append(period)
+            continue
+        profiler.count("cache_lookups", cache="fa_results", result="hit")
+        calendar_mode, assessment_year = period
+        print(
+            f"{ticker}: Reusing cached FA entries for {calendar_mode} mode of AY {assessment_year}"
+        )
+        for restored_path in restored_paths:
+            file_utils.print_file_path(restored_path)
+
+    if not missed_periods:
+        return
+    states = (
+        [
+            faa3_state.load(
+                os.path.join(output_folder_of_period(period), ticker),
+                # several periods may be written to the same folder one after the other
+                {"period": list(period), **__data_versions(ticker, market_data)},
+            )
+            for period in missed_periods
+        ]
+        if options.incremental
+        else None
+    )
+    with profiler.span("compute_fa_entries"):
+        all_fa_entries = compute_org_periods(
+            ticker,
+            missed_periods,
+            ledger.slices,
+            states,
+            market_data,
+            ledger.timeline,
+            options.snapshot,
+        )
+    for index, (period, fa_entries) in enumerate(zip(missed_periods, all_fa_entries)):
+        with profiler.span("write_output"):
+            written_paths = write_org_entries(
+                ticker, fa_entries, output_folder_of_period(period), options
+            )
+        if cache_keys:
+            result_cache.store(options.cache_folder_abs_path, cache_keys[period], written_paths)
+        if states is not None:
+            state = states[index]
+            print(
+                f"{ticker}: Incremental run reused {state.reused_lot_count} lots and "
+                + f"computed {state.computed_lot_count} lots"
+            )
+            faa3_state.save(os.path.join(output_folder_of_period(period), ticker), state)
+
+
+def compute_org_periods(
+    ticker: str,
+    periods: t.List[Period],
+    lot_slices: t.Iterable[lot_ledger.LotSlice],
+    states: t.Optional[t.List[faa3_state.Faa3State]] = None,
+    market_data: t.Optional[MarketDataService] = None,
+    timeline: t.Optional[HoldingsTimeline] = None,
+    snapshot: t.Optional[period_snapshot.PeriodSnapshot] = None,
+) -> t.List[t.List[FAA3]]:
+    """
+    Computes the FA entries of every (calendar_mode, assessment_year) period in one
+    pass over the lot slices. The per-day INR series and its peak index are built
+    once for the union of the periods, shared by all of them and skipped entirely
+    when states(one per period) already hold every value
+    """
+    time_ranges = [
+        date_utils.calendar_range(calendar_mode, assessment_year)
+        for calendar_mode, assessment_year in periods
+    ]
+    market_data = market_data or default_service()
+    splits = __split_by_period(lot_slices, time_ranges)
+    inr_series = functools.lru_cache(maxsize=None)(
+        lambda: market_data.inr_series(ticker, time_ranges)
+    )
+    return [
+        compute_org_entries(
+            ticker,
+            calendar_mode,
+            before_slices,
+            after_slices,
+            assessment_year,
+            inr_series,
+            states[index] if states is not None else None,
+            market_data,
+            timeline,
+            snapshot,
+        )
+        for index, (
+            (calendar_mode, assessment_year),
+            (before_slices, after_slices),
+        ) in enumerate(zip(periods, splits))
+    ]
+
+
+def __compute_snapshot_values(
+    ticker: str, calendar_mode: str, assessment_year: int, market_data: MarketDataService
+) -> period_snapshot.SnapshotValues:
+    start_time_in_ms, end_time_in_ms = date_utils.calendar_range(calendar_mode, assessment_year)
+    currency_code = ticker_currency_info[ticker]
+    period_values = __compute_period_values(
+        ticker,
+        currency_code,
+        end_time_in_ms,
+        __before_purchases_last_date(assessment_year),
+        market_data,
+    )
+    return {
+        **period_values,
+        "start_rbi_rate": market_data.get_rate(currency_code, start_time_in_ms),
+        "peak_inr_price": market_data.get_peak_price_in_inr(
+            ticker, start_time_in_ms, end_time_in_ms
         ),
-        True,
-        print_path_to_console=True,
+    }
+
+
+def compute_snapshot(
+    periods: t.List[Period],
+    tickers: t.Optional[t.List[str]] = None,
+    market_data: t.Optional[MarketDataService] = None,
+    snapshot: t.Optional[period_snapshot.PeriodSnapshot] = None,
+) -> period_snapshot.PeriodSnapshot:
+    """
+    Adds the market values of every period of tickers(every ticker of the registry
+    by default) to snapshot. Tickers without share prices and periods the historic
+    data does not cover are skipped
+    """
+    market_data = market_data or default_service()
+    snapshot = snapshot if snapshot is not None else period_snapshot.PeriodSnapshot()
+    tickers = sorted(ticker_mapping.registry() if tickers is None else tickers)
+    ticker_mapping.validate_tickers(tickers, "the snapshot")
+    for ticker in tickers:
+        if not os.path.exists(market_data.share_file_path(ticker)):
+            print(
+                f"{ticker}: Skipping the snapshot as {market_data.share_file_path(ticker)} is NOT "
+                + "present"
+            )
+            continue
+        data_versions = __data_versions(ticker, market_data)
+        for calendar_mode, assessment_year in periods:
+            try:
+                values = __compute_snapshot_values(
+                    ticker, calendar_mode, assessment_year, market_data
+                )
+            except AssertionError as e:
+                print(
+                    f"{ticker}: Skipping {calendar_mode} mode of AY {assessment_year} in the "
+                    + f"snapshot, {e}"
+                )
+                continue
+            snapshot.put(ticker, calendar_mode, assessment_year, data_versions, values)
+    return snapshot
+
+
+def parse_org_purchases(
+    ticker: str,
+    calendar_mode: str,
+    purchases: t.List[Purchase],
+    assessment_year: int,
+    output_folder_abs_path: str,
+    sales: t.Optional[t.List[Sale]] = None,
+    market_data: t.Optional[MarketDataService] = None,
+    options: t.Optional[RunOptions] = None,
+):
+    options = options or RunOptions()
+    ledger = lot_ledger.LotLedger(ticker, purchases, sales or [], options.lot_method)
+    [fa_entries] = compute_org_periods(
+        ticker,
+        [(calendar_mode, assessment_year)],
+        ledger.slices,
+        market_data=market_data,
+        timeline=ledger.timeline,
+        snapshot=options.snapshot,
     )
+    write_org_entries(ticker, fa_entries, output_folder_abs_path, options)
     return fa_entries
 
 
-def parse(
+def period_output_folder(output_folder_abs_path: str, period: Period) -> str:
+    calendar_mode, assessment_year = period
+    return os.path.join(output_folder_abs_path, f"{calendar_mode}_{assessment_year}")
+
+
+def __parse_ledgers(
+    periods: t.List[Period],
+    purchases: t.List[Purchase],
+    sales: t.Optional[t.List[Sale]],
+    output_folder_of_period: t.Callable[[Period], str],
+    market_data: t.Optional[MarketDataService],
+    options: t.Optional[RunOptions],
+):
+    market_data = market_data or default_service()
+    options = options or RunOptions()
+    with logger.debug_context(options.debug or logger.is_debug()):
+        with profiler.span("build_ledgers"):
+            ledgers = lot_ledger.build_ledgers(purchases, sales or [], options.lot_method)
+        ticker_mapping.validate_tickers(ledgers, "the purchases and sales")
+        for ticker, ledger in ledgers.items():
+            __parse_org_periods(
+                ticker, periods, ledger, output_folder_of_period, market_data, options
+            )
+
+
+def compute(
     calendar_mode: str,
     purchases: t.List[Purchase],
     assessment_year: int,
+    sales: t.Optional[t.List[Sale]] = None,
+    market_data: t.Optional[MarketDataService] = None,
+    options: t.Optional[RunOptions] = None,
+) -> t.Dict[str, t.List[FAA3]]:
+    """
+    Computes the FA entries of every ticker without writing any output
+    """
+    options = options or RunOptions()
+    with logger.debug_context(options.debug or logger.is_debug()):
+        ledgers = lot_ledger.build_ledgers(purchases, sales or [], options.lot_method)
+        ticker_mapping.validate_tickers(ledgers, "the purchases and sales")
+        return {
+            ticker: compute_org_periods(
+                ticker,
+                [(calendar_mode, assessment_year)],
+                ledger.slices,
+                market_data=market_data,
+                timeline=ledger.timeline,
+                snapshot=options.snapshot,
+            )[0]
+            for ticker, ledger in ledgers.items()
+        }
+
+
+def parse_periods(
+    periods: t.List[Period],
+    purchases: t.List[Purchase],
     output_folder_abs_path: str,
+    sales: t.Optional[t.List[Sale]] = None,
+    market_data: t.Optional[MarketDataService] = None,
+    options: t.Optional[RunOptions] = None,
 ):
-    ticker_attr = operator.attrgetter("ticker")
-    grouped_list = groupby(sorted(purchases, key=ticker_attr), ticker_attr)
-
-    for ticker, each_org_purchases in grouped_list:
-        parse_org_purchases(
-            ticker,
+    """
+    Generates FA entries for several periods, e.g. both calendar modes or multiple
+    assessment years of an amended filing, without re-reading purchases or market
+    data per period. With a single period the output layout is the same as parse,
+    otherwise each period is written under output/<calendar_mode>_<assessment_year>
+    """
+    periods = list(dict.fromkeys(periods))
+    if len(periods) == 1:
+        [(calendar_mode, assessment_year)] = periods
+        parse(
             calendar_mode,
-            list(each_org_purchases),
+            purchases,
             assessment_year,
             output_folder_abs_path,
+            sales,
+            market_data,
+            options,
         )
+        return
+
+    __parse_ledgers(
+        periods,
+        purchases,
+        sales,
+        lambda period: period_output_folder(output_folder_abs_path, period),
+        market_data,
+        options,
+    )
+
+
+def parse(
+    calendar_mode: str,
+    purchases: t.List[Purchase],
+    assessment_year: int,
+    output_folder_abs_path: str,
+    sales: t.Optional[t.List[Sale]] = None,
+    market_data: t.Optional[MarketDataService] = None,
+    options: t.Optional[RunOptions] = None,
+):
+    """
+    Generates the FA entries of every ticker, sales(if any) deplete the purchase
+    lots according to options.lot_method
+    """
+    __parse_ledgers(
+        [(calendar_mode, assessment_year)],
+        purchases,
+        sales,
+        lambda _: output_folder_abs_path,
+        market_data,
+        options,
+    )
@@ -0,0 +1,134 @@
+import json
+import os
+import typing as t
+
+from models.purchase import Purchase
+from utils import file_utils
+
+STATE_FILE_NAME = "faa3_state.json"
+# bump it whenever the stored values are computed differently
+STATE_VERSION = 2
+
+LotValues = t.TypedDict(
+    "LotValues",
+    {"purchase_price": float, "peak_price": float, "closing_price": float},
+)
+
+PeriodValues = t.TypedDict(
+    "PeriodValues",
+    {
+        "closing_rbi_rate": float,
+        "closing_share_price": float,
+        "fmv_price_on_start": float,
+    },
+)
+
+
+class Faa3State:
+    """
+    Values computed by an earlier run for one ticker and period: the market values
+    of the period, the aggregated entry of the previous period holdings and the
+    values of every lot. They are only valid for the data_versions(the period and
+    the fingerprints of the historic data and ticker details) they were computed with
+    """
+
+    def __init__(
+        self,
+        data_versions: t.Dict[str, t.Any],
+        period_values: t.Optional[PeriodValues] = None,
+        previous_period: t.Optional[t.Dict[str, t.Any]] = None,
+        lots: t.Optional[t.Dict[str, LotValues]] = None,
+    ):
+        self.data_versions = data_versions
+        self.period_values = period_values
+        self.__previous_period = previous_period
+        self.__stored_lots = lots or {}
+        self.__used_lots: t.Dict[str, LotValues] = {}
+        self.reused_lot_count = 0
+        self.computed_lot_count = 0
+
+    @staticmethod
+    def lot_key(purchase: Purchase, sale_time_in_ms: t.Optional[int] = None) -> str:
+        return "|".join(
+            [
+                str(purchase.date["time_in_millis"]),
+                repr(float(purchase.quantity)),
+                repr(float(purchase.purchase_fmv.price)),
+                purchase.purchase_fmv.currency_code,
+            ]
+            + ([f"sold@{sale_time_in_ms}"] if sale_time_in_ms is not None else [])
+        )
+
+    def get_previous_period(self, purchase: Purchase) -> t.Optional[LotValues]:
+        if self.__previous_period is None or self.__previous_period["key"] != self.lot_key(
+            purchase
+        ):
+            return None
+        return self.__previous_period["values"]
+
+    def put_previous_period(self, purchase: Purchase, values: LotValues):
+        self.__previous_period = {"key": self.lot_key(purchase), "values": values}
+
+    def get_lot(
+        self, purchase: Purchase, sale_time_in_ms: t.Optional[int] = None
+    ) -> t.Optional[LotValues]:
+        key = self.lot_key(purchase, sale_time_in_ms)
+        values = self.__used_lots.get(key, self.__stored_lots.get(key))
+        if values is None:
+            return None
+        self.reused_lot_count += 1
+        self.__used_lots[key] = values
+        return values
+
+    def put_lot(
+        self,
+        purchase: Purchase,
+        values: LotValues,
+        sale_time_in_ms: t.Optional[int] = None,
+    ):
+        self.computed_lot_count += 1
+        self.__used_lots[self.lot_key(purchase, sale_time_in_ms)] = values
+
+    def to_json(self) -> t.Dict[str, t.Any]:
+        # lots which are not part of the latest run(e.g. changed rows) are dropped
+        return {
+            "version": STATE_VERSION,
+            "data_versions": self.data_versions,
+            "period_values": self.period_values,
+            "previous_period": self.__previous_period,
+            "lots": self.__used_lots,
+        }
+
+
+def load(
+    output_folder_abs_path: str, data_versions: t.Dict[str, t.Any]
+) -> Faa3State:
+    """
+    Loads the state saved in output_folder_abs_path, a fresh state is returned when
+    there is none or when it was computed with other data_versions
+    """
+    state_file_abs_path = os.path.join(output_folder_abs_path, STATE_FILE_NAME)
+    if not os.path.exists(state_file_abs_path):
+        return Faa3State(data_versions)
+    with open(state_file_abs_path, encoding="utf-8") as f:
+        stored = json.load(f)
+    # round trip through JSON so that e.g. tuples compare equal to stored lists
+    if stored.get("version") != STATE_VERSION or stored.get(
+        "data_versions"
+    ) != json.loads(json.dumps(data_versions, default=vars)):
+        print(
+            f"Ignoring {state_file_abs_path} as it was computed with other historic data or version"
+        )
+        return Faa3State(data_versions)
+    return Faa3State(
+        data_versions,
+        period_values=stored["period_values"],
+        previous_period=stored["previous_period"],
+        lots=stored["lots"],
+    )
+
+
+def save(output_folder_abs_path: str, state: Faa3State) -> str:
+    return file_utils.write_to_file(
+        output_folder_abs_path, STATE_FILE_NAME, state.to_json(), True
+    )
@@ -3,20 +3,23 @@ import argparse
 import os
 import sys
 
-from parser.demat.etrade import etrade_benefit_history_parser
 from utils import logger
-from parser.demat.etrade import etrade_holdings_bystatus_parser
+from parser.demat import source_merger, source_parser
 from parser.itr import faa3_parser
+from utils import output_sinks, period_snapshot, lot_ledger, metrics, profiler, ticker_mapping
+from utils.market_data import MarketDataService
+from utils.run_options import RunOptions
+from utils.rates import rate_sources
 
 # arguments defaults
 script_path = os.path.realpath(os.path.dirname(__file__))
 DEFAULT_OUTPUT_FOLDER_NAME = "output"
 default_output_folder_abs_path = os.path.join(script_path, DEFAULT_OUTPUT_FOLDER_NAME)
-DEFAULT_SOURCE_MODE = "etrade_benefit_history"
 DEFAULT_CALENDER_MODE = "calendar"
+DEFAULT_SALES_MODE = source_merger.ETRADE_GAINS_AND_LOSSES_SALES_MODE
 
 
-def main():
+def main(argv=None):
     parser = argparse.ArgumentParser(
         description="This is a Python module to generate Indian ITR schedule FA under section A3 automatically"
     )
@@ -32,38 +35,197 @@ def main():
     parser.add_argument(
         "-i",
         "--input",
-        action="store",
-        dest="input_excel_file",
-        help="Specify the absolute path for input benefit history(BenefitHistory.xlsx) Excel file",
+        action="append",
+        dest="input_files",
+        help="Specify the absolute path for input benefit history(BenefitHistory.xlsx) Excel "
+        + "file or another broker export, can be repeated to combine the holdings of several "
+        + "brokers",
         required=True,
     )
     parser.add_argument(
         "-m",
         "--source-mode",
         action="store",
-        default=DEFAULT_SOURCE_MODE,
+        default=None,
         dest="source_mode",
-        choices=[f"{DEFAULT_SOURCE_MODE}", "etrade_holdings_bystatus"],
-        help=f"Specify the source mode, default = {DEFAULT_SOURCE_MODE}",
+        choices=source_parser.SOURCE_MODES,
+        help="Specify the source mode, default = detected from the sheets or header row of the "
+        + "input",
+    )
+    parser.add_argument(
+        "-t",
+        "--ticker",
+        action="store",
+        dest="ticker",
+        default=None,
+        help="Specify the ticker for source modes whose files lack a Symbol column(e.g. "
+        + "morgan_stanley)",
+    )
+    parser.add_argument(
+        "-s",
+        "--sales-input",
+        action="append",
+        dest="sales_input_files",
+        default=[],
+        help="Specify the absolute path of a file with the sold shares, can be repeated. "
+        + "Sales deplete the purchased lots, default = no sales",
+    )
+    parser.add_argument(
+        "--sales-mode",
+        action="store",
+        default=DEFAULT_SALES_MODE,
+        dest="sales_mode",
+        choices=source_merger.SALES_MODES,
+        help=f"Specify the source mode of the sales input, default = {DEFAULT_SALES_MODE}",
+    )
+    parser.add_argument(
+        "--lot-method",
+        action="store",
+        default=lot_ledger.FIFO_METHOD,
+        dest="lot_method",
+        choices=lot_ledger.SUPPORTED_METHODS,
+        help="Specify how sales deplete the purchased lots, specific_id uses the acquisition "
+        + f"date of the sale when present, default = {lot_ledger.FIFO_METHOD}",
     )
     parser.add_argument(
         "-cal",
         "--calendar-mode",
         action="store",
         type=str,
-        default=DEFAULT_CALENDER_MODE,
-        dest="calendar_mode",
+        nargs="+",
+        default=[DEFAULT_CALENDER_MODE],
+        dest="calendar_modes",
         choices=[f"{DEFAULT_CALENDER_MODE}", "financial"],
-        help=f"Specify the calendar period for consideration, default = {DEFAULT_CALENDER_MODE}",
+        help="Specify the calendar period for consideration, multiple modes are computed in a "
+        + f"single run, default = {DEFAULT_CALENDER_MODE}",
     )
     parser.add_argument(
         "-ay",
         "--assessment-year",
         action="store",
-        dest="assessment_year",
+        dest="assessment_years",
         type=int,
+        nargs="+",
         required=True,
-        help="Current year of assessment year. For AY 2019-2020, input will be 2019. Input will be of type integer",
+        help="Current year of assessment year. For AY 2019-2020, input will be 2019. Input will "
+        + "be of type integer. Multiple years are computed in a single run",
+    )
+    parser.add_argument(
+        "-f",
+        "--output-format",
+        action="append",
+        dest="output_formats",
+        choices=output_sinks.SUPPORTED_FORMATS,
+        help="Specify the output format of the FA entries, can be repeated, default = "
+        + f"{output_sinks.CSV_FORMAT}",
+    )
+    parser.add_argument(
+        "--skip-debug-artifacts",
+        action="store_true",
+        dest="skip_debug_artifacts",
+        default=False,
+        help="Do not write the intermediate purchases.json and raw_fa_entries.json files",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        action="store",
+        type=str,
+        default=None,
+        dest="cache_folder",
+        help="Specify the absolute path of a folder to cache the FA entries in. Re-runs with the "
+        + "same purchases, periods and historic data reuse the cached output, default = no "
+        + "caching",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        dest="incremental",
+        default=False,
+        help="Reuse the values computed by the previous run in the output folder and only "
+        + "compute new or changed lots",
+    )
+    parser.add_argument(
+        "--snapshot",
+        action="store",
+        type=str,
+        default=None,
+        dest="snapshot_file",
+        help="Specify the absolute path of a snapshot written by `run.py snapshot` to read the "
+        + "market values of the periods from instead of computing them, default = no snapshot",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        dest="profile",
+        default=False,
+        help="Print the time taken by every stage, the lookup and cache counters and the peak "
+        + "memory at the end",
+    )
+    parser.add_argument(
+        "--profile-trace",
+        action="store",
+        type=str,
+        default=None,
+        dest="profile_trace_file",
+        help="Specify the absolute path of a JSON file to write the profile to in the trace "
+        + "event format(chrome://tracing, Perfetto), implies --profile",
+    )
+    parser.add_argument(
+        "--profile-memory",
+        action="store_true",
+        dest="profile_memory",
+        default=False,
+        help="Trace the python allocations for the peak heap size while profiling, slows the run "
+        + "down",
+    )
+    parser.add_argument(
+        "--cprofile",
+        action="store",
+        type=str,
+        default=None,
+        dest="cprofile_file",
+        help="Specify the absolute path of a file to dump the cProfile stats of the run to, "
+        + "implies --profile",
+    )
+    parser.add_argument(
+        "--metrics-file",
+        action="store",
+        type=str,
+        default=None,
+        dest="metrics_file",
+        help="Specify the absolute path of a file to write the run's counters and stage "
+        + "latencies to in the Prometheus text format, e.g. for the textfile collector of "
+        + "node_exporter",
+    )
+    parser.add_argument(
+        "--historic-data",
+        action="store",
+        type=str,
+        default=None,
+        dest="historic_data_folder",
+        help="Specify the absolute path of a folder laid out like "
+        + "historic_data(shares/<ticker>/data.csv and rates/rbi/rates.xls) to read the share "
+        + "prices and RBI rates from, default = the repo's historic_data",
+    )
+    parser.add_argument(
+        "--rate-policy",
+        action="store",
+        default=rate_sources.RBI_PREV_MONTH_POLICY,
+        choices=rate_sources.RATE_POLICIES,
+        dest="rate_policy",
+        help=f"Specify the INR rates to convert with: {rate_sources.RBI_PREV_MONTH_POLICY}(last "
+        + f"RBI rate of the previous month) or {rate_sources.SBI_TT_BUY_POLICY}(SBI TT buying "
+        + "rate of the day, read from rates/sbi/SBI_REFERENCE_RATES_<currency>.csv), default = "
+        + f"{rate_sources.RBI_PREV_MONTH_POLICY}",
+    )
+    parser.add_argument(
+        "--ticker-registry",
+        action="append",
+        dest="ticker_registry_files",
+        default=[],
+        help="Specify the absolute path of a CSV with more tickers(columns "
+        + f"{','.join(ticker_mapping.REGISTRY_COLUMNS)}), can be repeated. Its rows are added to "
+        + "and override the built in utils/tickers.csv",
     )
     parser.add_argument(
         "-v",
@@ -74,30 +236,104 @@ def main():
         help="Enable the debug logs",
     )
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+
+    ticker_mapping.set_registry_files(
+        [ticker_mapping.DEFAULT_REGISTRY_FILE_ABS_PATH] + args.ticker_registry_files
+    )
+
+    if args.metrics_file:
+        metrics.enable()
+    try:
+        if not (args.profile or args.profile_trace_file or args.cprofile_file):
+            __run(args, __options(args))
+            return
+        with profiler.profiling(args.profile_memory, args.cprofile_file) as report:
+            __run(args, __options(args))
+        print(profiler.summary_table(report))
+        if args.profile_trace_file:
+            profiler.write_trace(args.profile_trace_file, report)
+            logger.log(f"Profile trace written to {args.profile_trace_file}")
+        if args.cprofile_file:
+            logger.log(f"cProfile stats written to {args.cprofile_file}")
+    finally:
+        # a failed run is worth recording too
+        if args.metrics_file:
+            metrics.write_textfile(args.metrics_file)
+
+
+def __options(args: argparse.Namespace) -> RunOptions:
+    return RunOptions(
+        output_formats=tuple(args.output_formats or [output_sinks.CSV_FORMAT]),
+        write_debug_artifacts=not args.skip_debug_artifacts,
+        cache_folder_abs_path=args.cache_folder,
+        incremental=args.incremental,
+        lot_method=args.lot_method,
+        snapshot=period_snapshot.load(args.snapshot_file) if args.snapshot_file else None,
+        debug=args.debug,
+    )
 
-    logger.DEBUG = args.debug
-    etrade_benefit_history_parser.DEBUG = args.debug
-    etrade_holdings_bystatus_parser.DEBUG = args.debug
 
-    if args.source_mode == "etrade_holdings_bystatus":
-        purchases = etrade_holdings_bystatus_parser.parse(
-            args.input_excel_file, args.output_folder
+def __run(args: argparse.Namespace, options: RunOptions):
+    market_data = MarketDataService(args.historic_data_folder, rate_policy=args.rate_policy)
+    with profiler.span("parse_purchases"):
+        purchases = source_merger.parse_inputs(
+            args.input_files,
+            args.output_folder,
+            args.source_mode,
+            args.ticker,
+            market_data,
+            options,
         )
-    else:
-        purchases = etrade_benefit_history_parser.parse(
-            args.input_excel_file, args.output_folder
+
+    with profiler.span("parse_sales"):
+        sales = source_merger.parse_sales_inputs(
+            args.sales_input_files, args.sales_mode, args.output_folder, args.ticker, options
         )
 
-    faa3_parser.parse(
-        args.calendar_mode, purchases, args.assessment_year, args.output_folder
+    with profiler.span("compute_periods"):
+        faa3_parser.parse_periods(
+            [
+                (calendar_mode, assessment_year)
+                for calendar_mode in args.calendar_modes
+                for assessment_year in args.assessment_years
+            ],
+            purchases,
+            args.output_folder,
+            sales,
+            market_data,
+            options,
+        )
+    market_data.data_quality.log()
+    output_sinks.write_debug_artifact(
+        args.output_folder,
+        "data_quality.json",
+        market_data.data_quality.summary(),
+        options.write_debug_artifacts,
     )
 
 
 if __name__ == "__main__":
     try:
-        main()
-        logger.log("On your left!")
+        if len(sys.argv) > 1 and sys.argv[1] == "serve":
+            from service import http_server
+
+            http_server.main(sys.argv[2:])
+        elif len(sys.argv) > 1 and sys.argv[1] == "watch":
+            from service import watch_folder
+
+            watch_folder.main(sys.argv[2:])
+        elif len(sys.argv) > 1 and sys.argv[1] == "holdings":
+            from service import holdings_query
+
+            holdings_query.main(sys.argv[2:])
+        elif len(sys.argv) > 1 and sys.argv[1] == "snapshot":
+            from service import precompute_snapshot
+
+            precompute_snapshot.main(sys.argv[2:])
+        else:
+            main()
+            logger.log("On your left!")
     except KeyboardInterrupt:
         logger.log("Interrupt requested... exiting")
     sys.exit(0)
@@ -0,0 +1,142 @@
+"""Answers how many shares were held on a date or over a date range.
+
+Usage:
+    ./run.py holdings -i <BenefitHistory.xlsx> [-s <sales.xlsx>] --on 31-Dec-2024
+    ./run.py holdings -i <BenefitHistory.xlsx> [-s <sales.xlsx>] --from 01-Jan-2024 --to 31-Dec-2024
+
+The purchases and sales of the inputs are indexed once into a HoldingsTimeline
+per ticker, every date or range is then a binary search over it.
+"""
+import argparse
+import json
+import tempfile
+import typing as t
+
+from parser.demat import source_merger, source_parser
+from utils import date_utils, holdings_timeline, ticker_mapping
+from utils.market_data import MarketDataService
+from utils.run_options import RunOptions
+
+
+def create_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="run.py holdings",
+        description="Print the shares held on a date or over a date range for every ticker of "
+        + "the inputs",
+    )
+    parser.add_argument(
+        "-i",
+        "--input",
+        action="append",
+        dest="input_files",
+        required=True,
+        help="Benefit history or another broker export, can be repeated",
+    )
+    parser.add_argument(
+        "-m",
+        "--source-mode",
+        default=None,
+        dest="source_mode",
+        choices=source_parser.SOURCE_MODES,
+        help="default = detected from the sheets or header row of the input",
+    )
+    parser.add_argument(
+        "-t",
+        "--ticker",
+        default=None,
+        help="Ticker for the exports which lack a Symbol column(e.g. morgan_stanley)",
+    )
+    parser.add_argument(
+        "-s",
+        "--sales-input",
+        action="append",
+        dest="sales_input_files",
+        default=[],
+        help="File with the sold shares, can be repeated",
+    )
+    parser.add_argument(
+        "--sales-mode",
+        default=source_merger.ETRADE_GAINS_AND_LOSSES_SALES_MODE,
+        choices=source_merger.SALES_MODES,
+        help=f"default = {source_merger.ETRADE_GAINS_AND_LOSSES_SALES_MODE}",
+    )
+    parser.add_argument(
+        "--on",
+        dest="on_dates",
+        nargs="+",
+        default=[],
+        help="Dates(e.g. 31-Dec-2024) to print the shares held at the end of",
+    )
+    parser.add_argument(
+        "--from", dest="from_date", default=None, help="First day(e.g. 01-Jan-2024) of a range"
+    )
+    parser.add_argument(
+        "--to", dest="to_date", default=None, help="Last day(e.g. 31-Dec-2024) of a range"
+    )
+    parser.add_argument(
+        "--historic-data",
+        dest="historic_data_folder",
+        default=None,
+        help="Folder laid out like historic_data, for the inputs whose FMV is looked up",
+    )
+    parser.add_argument(
+        "--ticker-registry",
+        action="append",
+        dest="ticker_registry_files",
+        default=[],
+        help="CSV with more tickers, added to the built in utils/tickers.csv",
+    )
+    parser.add_argument(
+        "-v", "--verbose", action="store_true", dest="debug", help="Enable the debug logs"
+    )
+    return parser
+
+
+def query(
+    timelines: t.Dict[str, holdings_timeline.HoldingsTimeline],
+    on_dates: t.List[str],
+    from_date: t.Optional[str] = None,
+    to_date: t.Optional[str] = None,
+) -> t.Dict[str, t.Dict[str, t.Any]]:
+    """
+    Shares held by every ticker at the end of each of on_dates and over the range
+    from_date to to_date(when both are given), dates are like 31-Dec-2024
+    """
+    time_of = {date: date_utils.parse_named_mon(date)["time_in_millis"] for date in on_dates}
+    answers: t.Dict[str, t.Dict[str, t.Any]] = {}
+    for ticker, timeline in timelines.items():
+        answer: t.Dict[str, t.Any] = {
+            date: timeline.held_at(time_in_ms) for date, time_in_ms in time_of.items()
+        }
+        if from_date is not None and to_date is not None:
+            answer[f"{from_date} to {to_date}"] = timeline.held_over(
+                date_utils.parse_named_mon(from_date)["time_in_millis"],
+                date_utils.parse_named_mon(to_date)["time_in_millis"],
+            )
+        answers[ticker] = answer
+    return answers
+
+
+def main(argv: t.List[str]):
+    args = create_arg_parser().parse_args(argv)
+    if not args.on_dates and (args.from_date is None or args.to_date is None):
+        raise AssertionError("Pass the dates with --on and/or a range with --from and --to")
+    # only the timelines are printed, the parsed inputs are not worth keeping
+    options = RunOptions(write_debug_artifacts=False, debug=args.debug)
+    ticker_mapping.set_registry_files(
+        [ticker_mapping.DEFAULT_REGISTRY_FILE_ABS_PATH] + args.ticker_registry_files
+    )
+    with tempfile.TemporaryDirectory(prefix="sefa-") as work_folder:
+        purchases = source_merger.parse_inputs(
+            args.input_files,
+            work_folder,
+            args.source_mode,
+            args.ticker,
+            MarketDataService(args.historic_data_folder),
+            options,
+        )
+        sales = source_merger.parse_sales_inputs(
+            args.sales_input_files, args.sales_mode, work_folder, args.ticker, options
+        )
+    timelines = holdings_timeline.build_timelines(purchases, sales)
+    print(json.dumps(query(timelines, args.on_dates, args.from_date, args.to_date), indent=2))
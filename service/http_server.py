@@ -0,0 +1,509 @@
+"""Local HTTP service generating FA reports while keeping market data warm.
+
+Usage:
+    ./run.py serve [--host 127.0.0.1] [--port 8765] [--unix-socket /tmp/sefa.sock]
+
+Endpoints:
+    GET  /health
+    GET  /metrics, counters and latencies in the Prometheus text format
+    POST /jobs?<same query as /fa>, queues the report and answers with the job id
+    GET  /jobs/<id>, state of the job
+    GET  /jobs/<id>/result, the report once the job is done
+    POST /fa?assessment_year=2025&calendar_mode=calendar&format=csv
+         with the raw BenefitHistory.xlsx / Morgan Stanley file as the request body.
+         source_mode is detected from the file unless it is passed.
+         Optional query parameters: ticker(for files without a Symbol column),
+         file_name(used for its extension, otherwise the content is sniffed) and
+         debug=1(debug logs of this request only)
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import csv
+import io
+import json
+import os
+import tempfile
+import time
+import typing as t
+import urllib.parse
+from dataclasses import dataclass
+
+from parser.demat import source_detector, source_parser
+from parser.itr import faa3_parser
+from service import job_queue as jq
+from utils import logger, metrics, period_snapshot, profiler, query_memo
+from utils.market_data import (
+    CachePolicy,
+    MarketDataService,
+    default_service,
+)
+from utils.rates import rate_sources
+from utils.run_options import RunOptions
+from utils.ticker_mapping import ticker_currency_info
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_PIPELINE_THREADS = 1
+MAX_BODY_SIZE = 32 * 1024 * 1024
+CSV_OUTPUT_FORMAT = "csv"
+JSON_OUTPUT_FORMAT = "json"
+
+HTTP_REASONS = {
+    200: "OK",
+    202: "Accepted",
+    400: "Bad Request",
+    404: "Not Found",
+    413: "Payload Too Large",
+    422: "Unprocessable Entity",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+    504: "Gateway Timeout",
+}
+
+
+@dataclass
+class Request:
+    method: str
+    path: str
+    query: t.Dict[str, str]
+    headers: t.Dict[str, str]
+    body: bytes
+
+
+@dataclass
+class Response:
+    status: int
+    body: bytes
+    content_type: str = "text/plain; charset=utf-8"
+
+
+class RequestError(Exception):
+    """Raised by handlers to answer with a 4xx status and a message"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def text_response(status: int, message: str) -> Response:
+    return Response(status, message.encode("utf-8"))
+
+
+def json_response(status: int, obj) -> Response:
+    return Response(
+        status,
+        json.dumps(obj, sort_keys=True, default=vars).encode("utf-8"),
+        "application/json",
+    )
+
+
+def required_param(request: Request, name: str) -> str:
+    if name not in request.query or request.query[name] == "":
+        raise RequestError(400, f"Missing query parameter {name}")
+    return request.query[name]
+
+
+def __input_suffix(file_bytes: bytes, file_name: t.Optional[str]) -> str:
+    if file_name and os.path.splitext(file_name)[1]:
+        return os.path.splitext(file_name)[1].lower()
+    # xlsx files are zip archives
+    return ".xlsx" if file_bytes[:2] == b"PK" else ".csv"
+
+
+@profiler.profiled("fa_report")
+def generate_fa_report(
+    file_bytes: bytes,
+    file_name: t.Optional[str],
+    source_mode: t.Optional[str],
+    calendar_mode: str,
+    assessment_year: int,
+    output_format: str,
+    ticker: t.Optional[str] = None,
+    debug: bool = False,
+    market_data: t.Optional[MarketDataService] = None,
+    options: t.Optional[RunOptions] = None,
+) -> Response:
+    """
+    Runs the parse -> FAA3 pipeline on an uploaded file without writing any output
+    files and renders all the FA entries as a single CSV or JSON document
+    """
+    market_data = market_data or default_service()
+    # uploads are parsed in temporary folders, nothing else is worth keeping
+    options = options or RunOptions(write_debug_artifacts=False)
+    # the prices or rates of a long running service may have been updated
+    market_data.refresh_data_versions()
+    with logger.debug_context(debug or options.debug or logger.is_debug()):
+        with tempfile.TemporaryDirectory(prefix="sefa-") as work_folder:
+            input_file_abs_path = os.path.join(
+                work_folder, "input" + __input_suffix(file_bytes, file_name)
+            )
+            with open(input_file_abs_path, "wb") as f:
+                f.write(file_bytes)
+            detection = (
+                source_detector.Detection(source_mode)
+                if source_mode is not None
+                else source_detector.detect(input_file_abs_path)
+            )
+            if detection is None:
+                return text_response(
+                    422, "Can't detect the source mode of the file, please pass source_mode"
+                )
+            purchases = source_parser.parse(
+                detection.source_mode,
+                input_file_abs_path,
+                work_folder,
+                ticker,
+                detection.columns,
+                market_data,
+                options,
+            )
+        ticker_entries = faa3_parser.compute(
+            calendar_mode, purchases, assessment_year, market_data=market_data, options=options
+        )
+
+        if output_format == JSON_OUTPUT_FORMAT:
+            return json_response(
+                200,
+                {
+                    ticker: [
+                        dict(zip(faa3_parser.FA_ENTRY_KEYS, faa3_parser.fa_entry_row(entry)))
+                        for entry in fa_entries
+                    ]
+                    for ticker, fa_entries in ticker_entries.items()
+                },
+            )
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, delimiter=",", quoting=csv.QUOTE_MINIMAL)
+        writer.writerow(faa3_parser.FA_ENTRY_KEYS)
+        for fa_entries in ticker_entries.values():
+            writer.writerows(map(faa3_parser.fa_entry_row, fa_entries))
+        return Response(200, buffer.getvalue().encode("utf-8"), "text/csv; charset=utf-8")
+
+
+def fa_report_args(request: Request) -> t.Dict[str, t.Any]:
+    """
+    Validates the query of a FA report request into generate_fa_report arguments
+    """
+    try:
+        assessment_year = int(required_param(request, "assessment_year"))
+    except ValueError as e:
+        raise RequestError(400, "assessment_year has to be an integer") from e
+    calendar_mode = request.query.get("calendar_mode", "calendar")
+    if calendar_mode not in ("calendar", "financial"):
+        raise RequestError(400, f"Unsupported calendar_mode = {calendar_mode}")
+    source_mode = request.query.get("source_mode")
+    if source_mode is not None and source_mode not in source_parser.SOURCE_MODES:
+        raise RequestError(400, f"Unsupported source_mode = {source_mode}")
+    output_format = request.query.get("format", CSV_OUTPUT_FORMAT)
+    if output_format not in (CSV_OUTPUT_FORMAT, JSON_OUTPUT_FORMAT):
+        raise RequestError(400, f"Unsupported format = {output_format}")
+    if not request.body:
+        raise RequestError(400, "Request body has to contain the input file")
+    return {
+        "file_bytes": request.body,
+        "file_name": request.query.get("file_name"),
+        "source_mode": source_mode,
+        "calendar_mode": calendar_mode,
+        "assessment_year": assessment_year,
+        "output_format": output_format,
+        "ticker": request.query.get("ticker"),
+        "debug": request.query.get("debug", "0").lower() in ("1", "true"),
+    }
+
+
+Handler = t.Callable[[Request], t.Awaitable[Response]]
+
+
+class HttpService:
+    """
+    Minimal asyncio HTTP/1.1 server(one request per connection). Request handling
+    stays on the event loop while the CPU bound pipeline runs on the executor, so
+    the loaded share prices and RBI rates stay resident between requests
+    """
+
+    def __init__(
+        self,
+        executor: t.Optional[concurrent.futures.Executor] = None,
+        job_queue: t.Optional[jq.JobQueue] = None,
+        market_data: t.Optional[MarketDataService] = None,
+        pipeline_threads: int = DEFAULT_PIPELINE_THREADS,
+        options: t.Optional[RunOptions] = None,
+    ):
+        self.market_data = market_data or default_service()
+        self.options = options or RunOptions(write_debug_artifacts=False)
+        # the market data is loaded once for all the threads and the debug logs
+        # are switched per request, so the pipeline can run on several threads
+        self.executor = executor or concurrent.futures.ThreadPoolExecutor(
+            max_workers=pipeline_threads, thread_name_prefix="sefa-pipeline"
+        )
+        self.job_queue = job_queue
+        self.routes: t.Dict[t.Tuple[str, str], Handler] = {
+            ("GET", "/health"): self.__health,
+            ("GET", "/metrics"): self.__metrics,
+            ("POST", "/fa"): self.__fa_report,
+        }
+        if job_queue is not None:
+            self.routes[("POST", "/jobs")] = self.__submit_job
+            self.routes[("GET", "/jobs/")] = self.__job
+
+    async def __health(self, _: Request) -> Response:
+        return json_response(
+            200,
+            {
+                "status": "ok",
+                "loaded_tickers": self.market_data.loaded_tickers(),
+                "loaded_currencies": self.market_data.loaded_currencies(),
+                "caches": self.market_data.cache_stats(),
+                "data_quality": self.market_data.data_quality.summary(),
+            },
+        )
+
+    async def __metrics(self, _: Request) -> Response:
+        return Response(200, metrics.render().encode("utf-8"), metrics.CONTENT_TYPE)
+
+    async def __fa_report(self, request: Request) -> Response:
+        report_args = fa_report_args(request)
+        return await asyncio.get_running_loop().run_in_executor(
+            self.executor,
+            lambda: generate_fa_report(
+                **report_args, market_data=self.market_data, options=self.options
+            ),
+        )
+
+    async def __submit_job(self, request: Request) -> Response:
+        report_args = fa_report_args(request)
+        file_bytes = report_args.pop("file_bytes")
+        try:
+            job = await self.job_queue.submit(file_bytes, report_args)
+        except jq.QueueFullError as e:
+            raise RequestError(503, str(e)) from e
+        return json_response(202, job)
+
+    async def __job(self, request: Request) -> Response:
+        job_id, _, action = request.path[len("/jobs/") :].partition("/")
+        job = self.job_queue.get(job_id)
+        if job is None or action not in ("", "result"):
+            raise RequestError(404, f"No job for {request.path}")
+        if action == "":
+            return json_response(200, job)
+        if job["status"] != jq.DONE_STATUS:
+            raise RequestError(404, f"Job {job_id} is {job['status']}, no result yet")
+        return Response(200, await self.job_queue.read_result(job_id), job["content_type"])
+
+    async def __read_request(self, reader: asyncio.StreamReader) -> Request:
+        request_line = (await reader.readline()).decode("latin-1").strip()
+        if not request_line:
+            raise RequestError(400, "Empty request")
+        try:
+            method, target, _ = request_line.split(" ", 2)
+        except ValueError as e:
+            raise RequestError(400, f"Malformed request line {request_line}") from e
+        headers: t.Dict[str, str] = {}
+        while True:
+            line = (await reader.readline()).decode("latin-1")
+            if line in ("\r\n", "\n", ""):
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        raw_content_length = headers.get("content-length", "0") or "0"
+        try:
+            content_length = int(raw_content_length)
+        except ValueError as e:
+            raise RequestError(400, f"Invalid Content-Length {raw_content_length}") from e
+        if content_length < 0:
+            raise RequestError(400, f"Invalid Content-Length {raw_content_length}")
+        if content_length > MAX_BODY_SIZE:
+            raise RequestError(413, f"Request body is larger than {MAX_BODY_SIZE} bytes")
+        body = await reader.readexactly(content_length) if content_length else b""
+        url = urllib.parse.urlsplit(target)
+        return Request(
+            method.upper(),
+            url.path,
+            dict(urllib.parse.parse_qsl(url.query)),
+            headers,
+            body,
+        )
+
+    async def dispatch(self, request: Request) -> Response:
+        start = time.perf_counter()
+        route = request.path if (request.method, request.path) in self.routes else None
+        if route is None:
+            for method, prefix in self.routes:
+                # routes ending with / match every path below them, e.g. /jobs/<id>
+                if prefix.endswith("/") and method == request.method and (
+                    request.path.startswith(prefix)
+                ):
+                    route = prefix
+                    break
+        response = await self.__handle(request, route)
+        # the route instead of the path keeps the label values bounded
+        metrics.inc(
+            "http_requests_total",
+            method=request.method,
+            route=route or "unmatched",
+            status=response.status,
+        )
+        metrics.observe(
+            "http_request_duration_seconds",
+            time.perf_counter() - start,
+            route=route or "unmatched",
+        )
+        return response
+
+    async def __handle(self, request: Request, route: t.Optional[str]) -> Response:
+        if route is None:
+            return text_response(404, f"No route for {request.method} {request.path}")
+        try:
+            return await self.routes[(request.method, route)](request)
+        except RequestError as e:
+            return text_response(e.status, str(e))
+        except (AssertionError, ValueError, KeyError) as e:
+            # invalid input files and missing market data surface as these
+            return text_response(422, f"{type(e).__name__}: {e}")
+
+    async def handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ):
+        try:
+            try:
+                response = await self.dispatch(await self.__read_request(reader))
+            except RequestError as e:
+                response = text_response(e.status, str(e))
+            except Exception as e:  # pylint: disable=broad-except
+                logger.log(f"Request failed with {type(e).__name__}: {e}")
+                response = text_response(500, f"{type(e).__name__}: {e}")
+            writer.write(
+                (
+                    f"HTTP/1.1 {response.status} {HTTP_REASONS.get(response.status, '')}\r\n"
+                    + f"Content-Type: {response.content_type}\r\n"
+                    + f"Content-Length: {len(response.body)}\r\n"
+                    + "Connection: close\r\n\r\n"
+                ).encode("latin-1")
+                + response.body
+            )
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def start(
+        self,
+        host: str = DEFAULT_HOST,
+        port: int = DEFAULT_PORT,
+        unix_socket_path: t.Optional[str] = None,
+    ) -> asyncio.AbstractServer:
+        if unix_socket_path is not None:
+            return await asyncio.start_unix_server(
+                self.handle_connection, path=unix_socket_path
+            )
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+
+def preload_market_data(tickers: t.List[str], market_data: t.Optional[MarketDataService] = None):
+    """
+    Loads the share prices of tickers and the INR rates of their currencies so the
+    first requests do not pay for it
+    """
+    market_data = market_data or default_service()
+    for ticker in tickers:
+        market_data.get_price_series(ticker.lower())
+    for currency_code in sorted({ticker_currency_info[ticker.lower()] for ticker in tickers}):
+        market_data.rate_source(currency_code)
+
+
+# options and market data of the jobs run by this worker process, set by init_job_worker
+__worker_options: t.Optional[RunOptions] = None
+__worker_market_data: t.Optional[MarketDataService] = None
+
+
+def init_job_worker(
+    preload_tickers: t.List[str],
+    data_folder_abs_path: t.Optional[str] = None,
+    cache_policy: t.Optional[CachePolicy] = None,
+    rate_policy: str = rate_sources.RBI_PREV_MONTH_POLICY,
+    options: t.Optional[RunOptions] = None,
+):
+    """
+    Initializer of the job worker processes, every worker owns a market data
+    service with the same settings as the one of the server
+    """
+    global __worker_options, __worker_market_data
+    # sent once to every worker process instead of with every job
+    __worker_options = options
+    __worker_market_data = MarketDataService(
+        data_folder_abs_path, cache_policy=cache_policy, rate_policy=rate_policy
+    )
+    # sent back to the server with the result of every job
+    metrics.enable()
+    preload_market_data(preload_tickers, __worker_market_data)
+
+
+def run_report_job(file_bytes: bytes, **report_args) -> Response:
+    """
+    Job function of the job queue, runs generate_fa_report with the worker options
+    and market data
+    """
+    return generate_fa_report(
+        file_bytes=file_bytes,
+        **report_args,
+        market_data=__worker_market_data,
+        options=__worker_options,
+    )
+
+
+def main(argv: t.List[str]):
+    args = create_arg_parser().parse_args(argv)
+    metrics.enable()
+    # uploads are parsed in temporary folders, nothing else is worth keeping
+    options = RunOptions(
+        write_debug_artifacts=False,
+        debug=args.debug,
+        snapshot=(
+            period_snapshot.load(os.path.abspath(args.snapshot_file))
+            if args.snapshot_file
+            else None
+        ),
+    )
+    market_data = MarketDataService(
+        cache_policy=CachePolicy(
+            max_price_bytes=(
+                int(args.price_cache_mb * 1024 * 1024) if args.price_cache_mb is not None else None
+            ),
+            compiled_folder_abs_path=(
+                os.path.abspath(args.compiled_cache_folder) if args.compiled_cache_folder else None
+            ),
+            max_query_entries=args.query_cache_entries,
+        ),
+        rate_policy=args.rate_policy,
+    )
+    preload_market_data(args.preload_tickers, market_data)
+    job_queue = None
+    if args.jobs_folder is not None:
+        job_queue = jq.JobQueue(
+            os.path.abspath(args.jobs_folder),
+            run_report_job,
+            max_workers=args.workers,
+            max_pending_jobs=args.max_pending_jobs,
+            job_timeout_seconds=args.job_timeout,
+            worker_initializer=init_job_worker,
+            worker_initializer_args=(
+                args.preload_tickers,
+                market_data.data_folder_abs_path,
+                market_data.cache_policy,
+                market_data.rate_policy,
+                options,
+            ),
+        )
+    asyncio.run(
+        serve(
+            HttpService(
+                job_queue=job_queue,
+                market_data=market_data,
+                pipeline_threads=args.pipeline_threads,
+                options=options,
+            ),
+            args.host,
+            args.port,
+            args.unix_socket_path,
+        )
+    )
@@ -0,0 +1,333 @@
+"""Persistent job queue running the report pipeline on a bounded pool of workers.
+
+Jobs and their state live in a SQLite database next to the uploaded inputs and the
+results, so queued or interrupted jobs are picked up again after a restart.
+"""
+import asyncio
+import concurrent.futures
+import json
+import multiprocessing
+import os
+import sqlite3
+import time
+import typing as t
+import uuid
+
+from utils import logger, metrics
+
+QUEUED_STATUS = "queued"
+RUNNING_STATUS = "running"
+DONE_STATUS = "done"
+FAILED_STATUS = "failed"
+
+DATABASE_FILE_NAME = "jobs.sqlite3"
+INPUTS_FOLDER_NAME = "inputs"
+RESULTS_FOLDER_NAME = "results"
+DEFAULT_MAX_WORKERS = max(1, min(4, os.cpu_count() or 1))
+DEFAULT_MAX_PENDING_JOBS = 256
+DEFAULT_JOB_TIMEOUT_SECONDS = 300.0
+# runs of a job whose worker process died, e.g. when it keeps crashing its workers
+MAX_JOB_ATTEMPTS = 3
+
+Job = t.TypedDict(
+    "Job",
+    {
+        "id": str,
+        "status": str,
+        "attempts": int,
+        "created_at": float,
+        "updated_at": float,
+        "content_type": t.Optional[str],
+        "error": t.Optional[str],
+    },
+)
+
+
+class QueueFullError(Exception):
+    """Raised by submit when max_pending_jobs are already queued or running"""
+
+
+class JobError(Exception):
+    """Raised by run_job when the job fails, with the metrics it recorded"""
+
+    def __init__(self, message: str, metrics_snapshot: t.Optional[metrics.Snapshot]):
+        super().__init__(message, metrics_snapshot)
+        self.message = message
+        self.metrics_snapshot = metrics_snapshot
+
+    def __str__(self) -> str:
+        return self.message
+
+
+def __worker_metrics() -> t.Optional[metrics.Snapshot]:
+    # jobs running in this process(e.g. on threads) record into its metrics directly
+    return metrics.take_snapshot() if multiprocessing.parent_process() is not None else None
+
+
+def run_job(
+    job_function: t.Callable[..., t.Any],
+    report_args: t.Dict[str, t.Any],
+    input_file_abs_path: str,
+    result_file_abs_path: str,
+) -> t.Tuple[int, str, t.Optional[metrics.Snapshot]]:
+    """
+    Runs on the worker processes: feeds the spooled input to job_function, which
+    returns a response with status, body and content_type, and spools its body.
+    The metrics recorded by a worker process are returned too, for the parent to
+    merge them into the ones it exports
+    """
+    with open(input_file_abs_path, "rb") as f:
+        file_bytes = f.read()
+    try:
+        response = job_function(file_bytes=file_bytes, **report_args)
+        with open(result_file_abs_path, "wb") as f:
+            f.write(response.body)
+    except Exception as e:  # pylint: disable=broad-except
+        # the metrics of a failed job are worth exporting too
+        raise JobError(f"{type(e).__name__}: {e}", __worker_metrics()) from e
+    return response.status, response.content_type, __worker_metrics()
+
+
+class JobQueue:
+    """
+    Jobs are accepted until max_pending_jobs are queued or running(back-pressure),
+    at most max_workers of them run at once and each one fails after
+    job_timeout_seconds. job_function and the worker initializer have to be module
+    level functions as they run on a process pool, each worker process keeps its
+    market data loaded for all the jobs it runs
+    """
+
+    def __init__(
+        self,
+        queue_folder_abs_path: str,
+        job_function: t.Callable[..., t.Any],
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        max_pending_jobs: int = DEFAULT_MAX_PENDING_JOBS,
+        job_timeout_seconds: float = DEFAULT_JOB_TIMEOUT_SECONDS,
+        worker_initializer: t.Optional[t.Callable[..., None]] = None,
+        worker_initializer_args: t.Tuple = (),
+        executor: t.Optional[concurrent.futures.Executor] = None,
+    ):
+        self.queue_folder_abs_path = queue_folder_abs_path
+        self.job_function = job_function
+        self.max_workers = max_workers
+        self.max_pending_jobs = max_pending_jobs
+        self.job_timeout_seconds = job_timeout_seconds
+        self.worker_initializer = worker_initializer
+        self.worker_initializer_args = worker_initializer_args
+        self.__executor = executor or self.__create_process_pool()
+        # bumped whenever the process pool is replaced, jobs of an older pool are requeued
+        self.__pool_generation = 0
+        # submits which passed the max_pending_jobs check but are not inserted yet
+        self.__reserved_job_count = 0
+        os.makedirs(self.__inputs_folder(), exist_ok=True)
+        os.makedirs(self.__results_folder(), exist_ok=True)
+        self.__db = sqlite3.connect(
+            os.path.join(queue_folder_abs_path, DATABASE_FILE_NAME)
+        )
+        self.__db.row_factory = sqlite3.Row
+        self.__db.execute(
+            """CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                report_args TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                content_type TEXT,
+                error TEXT
+            )"""
+        )
+        self.__db.commit()
+        self.__pending_ids: t.Optional[asyncio.Queue] = None
+        self.__workers: t.List[asyncio.Task] = []
+
+    def __create_process_pool(self) -> concurrent.futures.ProcessPoolExecutor:
+        return concurrent.futures.ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            initializer=self.worker_initializer,
+            initargs=self.worker_initializer_args,
+        )
+
+    def __replace_process_pool(self) -> bool:
+        """
+        Kills the processes of the pool, the only way to stop a job which timed out,
+        and starts a new pool. The other jobs running on it are requeued. Returns
+        False for executors whose jobs can't be killed(e.g. threads)
+        """
+        executor = self.__executor
+        if not isinstance(executor, concurrent.futures.ProcessPoolExecutor):
+            return False
+        # pylint: disable=protected-access
+        for process in list((executor._processes or {}).values()):
+            process.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+        self.__executor = self.__create_process_pool()
+        self.__pool_generation += 1
+        return True
+
+    def __inputs_folder(self) -> str:
+        return os.path.join(self.queue_folder_abs_path, INPUTS_FOLDER_NAME)
+
+    def __results_folder(self) -> str:
+        return os.path.join(self.queue_folder_abs_path, RESULTS_FOLDER_NAME)
+
+    def input_file_path(self, job_id: str) -> str:
+        return os.path.join(self.__inputs_folder(), job_id)
+
+    def result_file_path(self, job_id: str) -> str:
+        return os.path.join(self.__results_folder(), job_id)
+
+    def __update(self, job_id: str, **columns):
+        columns["updated_at"] = time.time()
+        assignments = ", ".join(f"{column} = ?" for column in columns)
+        self.__db.execute(
+            f"UPDATE jobs SET {assignments} WHERE id = ?",
+            [*columns.values(), job_id],
+        )
+        self.__db.commit()
+
+    async def start(self):
+        """
+        Re-queues the jobs interrupted by a restart and starts the workers
+        """
+        self.__pending_ids = asyncio.Queue()
+        self.__db.execute(
+            "UPDATE jobs SET status = ? WHERE status = ?",
+            (QUEUED_STATUS, RUNNING_STATUS),
+        )
+        self.__db.commit()
+        for row in self.__db.execute(
+            "SELECT id FROM jobs WHERE status = ? ORDER BY created_at",
+            (QUEUED_STATUS,),
+        ):
+            self.__pending_ids.put_nowait(row["id"])
+        if self.__pending_ids.qsize():
+            logger.log(f"Resuming {self.__pending_ids.qsize()} queued jobs")
+        self.__workers = [
+            asyncio.create_task(self.__work()) for _ in range(self.max_workers)
+        ]
+
+    async def stop(self):
+        for worker in self.__workers:
+            worker.cancel()
+        await asyncio.gather(*self.__workers, return_exceptions=True)
+        self.__workers = []
+        self.__executor.shutdown(wait=False, cancel_futures=True)
+        self.__db.close()
+
+    def pending_job_count(self) -> int:
+        return self.__db.execute(
+            "SELECT COUNT(*) FROM jobs WHERE status IN (?, ?)",
+            (QUEUED_STATUS, RUNNING_STATUS),
+        ).fetchone()[0]
+
+    async def submit(self, file_bytes: bytes, report_args: t.Dict[str, t.Any]) -> Job:
+        assert self.__pending_ids is not None, "JobQueue.start() has to be awaited first"
+        # the slot is reserved before the first await, so concurrent submits can't
+        # all pass the check
+        if self.pending_job_count() + self.__reserved_job_count >= self.max_pending_jobs:
+            raise QueueFullError(
+                f"{self.max_pending_jobs} jobs are already pending, retry later"
+            )
+        self.__reserved_job_count += 1
+        job_id = uuid.uuid4().hex
+        try:
+            await asyncio.to_thread(self.__write_input, job_id, file_bytes)
+            now = time.time()
+            self.__db.execute(
+                "INSERT INTO jobs (id, status, report_args, created_at, updated_at) "
+                + "VALUES (?, ?, ?, ?, ?)",
+                (job_id, QUEUED_STATUS, json.dumps(report_args), now, now),
+            )
+            self.__db.commit()
+        finally:
+            self.__reserved_job_count -= 1
+        self.__pending_ids.put_nowait(job_id)
+        return self.get(job_id)
+
+    def __write_input(self, job_id: str, file_bytes: bytes):
+        with open(self.input_file_path(job_id), "wb") as f:
+            f.write(file_bytes)
+
+    def get(self, job_id: str) -> t.Optional[Job]:
+        row = self.__db.execute(
+            "SELECT id, status, attempts, created_at, updated_at, content_type, error "
+            + "FROM jobs WHERE id = ?",
+            (job_id,),
+        ).fetchone()
+        return Job(**dict(row)) if row is not None else None
+
+    async def read_result(self, job_id: str) -> bytes:
+        def read() -> bytes:
+            with open(self.result_file_path(job_id), "rb") as f:
+                return f.read()
+
+        return await asyncio.to_thread(read)
+
+    async def __work(self):
+        while True:
+            job_id = await self.__pending_ids.get()
+            row = self.__db.execute(
+                "SELECT report_args, attempts FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+            self.__update(job_id, status=RUNNING_STATUS, attempts=row["attempts"] + 1)
+            # there are as many of these loops as workers, so the job starts right away
+            # and its timeout counts from its start
+            pool_generation = self.__pool_generation
+            job_future = None
+            try:
+                job_future = asyncio.wrap_future(
+                    self.__executor.submit(
+                        run_job,
+                        self.job_function,
+                        json.loads(row["report_args"]),
+                        self.input_file_path(job_id),
+                        self.result_file_path(job_id),
+                    )
+                )
+                status, content_type, metrics_snapshot = await asyncio.wait_for(
+                    asyncio.shield(job_future), timeout=self.job_timeout_seconds
+                )
+            except asyncio.TimeoutError:
+                self.__update(
+                    job_id,
+                    status=FAILED_STATUS,
+                    error=f"Timed out after {self.job_timeout_seconds} seconds",
+                )
+                if not self.__replace_process_pool():
+                    # the slot of the worker only frees up once the job returns
+                    await asyncio.wait([job_future])
+            except concurrent.futures.BrokenExecutor as e:
+                # a worker process died(e.g. crashed or was killed) and took the pool down,
+                # the first job to notice starts a new pool for the following ones
+                killed_along = pool_generation != self.__pool_generation
+                replaced = not killed_along and self.__replace_process_pool()
+                # jobs which were killed along with another one or never started are requeued
+                requeue = killed_along or (job_future is None and replaced)
+                if requeue and row["attempts"] + 1 < MAX_JOB_ATTEMPTS:
+                    self.__update(job_id, status=QUEUED_STATUS)
+                    self.__pending_ids.put_nowait(job_id)
+                    continue
+                self.__update(job_id, status=FAILED_STATUS, error=f"{type(e).__name__}: {e}")
+            except JobError as e:
+                if e.metrics_snapshot is not None:
+                    metrics.merge(e.metrics_snapshot)
+                self.__update(job_id, status=FAILED_STATUS, error=str(e))
+            except Exception as e:  # pylint: disable=broad-except
+                self.__update(job_id, status=FAILED_STATUS, error=f"{type(e).__name__}: {e}")
+            else:
+                if metrics_snapshot is not None:
+                    metrics.merge(metrics_snapshot)
+                if status == 200:
+                    self.__update(job_id, status=DONE_STATUS, content_type=content_type)
+                else:
+                    error = await self.read_result(job_id)
+                    self.__update(
+                        job_id, status=FAILED_STATUS, error=error.decode("utf-8", "replace")
+                    )
+            finally:
+                self.__pending_ids.task_done()
+            metrics.inc("jobs_total", status=self.get(job_id)["status"])
+            if os.path.exists(self.input_file_path(job_id)):
+                await asyncio.to_thread(os.remove, self.input_file_path(job_id))
@@ -0,0 +1,106 @@
+"""Precomputes the market values of FA report periods for every ticker.
+
+Usage:
+    ./run.py snapshot -o <snapshot.json> -ay 2025 [-cal calendar financial] [--tickers adbe goog]
+
+The closing price and rate, the FMV at the end of the previous period, the INR
+rate at the period start and the peak of the whole period are computed once per
+ticker and period. Runs and servers started with `--snapshot <snapshot.json>`
+read them instead of recomputing them for every report. An existing snapshot is
+extended, entries of changed historic data are recomputed.
+"""
+import argparse
+import os
+import typing as t
+
+from parser.itr import faa3_parser
+from utils import logger, period_snapshot, ticker_mapping
+from utils.market_data import MarketDataService
+from utils.rates import rate_sources
+
+
+def create_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="run.py snapshot",
+        description="Precompute the market values of FA report periods for every ticker",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        dest="snapshot_file",
+        required=True,
+        help="Snapshot file to write(or extend)",
+    )
+    parser.add_argument(
+        "-cal",
+        "--calendar-mode",
+        nargs="+",
+        default=["calendar"],
+        choices=["calendar", "financial"],
+        dest="calendar_modes",
+        help="default = calendar",
+    )
+    parser.add_argument(
+        "-ay",
+        "--assessment-year",
+        nargs="+",
+        type=int,
+        required=True,
+        dest="assessment_years",
+    )
+    parser.add_argument(
+        "--tickers",
+        nargs="+",
+        default=None,
+        help="Tickers to precompute, default = every ticker of the registry with share prices",
+    )
+    parser.add_argument(
+        "--historic-data",
+        dest="historic_data_folder",
+        default=None,
+        help="Folder laid out like historic_data to read the share prices and rates from",
+    )
+    parser.add_argument(
+        "--rate-policy",
+        default=rate_sources.RBI_PREV_MONTH_POLICY,
+        choices=rate_sources.RATE_POLICIES,
+        help="INR rates the values are computed with, default = "
+        + f"{rate_sources.RBI_PREV_MONTH_POLICY}",
+    )
+    parser.add_argument(
+        "--ticker-registry",
+        action="append",
+        dest="ticker_registry_files",
+        default=[],
+        help="CSV with more tickers, added to the built in utils/tickers.csv",
+    )
+    parser.add_argument(
+        "-v", "--verbose", action="store_true", dest="debug", help="Enable the debug logs"
+    )
+    return parser
+
+
+def main(argv: t.List[str]):
+    args = create_arg_parser().parse_args(argv)
+    ticker_mapping.set_registry_files(
+        [ticker_mapping.DEFAULT_REGISTRY_FILE_ABS_PATH] + args.ticker_registry_files
+    )
+    snapshot_file_abs_path = os.path.abspath(args.snapshot_file)
+    snapshot = (
+        period_snapshot.load(snapshot_file_abs_path)
+        if os.path.exists(snapshot_file_abs_path)
+        else period_snapshot.PeriodSnapshot()
+    )
+    with logger.debug_context(args.debug):
+        faa3_parser.compute_snapshot(
+            [
+                (calendar_mode, assessment_year)
+                for calendar_mode in args.calendar_modes
+                for assessment_year in args.assessment_years
+            ],
+            [ticker.lower() for ticker in args.tickers] if args.tickers is not None else None,
+            MarketDataService(args.historic_data_folder, rate_policy=args.rate_policy),
+            snapshot,
+        )
+    period_snapshot.save(snapshot_file_abs_path, snapshot)
+    logger.log(f"Snapshot of {len(snapshot)} ticker periods written to {snapshot_file_abs_path}")
@@ -0,0 +1,344 @@
+"""Daemon generating FA entries for every broker export dropped into a folder.
+
+Usage:
+    ./run.py watch -i <input_folder> -o <output_folder> -ay 2025 [-cal calendar] [--polling]
+        [--metrics-file sefa.prom]
+
+Every new or changed file is routed to its parser by sniffing its sheets or header
+row and its entries are written under <output_folder>/<file name without extension>.
+The content hash of every processed file is kept in processed_files.json with the
+periods, ticker and historic data versions it was processed with, so unchanged
+files are never parsed twice, across restarts too, unless one of these changed.
+"""
+import argparse
+import json
+import os
+import queue
+import time
+import typing as t
+
+from parser.demat import source_detector, source_parser
+from parser.itr import faa3_parser
+from utils import file_utils, logger, metrics
+from utils.market_data import MarketDataService, default_service
+from utils.rates import rate_sources
+from utils.run_options import RunOptions
+
+LEDGER_FILE_NAME = "processed_files.json"
+DEFAULT_POLL_INTERVAL_SECONDS = 2.0
+# editors and Excel keep lock/temporary files next to the real ones
+IGNORED_FILE_PREFIXES = (".", "~$")
+
+FileState = t.Tuple[int, int]
+
+
+class WatchFolder:
+    """
+    Files are only processed once their size and modification time stopped changing
+    for a poll interval, so half copied exports are not parsed. Changes are picked
+    up from filesystem events when `watchdog` is installed, else by polling
+    """
+
+    def __init__(
+        self,
+        input_folder_abs_path: str,
+        output_folder_abs_path: str,
+        periods: t.List[faa3_parser.Period],
+        ticker: t.Optional[str] = None,
+        poll_interval_seconds: float = DEFAULT_POLL_INTERVAL_SECONDS,
+        metrics_file_abs_path: t.Optional[str] = None,
+        market_data: t.Optional[MarketDataService] = None,
+        options: t.Optional[RunOptions] = None,
+    ):
+        self.input_folder_abs_path = input_folder_abs_path
+        self.output_folder_abs_path = output_folder_abs_path
+        self.periods = periods
+        self.ticker = ticker
+        self.poll_interval_seconds = poll_interval_seconds
+        # rewritten after every file handled, metrics are enabled by main
+        self.metrics_file_abs_path = metrics_file_abs_path
+        # stays loaded between the files
+        self.market_data = market_data or default_service()
+        self.options = options or RunOptions()
+        self.__ledger_file_abs_path = os.path.join(output_folder_abs_path, LEDGER_FILE_NAME)
+        self.__ledger: t.Dict[str, t.Dict[str, t.Any]] = {}
+        if os.path.exists(self.__ledger_file_abs_path):
+            with open(self.__ledger_file_abs_path, encoding="utf-8") as f:
+                self.__ledger = json.load(f)
+        self.__known_states: t.Dict[str, FileState] = {}
+        self.__candidates: t.Dict[str, FileState] = {}
+        self.__events: "queue.Queue[str]" = queue.Queue()
+
+    def __file_state(self, file_abs_path: str) -> t.Optional[FileState]:
+        try:
+            stat = os.stat(file_abs_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
+    def __list_files(self) -> t.List[str]:
+        return [
+            entry.path
+            for entry in os.scandir(self.input_folder_abs_path)
+            if entry.is_file() and not entry.name.startswith(IGNORED_FILE_PREFIXES)
+        ]
+
+    def scan(self):
+        """Polls the input folder for new or changed files"""
+        for file_abs_path in self.__list_files():
+            self.__events.put(file_abs_path)
+
+    def process_pending(self) -> t.List[str]:
+        """
+        Processes the files which stayed unchanged since they were last seen and
+        returns their paths
+        """
+        processed = []
+        handled_count = 0
+        for file_abs_path, seen_state in list(self.__candidates.items()):
+            state = self.__file_state(file_abs_path)
+            if state != seen_state:
+                # still being written, or removed
+                if state is None:
+                    del self.__candidates[file_abs_path]
+                else:
+                    self.__candidates[file_abs_path] = state
+                continue
+            del self.__candidates[file_abs_path]
+            self.__known_states[file_abs_path] = state
+            handled_count += 1
+            if self.process_file(file_abs_path):
+                processed.append(file_abs_path)
+        if handled_count and self.metrics_file_abs_path is not None:
+            metrics.write_textfile(self.metrics_file_abs_path)
+
+        # new sightings are only processed by the next call, once they have settled
+        while True:
+            try:
+                file_abs_path = self.__events.get_nowait()
+            except queue.Empty:
+                break
+            state = self.__file_state(file_abs_path)
+            if state is not None and state != self.__known_states.get(file_abs_path):
+                self.__candidates.setdefault(file_abs_path, state)
+        return processed
+
+    def __settings(self) -> t.Dict[str, t.Any]:
+        # round trip through JSON so that the periods compare equal to stored lists
+        return json.loads(
+            json.dumps(
+                {
+                    "periods": self.periods,
+                    "ticker": self.ticker,
+                    "output_formats": sorted(self.options.output_formats),
+                    "lot_method": self.options.lot_method,
+                }
+            )
+        )
+
+    def __is_up_to_date(self, entry: t.Dict[str, t.Any]) -> bool:
+        """
+        Whether the outputs of a ledger entry were computed with the current
+        periods, ticker, rate policy and historic data
+        """
+        if entry.get("settings") != self.__settings() or "data_versions" not in entry:
+            return False
+        try:
+            data_versions = self.market_data.data_versions(entry["data_versions"]["shares"])
+        except (AssertionError, OSError):
+            return False
+        return entry["data_versions"] == data_versions
+
+    def process_file(self, file_abs_path: str) -> bool:
+        content_hash = file_utils.file_fingerprint(file_abs_path)
+        entry = self.__ledger.get(content_hash)
+        if entry is not None and self.__is_up_to_date(entry):
+            logger.debug_log(f"Skipping {file_abs_path}, its content was already processed")
+            metrics.inc("watch_files_total", result="duplicate")
+            return False
+        if entry is not None:
+            logger.log(
+                f"Reprocessing {file_abs_path}, the periods, ticker, rate policy or historic data "
+                + "changed since it was processed"
+            )
+        detection = source_detector.detect(file_abs_path)
+        if detection is None:
+            logger.log(f"Skipping {file_abs_path}, it is not a supported broker export")
+            metrics.inc("watch_files_total", result="unsupported")
+            return False
+        output_folder_abs_path = os.path.join(
+            self.output_folder_abs_path,
+            os.path.splitext(os.path.basename(file_abs_path))[0],
+        )
+        logger.log(f"Processing {file_abs_path} as {detection.source_mode}")
+        changed_data = self.market_data.refresh_data_versions()
+        if changed_data:
+            logger.log(f"Reloading the updated historic data of {changed_data}")
+        try:
+            purchases = source_parser.parse(
+                detection.source_mode,
+                file_abs_path,
+                output_folder_abs_path,
+                self.ticker,
+                detection.columns,
+                market_data=self.market_data,
+                options=self.options,
+            )
+            faa3_parser.parse_periods(
+                self.periods,
+                purchases,
+                output_folder_abs_path,
+                market_data=self.market_data,
+                options=self.options,
+            )
+            data_versions = self.market_data.data_versions(
+                {purchase.ticker for purchase in purchases}
+            )
+        except (AssertionError, ValueError, KeyError) as e:
+            # a bad export must not stop the daemon, it is retried once it changes
+            logger.log(f"Failed to process {file_abs_path} with {type(e).__name__}: {e}")
+            metrics.inc("watch_files_total", result="failed")
+            return False
+        self.__ledger[content_hash] = {
+            "file": file_abs_path,
+            "source_mode": detection.source_mode,
+            "output": output_folder_abs_path,
+            "processed_at": int(time.time()),
+            # the outputs are recomputed when any of these change
+            "settings": self.__settings(),
+            "data_versions": data_versions,
+        }
+        file_utils.write_to_file(
+            self.output_folder_abs_path, LEDGER_FILE_NAME, self.__ledger, True
+        )
+        metrics.inc("watch_files_total", result="processed")
+        return True
+
+    def __start_observer(self):
+        try:
+            # pylint: disable=import-outside-toplevel
+            from watchdog.events import FileSystemEventHandler
+            from watchdog.observers import Observer
+        except ImportError:
+            logger.log(
+                f"Polling {self.input_folder_abs_path} every {self.poll_interval_seconds}s, "
+                + 'install "watchdog" for filesystem events'
+            )
+            return None
+
+        events = self.__events
+
+        class Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                if event.is_directory:
+                    return
+                events.put(getattr(event, "dest_path", None) or event.src_path)
+
+        observer = Observer()
+        observer.schedule(Handler(), self.input_folder_abs_path, recursive=False)
+        observer.start()
+        logger.log(f"Watching {self.input_folder_abs_path} for filesystem events")
+        return observer
+
+    def run(self, polling: bool = False):
+        observer = None if polling else self.__start_observer()
+        self.scan()
+        try:
+            while True:
+                with logger.debug_context(self.options.debug or logger.is_debug()):
+                    self.process_pending()
+                time.sleep(self.poll_interval_seconds)
+                if observer is None:
+                    self.scan()
+        finally:
+            if observer is not None:
+                observer.stop()
+                observer.join()
+
+
+def create_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="run.py watch",
+        description="Generate FA entries for every broker export dropped into a folder",
+    )
+    parser.add_argument(
+        "-i", "--input", dest="input_folder", required=True, help="Folder to watch"
+    )
+    parser.add_argument(
+        "-o", "--output", dest="output_folder", required=True, help="Folder for the outputs"
+    )
+    parser.add_argument(
+        "-cal",
+        "--calendar-mode",
+        nargs="+",
+        default=["calendar"],
+        choices=["calendar", "financial"],
+        dest="calendar_modes",
+        help="default = calendar",
+    )
+    parser.add_argument(
+        "-ay",
+        "--assessment-year",
+        nargs="+",
+        type=int,
+        required=True,
+        dest="assessment_years",
+    )
+    parser.add_argument(
+        "-t",
+        "--ticker",
+        default=None,
+        help="Ticker for the exports which lack a Symbol column(e.g. morgan_stanley)",
+    )
+    parser.add_argument(
+        "--rate-policy",
+        default=rate_sources.RBI_PREV_MONTH_POLICY,
+        choices=rate_sources.RATE_POLICIES,
+        help="INR rates the FA entries are computed with, default = "
+        + f"{rate_sources.RBI_PREV_MONTH_POLICY}",
+    )
+    parser.add_argument(
+        "--poll-interval",
+        type=float,
+        default=DEFAULT_POLL_INTERVAL_SECONDS,
+        dest="poll_interval_seconds",
+        help=f"default = {DEFAULT_POLL_INTERVAL_SECONDS}",
+    )
+    parser.add_argument(
+        "--polling",
+        action="store_true",
+        help="Poll the folder even when watchdog is installed(e.g. on network shares)",
+    )
+    parser.add_argument(
+        "--metrics-file",
+        dest="metrics_file",
+        default=None,
+        help="File rewritten with the counters and stage latencies in the Prometheus text format "
+        + "after every handled file",
+    )
+    parser.add_argument(
+        "-v", "--verbose", action="store_true", dest="debug", help="Enable the debug logs"
+    )
+    return parser
+
+
+def main(argv: t.List[str]):
+    args = create_arg_parser().parse_args(argv)
+    periods = [
+        (calendar_mode, assessment_year)
+        for calendar_mode in args.calendar_modes
+        for assessment_year in args.assessment_years
+    ]
+    os.makedirs(args.output_folder, exist_ok=True)
+    if args.metrics_file:
+        metrics.enable()
+    WatchFolder(
+        os.path.abspath(args.input_folder),
+        os.path.abspath(args.output_folder),
+        periods,
+        ticker=args.ticker,
+        poll_interval_seconds=args.poll_interval_seconds,
+        metrics_file_abs_path=os.path.abspath(args.metrics_file) if args.metrics_file else None,
+        market_data=MarketDataService(rate_policy=args.rate_policy),
+        options=RunOptions(write_debug_artifacts=False, debug=args.debug),
+    ).run(polling=args.polling)
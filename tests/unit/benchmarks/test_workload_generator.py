@@ -0,0 +1,51 @@
+import csv
+import datetime
+
+import pandas as pd
+
+from benchmarks import workload_generator
+from parser.demat import source_detector, source_parser
+from parser.demat.etrade import etrade_holdings_bystatus_parser
+from parser.demat.morgan_stanley import morgan_stanley_rsu_parser
+from utils import file_utils
+from utils.market_data import MarketDataService
+
+
+def test_generated_inputs_are_detected_and_parsed(tmp_path):
+    manifest = workload_generator.generate_workload(
+        str(tmp_path), 3, 5, ["goog"], 2023, 2024, seed=1
+    )
+
+    assert [each["source_mode"] for each in manifest["inputs"]] == [
+        source_parser.ETRADE_BENEFIT_HISTORY_MODE,
+        source_parser.ETRADE_HOLDINGS_BYSTATUS_MODE,
+        source_parser.MORGAN_STANLEY_MODE,
+    ]
+    for each in manifest["inputs"]:
+        assert source_detector.detect(each["file"]).source_mode == each["source_mode"]
+    # both carry their own FMV, no lookup in the synthetic prices
+    sellable = etrade_holdings_bystatus_parser.parse(manifest["inputs"][1]["file"], str(tmp_path))
+    morgan_stanley = morgan_stanley_rsu_parser.parse(
+        manifest["inputs"][2]["file"], str(tmp_path), "goog"
+    )
+    assert len(sellable) == 5
+    assert len(morgan_stanley) == 5
+    for purchase in sellable + morgan_stanley:
+        assert datetime.datetime.fromtimestamp(purchase.date["time_in_millis"] / 1000).weekday() < 5
+
+
+def test_generated_historic_data_matches_repo_layout(tmp_path, monkeypatch):
+    workload_generator.generate_workload(str(tmp_path), 1, 2, ["goog"], 2024, 2024, seed=1)
+    monkeypatch.setenv(file_utils.HISTORIC_DATA_FOLDER_ENV, str(tmp_path / "historic_data"))
+    market_data = MarketDataService()
+
+    with open(market_data.share_file_path("goog"), newline="") as f:
+        rows = list(csv.DictReader(f))
+    rates = pd.read_excel(market_data.rates_file_path(), sheet_name="Reference Rates", skiprows=2)
+
+    assert rows[0]["Date"] == "01/31/2025"
+    assert rows[-1]["Date"] == "12/01/2023"
+    assert rows[0]["Close/Last"].startswith("$")
+    assert list(rates.columns) == ["Date", "Time", "Currency Pairs", "Rate", "Comments"]
+    assert set(rates["Currency Pairs"]) == {"INR / 1 USD"}
+    assert rates["Date"].iloc[0] == "31 Jan 2025"
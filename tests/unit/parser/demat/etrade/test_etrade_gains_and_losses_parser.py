@@ -0,0 +1,30 @@
+import pandas as pd
+from parser.demat.etrade import etrade_gains_and_losses_parser
+
+
+def test_sell_row_parsing():
+    sale = etrade_gains_and_losses_parser.parse_sell_row(
+        pd.Series(
+            {
+                "Record Type": "Sell",
+                "Symbol": "ADBE",
+                "Qty.": "2",
+                "Date Acquired": "06/30/2020",
+                "Date Sold": "10/15/2023",
+                "Proceeds Per Share": "$560.10",
+            }
+        )
+    )
+    assert sale is not None
+    assert sale.ticker == "adbe"
+    assert sale.quantity == 2.0
+    assert sale.date["disp_time"] == "15-Oct-2023"
+    assert sale.lot_date["disp_time"] == "30-Jun-2020"
+    assert sale.sale_price.price == 560.10
+
+
+def test_summary_row_is_skipped():
+    sale = etrade_gains_and_losses_parser.parse_sell_row(
+        pd.Series({"Record Type": "Summary"})
+    )
+    assert sale is None
@@ -23,3 +23,20 @@ def test_parse_morgan_stanley_rsu_from_dataframe():
     assert first.ticker == "adbe"
     assert first.quantity == 10.332
     assert first.date["disp_time"] == "25-Dec-2024"
+
+
+def test_parse_morgan_stanley_sales_from_dataframe():
+    data = {
+        "Date": ["25-Dec-2024", "02-Jan-2025", "03-Jan-2025"],
+        "Type": ["Released Shares", "Sale", "Sale"],
+        "Order Status": ["Completed", "Completed", "Cancelled"],
+        "Price": ["17,440.85", "$190.50", "$191.00"],
+        "Quantity": ["10.332", "-4.5", "-1"],
+        "Symbol": ["GOOG"] * 3,
+    }
+    sales = morgan_stanley_rsu_parser.parse_sales_df(pd.DataFrame(data))
+    assert len(sales) == 1
+    assert sales[0].ticker == "goog"
+    assert sales[0].quantity == 4.5
+    assert sales[0].sale_price.price == 190.5
+    assert sales[0].date["disp_time"] == "02-Jan-2025"
@@ -0,0 +1,46 @@
+import openpyxl
+
+from parser.demat import source_detector, source_parser
+
+
+def test_detects_etrade_workbook_from_sheet_names(tmp_path):
+    workbook = openpyxl.Workbook()
+    workbook.active.title = "ESPP"
+    workbook.active.append(["Record Type", "Symbol"])
+    workbook.create_sheet("Restricted Stock")
+    workbook.save(tmp_path / "BenefitHistory.xlsx")
+
+    detection = source_detector.detect(str(tmp_path / "BenefitHistory.xlsx"))
+
+    assert detection.source_mode == source_parser.ETRADE_BENEFIT_HISTORY_MODE
+    assert detection.columns is None
+
+
+def test_detects_morgan_stanley_columns_from_header_row(tmp_path):
+    workbook = openpyxl.Workbook()
+    workbook.active.append(["Vest Date", "Type", "Status", "Qty", "Symbol"])
+    workbook.active.append(["25-Dec-2024", "Released Shares", "Completed", 4, "GOOG"])
+    workbook.save(tmp_path / "activity.xlsx")
+    (tmp_path / "activity.csv").write_text(
+        "Date,Type,Order Status,Price,Quantity\n", encoding="utf-8"
+    )
+
+    sheet_names, header = source_detector.read_excel_layout(str(tmp_path / "activity.xlsx"))
+    excel_detection = source_detector.detect(str(tmp_path / "activity.xlsx"))
+    csv_detection = source_detector.detect(str(tmp_path / "activity.csv"))
+
+    assert sheet_names == ["Sheet"]
+    assert header == ["Vest Date", "Type", "Status", "Qty", "Symbol"]
+    assert excel_detection.source_mode == source_parser.MORGAN_STANLEY_MODE
+    assert excel_detection.columns["date"] == "Vest Date"
+    assert excel_detection.columns["status"] == "Status"
+    assert excel_detection.columns["quantity"] == ["Qty"]
+    assert csv_detection.columns["quantity"] == ["Quantity"]
+
+
+def test_unknown_files_are_not_detected(tmp_path):
+    (tmp_path / "other.csv").write_text("a,b\n1,2\n", encoding="utf-8")
+    (tmp_path / "broken.xlsx").write_bytes(b"not a zip")
+
+    assert source_detector.detect(str(tmp_path / "other.csv")) is None
+    assert source_detector.detect(str(tmp_path / "broken.xlsx")) is None
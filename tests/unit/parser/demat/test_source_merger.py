@@ -0,0 +1,124 @@
+import json
+
+import pytest
+
+from models.purchase import Price, Purchase
+from models.sale import Sale
+from parser.demat import source_merger
+from parser.demat.etrade import etrade_gains_and_losses_parser
+from utils import date_utils
+
+
+def __purchase(disp_time: str, quantity: float, ticker: str = "adbe") -> Purchase:
+    return Purchase(
+        date_utils.parse_named_mon(disp_time), Price(100.0, "USD"), quantity, ticker
+    )
+
+
+def test_merge_by_date_interleaves_sources_in_date_order():
+    etrade = [__purchase("15-Jan-2024", 1), __purchase("15-Jul-2024", 2)]
+    morgan_stanley = [
+        __purchase("25-Mar-2024", 3, "goog"),
+        __purchase("15-Jul-2024", 4, "goog"),
+    ]
+
+    merged = list(
+        source_merger.merge_by_date([("etrade", etrade), ("ms", morgan_stanley)])
+    )
+
+    # same dates keep the order of the sources
+    assert [purchase.quantity for purchase in merged] == [1, 3, 2, 4]
+
+
+def test_merge_by_date_rejects_unsorted_source():
+    unsorted = [__purchase("15-Jul-2024", 1), __purchase("15-Jan-2024", 2)]
+    with pytest.raises(AssertionError, match="not sorted"):
+        list(source_merger.merge_by_date([("etrade", unsorted), ("ms", [])]))
+
+
+def test_merge_unique_purchases_skips_rows_of_overlapping_exports():
+    # two identical lots on the same day are legit within a single export
+    first_download = [
+        __purchase("15-Jan-2024", 1),
+        __purchase("15-Jan-2024", 1),
+        __purchase("15-Jul-2024", 2),
+    ]
+    second_download = [
+        __purchase("15-Jan-2024", 1),
+        __purchase("15-Jul-2024", 2),
+        __purchase("15-Dec-2024", 5),
+    ]
+    deduplicator = source_merger.PurchaseDeduplicator()
+
+    merged = list(
+        source_merger.merge_unique_purchases(
+            [("first", first_download), ("second", second_download)], deduplicator
+        )
+    )
+
+    assert [purchase.quantity for purchase in merged] == [1, 1, 2, 5]
+    assert deduplicator.duplicate_count == 2
+
+
+def test_merge_unique_purchases_keeps_rows_with_other_source_ref():
+    first = __purchase("15-Jan-2024", 1)
+    first.source_ref = "ms:1"
+    second = __purchase("15-Jan-2024", 1)
+    second.source_ref = "ms:2"
+
+    merged = list(
+        source_merger.merge_unique_purchases([("a", [first]), ("b", [second, first])])
+    )
+
+    assert [purchase.source_ref for purchase in merged] == ["ms:1", "ms:2"]
+
+
+def __sale(disp_time: str, quantity: float, sale_price: float = 150.0) -> Sale:
+    return Sale(date_utils.parse_named_mon(disp_time), quantity, "adbe", Price(sale_price, "USD"))
+
+
+def test_merge_unique_sales_skips_sales_of_overlapping_exports():
+    first_download = [__sale("15-Jan-2024", 1), __sale("15-Jan-2024", 1), __sale("15-Jul-2024", 2)]
+    second_download = [
+        __sale("15-Jan-2024", 1),
+        __sale("15-Jul-2024", 2, sale_price=160.0),
+        __sale("15-Dec-2024", 5),
+    ]
+    deduplicator = source_merger.SaleDeduplicator()
+
+    merged = list(
+        source_merger.merge_unique_sales(
+            [("first", first_download), ("second", second_download)], deduplicator
+        )
+    )
+
+    assert [(sale.quantity, sale.sale_price.price) for sale in merged] == [
+        (1, 150.0),
+        (1, 150.0),
+        (2, 150.0),
+        (2, 160.0),
+        (5, 150.0),
+    ]
+    assert deduplicator.duplicate_count == 1
+
+
+def test_parse_sales_inputs_writes_the_merged_sales_once(tmp_path, monkeypatch):
+    downloads = {
+        "first.xlsx": [__sale("15-Jan-2024", 1), __sale("15-Jul-2024", 2)],
+        "second.xlsx": [__sale("15-Jul-2024", 2), __sale("15-Dec-2024", 5)],
+    }
+    monkeypatch.setattr(
+        etrade_gains_and_losses_parser,
+        "parse",
+        lambda path, output, write_debug_artifacts, debug: downloads[path],
+    )
+
+    sales = source_merger.parse_sales_inputs(
+        list(downloads),
+        source_merger.ETRADE_GAINS_AND_LOSSES_SALES_MODE,
+        str(tmp_path),
+    )
+
+    assert [sale.quantity for sale in sales] == [1, 2, 5]
+    with open(tmp_path / "sales.json", encoding="utf-8") as f:
+        assert [sale["quantity"] for sale in json.load(f)] == [1, 2, 5]
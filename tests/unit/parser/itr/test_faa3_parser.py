@@ -0,0 +1,41 @@
+from benchmarks import workload_generator
+from models.purchase import Price, Purchase
+from parser.itr import faa3_parser
+from utils import date_utils
+from utils.market_data import MarketDataService
+from utils.run_options import RunOptions
+
+
+def __purchases():
+    return [
+        Purchase(date_utils.parse_named_mon(date), Price(100.0, "USD"), quantity, "goog")
+        for date, quantity in [("15-Jun-2022", 5), ("15-Jun-2023", 3), ("02-Jul-2024", 2)]
+    ]
+
+
+def test_incremental_runs_of_other_periods_in_the_same_folder(tmp_path):
+    workload_generator.generate_workload(str(tmp_path), 1, 1, ["goog"], 2022, 2024, seed=1)
+    market_data = MarketDataService(str(tmp_path / "historic_data"))
+    options = RunOptions(write_debug_artifacts=False, incremental=True)
+    output = str(tmp_path / "out")
+    fresh_output = str(tmp_path / "fresh")
+
+    faa3_parser.parse(
+        "calendar", __purchases(), 2024, output, market_data=market_data, options=options
+    )
+    faa3_parser.parse(
+        "calendar", __purchases(), 2025, output, market_data=market_data, options=options
+    )
+    faa3_parser.parse(
+        "calendar",
+        __purchases(),
+        2025,
+        fresh_output,
+        market_data=market_data,
+        options=RunOptions(write_debug_artifacts=False),
+    )
+
+    with open(tmp_path / "out" / "goog" / "fa_entries.csv", encoding="utf-8") as f:
+        entries = f.read()
+    with open(tmp_path / "fresh" / "goog" / "fa_entries.csv", encoding="utf-8") as f:
+        assert entries == f.read()
@@ -0,0 +1,48 @@
+from models.purchase import Purchase, Price
+from parser.itr import faa3_state
+from utils import date_utils
+
+DATA_VERSIONS = {"share_data": "abc", "rbi_rates": "def"}
+LOT_VALUES = {"purchase_price": 100.0, "peak_price": 150.0, "closing_price": 120.0}
+
+
+def create_purchase(quantity: float) -> Purchase:
+    return Purchase(
+        date=date_utils.parse_named_mon("30-Jun-2023"),
+        purchase_fmv=Price(435.31, "USD"),
+        quantity=quantity,
+        ticker="adbe",
+    )
+
+
+def test_saved_lots_are_reused_by_the_next_run(tmp_path):
+    state = faa3_state.load(str(tmp_path), DATA_VERSIONS)
+    assert state.get_lot(create_purchase(2)) is None
+    state.put_lot(create_purchase(2), LOT_VALUES)
+    state.put_previous_period(create_purchase(10), LOT_VALUES)
+    faa3_state.save(str(tmp_path), state)
+
+    next_state = faa3_state.load(str(tmp_path), DATA_VERSIONS)
+    assert next_state.get_lot(create_purchase(2)) == LOT_VALUES
+    assert next_state.get_lot(create_purchase(3)) is None
+    assert next_state.get_previous_period(create_purchase(10)) == LOT_VALUES
+    assert next_state.get_previous_period(create_purchase(11)) is None
+    assert next_state.reused_lot_count == 1
+
+
+def test_state_is_dropped_when_historic_data_changes(tmp_path):
+    state = faa3_state.load(str(tmp_path), DATA_VERSIONS)
+    state.put_lot(create_purchase(2), LOT_VALUES)
+    faa3_state.save(str(tmp_path), state)
+
+    next_state = faa3_state.load(str(tmp_path), {**DATA_VERSIONS, "share_data": "xyz"})
+    assert next_state.get_lot(create_purchase(2)) is None
+
+
+def test_lots_missing_from_the_latest_run_are_not_saved(tmp_path):
+    state = faa3_state.load(str(tmp_path), DATA_VERSIONS)
+    state.put_lot(create_purchase(2), LOT_VALUES)
+    faa3_state.save(str(tmp_path), state)
+
+    faa3_state.save(str(tmp_path), faa3_state.load(str(tmp_path), DATA_VERSIONS))
+    assert faa3_state.load(str(tmp_path), DATA_VERSIONS).get_lot(create_purchase(2)) is None
@@ -0,0 +1,105 @@
+import asyncio
+import json
+
+from service import http_server
+from utils.market_data import CachePolicy
+from utils.rates import rate_sources
+from utils.run_options import RunOptions
+
+
+async def __request(port: int, raw_request: bytes) -> bytes:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(raw_request)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    return response
+
+
+def __run_against_service(raw_request: bytes) -> bytes:
+    async def run() -> bytes:
+        server = await http_server.HttpService().start("127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            return await __request(port, raw_request)
+
+    return asyncio.run(run())
+
+
+def test_fa_report_request_runs_pipeline(monkeypatch):
+    calls = []
+
+    def fake_report(**kwargs):
+        calls.append(kwargs)
+        return http_server.Response(200, b"a,b\n1,2\n", "text/csv")
+
+    monkeypatch.setattr(http_server, "generate_fa_report", fake_report)
+    body = b"PK-fake-xlsx"
+    response = __run_against_service(
+        b"POST /fa?assessment_year=2025&format=json HTTP/1.1\r\n"
+        + b"Content-Length: %d\r\n\r\n" % len(body)
+        + body
+    )
+
+    assert response.startswith(b"HTTP/1.1 200 OK\r\n")
+    assert response.endswith(b"\r\n\r\na,b\n1,2\n")
+    assert calls[0]["file_bytes"] == body
+    assert calls[0]["assessment_year"] == 2025
+    assert calls[0]["calendar_mode"] == "calendar"
+    assert calls[0]["output_format"] == "json"
+
+
+def test_job_workers_use_the_settings_of_the_server(tmp_path, monkeypatch):
+    calls = []
+
+    def fake_report(**kwargs):
+        calls.append(kwargs)
+        return http_server.Response(200, b"", "text/csv")
+
+    monkeypatch.setattr(http_server, "generate_fa_report", fake_report)
+    # restored after the test, init_job_worker enables the metrics of the process
+    monkeypatch.setattr(http_server.metrics, "ENABLED", False)
+    cache_policy = CachePolicy(max_price_bytes=1024, max_query_entries=8)
+    options = RunOptions(write_debug_artifacts=False)
+    http_server.init_job_worker(
+        [], str(tmp_path), cache_policy, rate_sources.SBI_TT_BUY_POLICY, options
+    )
+    http_server.run_report_job(b"x", assessment_year=2025)
+
+    market_data = calls[0]["market_data"]
+    assert market_data.data_folder_abs_path == str(tmp_path)
+    assert market_data.cache_policy == cache_policy
+    assert market_data.rate_policy == rate_sources.SBI_TT_BUY_POLICY
+    assert calls[0]["options"] is options
+
+
+def test_invalid_requests_are_rejected():
+    missing_year = __run_against_service(b"POST /fa HTTP/1.1\r\nContent-Length: 1\r\n\r\nx")
+    unknown_route = __run_against_service(b"GET /nope HTTP/1.1\r\n\r\n")
+    health = __run_against_service(b"GET /health HTTP/1.1\r\n\r\n")
+
+    assert missing_year.startswith(b"HTTP/1.1 400 ")
+    for content_length in (b"abc", b"-1"):
+        invalid_length = __run_against_service(
+            b"POST /fa?assessment_year=2025 HTTP/1.1\r\nContent-Length: %s\r\n\r\nx"
+            % content_length
+        )
+        assert invalid_length.startswith(b"HTTP/1.1 400 ")
+    assert unknown_route.startswith(b"HTTP/1.1 404 ")
+    assert json.loads(health.split(b"\r\n\r\n", 1)[1])["status"] == "ok"
+
+
+def test_metrics_endpoint_counts_requests_by_route(monkeypatch):
+    monkeypatch.setattr(http_server.metrics, "ENABLED", True)
+    http_server.metrics.reset()
+
+    __run_against_service(b"GET /health HTTP/1.1\r\n\r\n")
+    __run_against_service(b"GET /jobs/123 HTTP/1.1\r\n\r\n")
+    response = __run_against_service(b"GET /metrics HTTP/1.1\r\n\r\n")
+    http_server.metrics.reset()
+
+    assert b"Content-Type: text/plain; version=0.0.4" in response
+    body = response.split(b"\r\n\r\n", 1)[1].decode("utf-8")
+    assert 'sefa_http_requests_total{method="GET",route="/health",status="200"} 1' in body
+    assert 'sefa_http_requests_total{method="GET",route="unmatched",status="404"} 1' in body
+    assert 'sefa_http_request_duration_seconds_count{route="/health"} 1' in body
@@ -0,0 +1,156 @@
+import asyncio
+import concurrent.futures
+import os
+import time
+
+import pytest
+
+from service import job_queue as jq
+from service.http_server import Response
+from utils import metrics
+
+
+def echo_report(file_bytes: bytes, delay: float = 0.0) -> Response:
+    time.sleep(delay)
+    return Response(200, file_bytes.upper(), "text/csv")
+
+
+def crashing_report(file_bytes: bytes, crash: bool = False) -> Response:
+    if crash:
+        # dies like a worker killed by the OS, without raising
+        os._exit(1)
+    return Response(200, file_bytes, "text/csv")
+
+
+def counting_report(file_bytes: bytes) -> Response:
+    metrics.inc("lots_computed_total", len(file_bytes))
+    metrics.observe("stage_duration_seconds", 0.01, stage="compute_fa_entries")
+    return Response(200, file_bytes, "text/csv")
+
+
+async def __wait_for_status(queue: jq.JobQueue, job_id: str, status: str):
+    for _ in range(200):
+        if queue.get(job_id)["status"] == status:
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"Job {job_id} is {queue.get(job_id)['status']}")
+
+
+def __queue(folder, **kwargs) -> jq.JobQueue:
+    return jq.JobQueue(
+        str(folder),
+        echo_report,
+        executor=concurrent.futures.ThreadPoolExecutor(max_workers=2),
+        **kwargs,
+    )
+
+
+def test_jobs_run_and_time_out(tmp_path):
+    async def run():
+        queue = __queue(tmp_path, max_workers=2, job_timeout_seconds=0.2)
+        await queue.start()
+        done_job = await queue.submit(b"a,b", {})
+        slow_job = await queue.submit(b"c,d", {"delay": 1})
+        await __wait_for_status(queue, done_job["id"], jq.DONE_STATUS)
+        await __wait_for_status(queue, slow_job["id"], jq.FAILED_STATUS)
+        assert await queue.read_result(done_job["id"]) == b"A,B"
+        assert "Timed out" in queue.get(slow_job["id"])["error"]
+        await queue.stop()
+
+    asyncio.run(run())
+
+
+def test_queue_rejects_beyond_max_pending_and_resumes_after_restart(tmp_path):
+    async def submit_without_workers():
+        queue = __queue(tmp_path, max_workers=0, max_pending_jobs=1)
+        await queue.start()
+        job = await queue.submit(b"x", {})
+        with pytest.raises(jq.QueueFullError):
+            await queue.submit(b"y", {})
+        await queue.stop()
+        return job
+
+    async def restart(job_id: str):
+        queue = __queue(tmp_path, max_workers=1)
+        await queue.start()
+        await __wait_for_status(queue, job_id, jq.DONE_STATUS)
+        assert await queue.read_result(job_id) == b"X"
+        await queue.stop()
+
+    job = asyncio.run(submit_without_workers())
+    asyncio.run(restart(job["id"]))
+
+
+def test_timed_out_job_is_killed_and_frees_its_worker(tmp_path):
+    async def run():
+        queue = jq.JobQueue(str(tmp_path), echo_report, max_workers=1, job_timeout_seconds=1.0)
+        await queue.start()
+        hung_job = await queue.submit(b"x", {"delay": 60})
+        next_job = await queue.submit(b"y", {})
+        started_at = time.monotonic()
+        await __wait_for_status(queue, hung_job["id"], jq.FAILED_STATUS)
+        # the timeout of the next job only starts once a worker runs it
+        for _ in range(1000):
+            if queue.get(next_job["id"])["status"] == jq.DONE_STATUS:
+                break
+            await asyncio.sleep(0.01)
+        assert queue.get(next_job["id"])["status"] == jq.DONE_STATUS
+        assert time.monotonic() - started_at < 30
+        await queue.stop()
+
+    asyncio.run(run())
+
+
+def test_crashed_worker_fails_its_job_and_the_next_job_runs(tmp_path):
+    async def run():
+        queue = jq.JobQueue(str(tmp_path), crashing_report, max_workers=1)
+        await queue.start()
+        crashed_job = await queue.submit(b"x", {"crash": True})
+        next_job = await queue.submit(b"y", {})
+        for _ in range(1000):
+            if queue.get(next_job["id"])["status"] == jq.DONE_STATUS:
+                break
+            await asyncio.sleep(0.01)
+        assert queue.get(next_job["id"])["status"] == jq.DONE_STATUS
+        assert await queue.read_result(next_job["id"]) == b"y"
+        assert queue.get(crashed_job["id"])["status"] == jq.FAILED_STATUS
+        assert "BrokenProcessPool" in queue.get(crashed_job["id"])["error"]
+        await queue.stop()
+
+    asyncio.run(run())
+
+
+def test_concurrent_submits_do_not_exceed_max_pending(tmp_path):
+    async def run():
+        queue = __queue(tmp_path, max_workers=0, max_pending_jobs=2)
+        await queue.start()
+        submits = await asyncio.gather(
+            *[queue.submit(b"x", {}) for _ in range(5)], return_exceptions=True
+        )
+        assert sum(not isinstance(submit, jq.QueueFullError) for submit in submits) == 2
+        assert queue.pending_job_count() == 2
+        await queue.stop()
+
+    asyncio.run(run())
+
+
+def test_metrics_of_worker_processes_are_merged_into_the_parent(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "ENABLED", True)
+    metrics.reset()
+
+    async def run():
+        queue = jq.JobQueue(
+            str(tmp_path), counting_report, max_workers=1, worker_initializer=metrics.enable
+        )
+        await queue.start()
+        for file_bytes in [b"ab", b"cde"]:
+            job = await queue.submit(file_bytes, {})
+            await __wait_for_status(queue, job["id"], jq.DONE_STATUS)
+        await queue.stop()
+
+    asyncio.run(run())
+    rendered = metrics.render()
+    metrics.reset()
+    assert "sefa_lots_computed_total 5" in rendered
+    assert 'sefa_stage_duration_seconds_count{stage="compute_fa_entries"} 2' in rendered
+    assert 'sefa_jobs_total{status="done"} 2' in rendered
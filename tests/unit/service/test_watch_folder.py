@@ -0,0 +1,83 @@
+from benchmarks import workload_generator
+from models.purchase import Price, Purchase
+from parser.demat import source_parser
+from parser.itr import faa3_parser
+from service import watch_folder
+from utils import date_utils
+from utils.market_data import MarketDataService
+
+MS_CSV = 'Date,Type,Order Status,Price,Quantity\n15-Mar-2024,Released Shares,Completed,"140.5",5\n'
+
+
+def test_processes_settled_files_once_per_content(tmp_path, monkeypatch):
+    parsed = []
+    monkeypatch.setattr(
+        source_parser,
+        "parse",
+        lambda mode, path, output, ticker, columns, market_data, options: parsed.append(path) or [],
+    )
+    monkeypatch.setattr(
+        faa3_parser, "parse_periods", lambda periods, purchases, output, **kwargs: None
+    )
+    input_folder = tmp_path / "in"
+    input_folder.mkdir()
+    (input_folder / "emp1.csv").write_text(MS_CSV, encoding="utf-8")
+    (input_folder / "~$emp1.csv").write_text(MS_CSV, encoding="utf-8")
+    watcher = watch_folder.WatchFolder(
+        str(input_folder), str(tmp_path / "out"), [("calendar", 2025)], ticker="goog"
+    )
+
+    watcher.scan()
+    # first sighting only records the size and modification time
+    assert watcher.process_pending() == []
+    assert watcher.process_pending() == [str(input_folder / "emp1.csv")]
+
+    (input_folder / "emp1_copy.csv").write_text(MS_CSV, encoding="utf-8")
+    watcher.scan()
+    watcher.process_pending()
+    assert watcher.process_pending() == []
+    assert parsed == [str(input_folder / "emp1.csv")]
+
+    restarted = watch_folder.WatchFolder(
+        str(input_folder), str(tmp_path / "out"), [("calendar", 2025)], ticker="goog"
+    )
+    restarted.scan()
+    restarted.process_pending()
+    assert restarted.process_pending() == []
+
+
+def test_processed_files_are_reprocessed_when_the_settings_or_data_change(tmp_path, monkeypatch):
+    workload_generator.generate_workload(str(tmp_path / "data"), 1, 1, ["goog"], 2024, 2024, seed=1)
+    market_data = MarketDataService(str(tmp_path / "data" / "historic_data"))
+    parsed = []
+    purchase = Purchase(date_utils.parse_named_mon("15-Mar-2024"), Price(140.5, "USD"), 5, "goog")
+    monkeypatch.setattr(
+        source_parser,
+        "parse",
+        lambda mode, path, output, ticker, columns, market_data, options: parsed.append(path)
+        or [purchase],
+    )
+    monkeypatch.setattr(
+        faa3_parser, "parse_periods", lambda periods, purchases, output, **kwargs: None
+    )
+    input_folder = tmp_path / "in"
+    input_folder.mkdir()
+    (input_folder / "emp1.csv").write_text(MS_CSV, encoding="utf-8")
+
+    def watch(periods):
+        watcher = watch_folder.WatchFolder(
+            str(input_folder),
+            str(tmp_path / "out"),
+            periods,
+            ticker="goog",
+            market_data=market_data,
+        )
+        return watcher.process_file(str(input_folder / "emp1.csv"))
+
+    assert watch([("calendar", 2025)])
+    assert not watch([("calendar", 2025)])
+    assert watch([("calendar", 2025), ("financial", 2025)])
+    with open(market_data.share_file_path("goog"), "a", encoding="utf-8") as f:
+        f.write("\n")
+    assert watch([("calendar", 2025), ("financial", 2025)])
+    assert len(parsed) == 3
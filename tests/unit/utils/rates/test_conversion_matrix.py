@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from benchmarks import workload_generator
+from utils import date_utils
+from utils.market_data import MarketDataService
+
+
+def __ms(date_str: str) -> int:
+    return date_utils.parse_named_mon(date_str)["time_in_millis"]
+
+
+def test_currencies_without_rbi_rates_are_derived_through_their_pivot(tmp_path):
+    workload_generator.generate_workload(str(tmp_path), 1, 1, ["goog"], 2024, 2024, seed=1)
+    data_folder = tmp_path / "historic_data"
+    cross_folder = data_folder / "rates" / "cross"
+    cross_folder.mkdir(parents=True)
+    (cross_folder / "rates.csv").write_text(
+        "Date,Currency,Pivot,Rate\n"
+        + "2024-05-31,CHF,USD,1.10\n2024-06-28,CHF,USD,1.12\n2024-06-28,SGD,USD,0.74\n"
+    )
+    market_data = MarketDataService(str(data_folder))
+    matrix = market_data.conversion_matrix()
+    times_in_ms = np.array([__ms(d) for d in ["02-Jun-2024", "15-Jul-2024", "31-Jul-2024"]])
+
+    usd = market_data.get_rates("USD", times_in_ms)
+    assert matrix.currency_codes == ["CHF", "SGD", "USD"]
+    assert list(market_data.get_rates("CHF", times_in_ms)) == pytest.approx(
+        list(usd * [1.10, 1.12, 1.12])
+    )
+    assert list(matrix.to_inr("CHF", times_in_ms, [1.0, 2.0, 0.0])) == pytest.approx(
+        [usd[0] * 1.10, 2 * usd[1] * 1.12, 0.0]
+    )
+    assert market_data.get_rate("SGD", __ms("10-Jul-2024")) == pytest.approx(
+        market_data.get_rate("USD", __ms("10-Jul-2024")) * 0.74
+    )
+    # no cross rate for the end of August
+    with pytest.raises(AssertionError, match="No rbi_prev_month rate for currency code CHF"):
+        market_data.get_rate("CHF", __ms("02-Sep-2024"))
+    with pytest.raises(AssertionError, match="rates/cross/rates.csv"):
+        market_data.rate_source("HKD")
+    assert market_data.cache_stats()["conversion_matrices"]["entries"] == 1
@@ -0,0 +1,70 @@
+import datetime
+
+import numpy as np
+import pytest
+
+from benchmarks import workload_generator
+from models.purchase import Price, Purchase
+from parser.itr import faa3_parser
+from utils import date_utils
+from utils.market_data import MarketDataService
+from utils.rates import rate_sources
+
+
+def __ms(date_str: str) -> int:
+    return date_utils.parse_named_mon(date_str)["time_in_millis"]
+
+
+def __write_sbi_rates(data_folder, rows):
+    sbi_folder = data_folder / "rates" / "sbi"
+    sbi_folder.mkdir(parents=True, exist_ok=True)
+    (sbi_folder / "SBI_REFERENCE_RATES_USD.csv").write_text(
+        "DATE,PDF FILE,TT BUY,TT SELL\n"
+        + "".join(f"{day} 09:00,link,{rate},{rate + 1}\n" for day, rate in rows)
+    )
+
+
+def test_daily_rates_resolve_the_last_published_rate(tmp_path):
+    __write_sbi_rates(
+        tmp_path,
+        [("2024-07-01", 83.1), ("2024-07-02", 0.0), ("2024-07-03", 83.3), ("2024-07-05", 83.5)],
+    )
+    market_data = MarketDataService(str(tmp_path), rate_policy=rate_sources.SBI_TT_BUY_POLICY)
+
+    assert market_data.get_rate("USD", __ms("01-Jul-2024")) == 83.1
+    # no rate published on 02-Jul and 04-Jul
+    assert market_data.get_rate("USD", __ms("02-Jul-2024")) == 83.1
+    assert list(
+        market_data.get_rates("USD", np.array([__ms(d) for d in ["04-Jul-2024", "07-Jul-2024"]]))
+    ) == [83.3, 83.5]
+    with pytest.raises(AssertionError, match="No sbi_tt_buy rate for currency code USD"):
+        market_data.get_rate("USD", __ms("30-Jun-2024"))
+    with pytest.raises(AssertionError, match="No sbi_tt_buy rate for currency code USD"):
+        market_data.get_rate("USD", __ms("15-Jul-2024"))
+    with pytest.raises(AssertionError, match="Unsupported rate_policy"):
+        MarketDataService(str(tmp_path), rate_policy="daily")
+
+
+def test_fa_entries_use_the_selected_rate_policy(tmp_path):
+    workload_generator.generate_workload(str(tmp_path), 1, 1, ["goog"], 2024, 2024, seed=1)
+    data_folder = tmp_path / "historic_data"
+    __write_sbi_rates(
+        data_folder,
+        [
+            (day.isoformat(), 90.0)
+            for day in workload_generator.weekdays(
+                datetime.date(2024, 1, 1), datetime.date(2024, 12, 31)
+            )
+        ],
+    )
+    purchase = Purchase(date_utils.parse_named_mon("02-Jul-2024"), Price(100.0, "USD"), 1, "goog")
+    market_data = MarketDataService(str(data_folder), rate_policy=rate_sources.SBI_TT_BUY_POLICY)
+
+    [fa_entry] = faa3_parser.compute("calendar", [purchase], 2025, market_data=market_data)["goog"]
+
+    assert fa_entry.purchase_price == 9000.0
+    assert (
+        fa_entry.closing_price == market_data.get_closing_price("goog", __ms("31-Dec-2024")) * 90.0
+    )
+    assert fa_entry.peak_price >= fa_entry.closing_price
+    assert market_data.loaded_currencies() == []
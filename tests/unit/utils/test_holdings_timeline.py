@@ -0,0 +1,73 @@
+import pytest
+from models.purchase import Purchase, Price
+from models.sale import Sale
+from utils import date_utils
+from utils.holdings_timeline import HoldingsTimeline, build_timelines
+
+
+def create_purchase(date: str, quantity: float, ticker: str = "adbe") -> Purchase:
+    return Purchase(
+        date=date_utils.parse_named_mon(date),
+        purchase_fmv=Price(100.0, "USD"),
+        quantity=quantity,
+        ticker=ticker,
+    )
+
+
+def create_sale(date: str, quantity: float) -> Sale:
+    return Sale(date=date_utils.parse_named_mon(date), quantity=quantity, ticker="adbe")
+
+
+def time_in_ms(date: str) -> int:
+    return date_utils.parse_named_mon(date)["time_in_millis"]
+
+
+TIMELINE = HoldingsTimeline(
+    [
+        create_purchase("15-Jan-2023", 5),
+        create_purchase("15-Jul-2023", 3),
+        create_purchase("15-Jul-2023", 1),
+        create_purchase("15-Jan-2024", 2),
+    ],
+    [create_sale("01-Aug-2023", 6), create_sale("15-Jan-2024", 1)],
+)
+
+
+def test_quantity_held_at_the_end_of_a_day():
+    assert TIMELINE.held_at(time_in_ms("14-Jan-2023")) == 0.0
+    assert TIMELINE.held_at(time_in_ms("15-Jan-2023")) == 5
+    assert TIMELINE.held_at(time_in_ms("15-Jul-2023")) == 9
+    assert TIMELINE.held_at(time_in_ms("01-Aug-2023")) == 3
+    # the purchase and the sale of the same day
+    assert TIMELINE.held_at(time_in_ms("15-Jan-2024")) == 4
+    assert len(TIMELINE) == 4
+
+
+def test_holdings_over_a_range():
+    assert TIMELINE.held_over(time_in_ms("01-Jul-2023"), time_in_ms("31-Dec-2023")) == {
+        "opening": 5,
+        "acquired": 4,
+        "sold": 6,
+        "closing": 3,
+        "max_held": 9,
+    }
+    assert TIMELINE.held_over(time_in_ms("01-Jan-2025"), time_in_ms("31-Dec-2025")) == {
+        "opening": 4,
+        "acquired": 0.0,
+        "sold": 0.0,
+        "closing": 4,
+        "max_held": 4,
+    }
+    assert TIMELINE.acquired_between(time_in_ms("15-Jan-2023"), time_in_ms("15-Jul-2023")) == 9
+    with pytest.raises(AssertionError):
+        TIMELINE.held_over(time_in_ms("31-Dec-2023"), time_in_ms("01-Jan-2023"))
+
+
+def test_timelines_are_built_per_ticker():
+    timelines = build_timelines(
+        [create_purchase("15-Jan-2023", 5), create_purchase("15-Jan-2023", 2, "goog")],
+        [create_sale("01-Aug-2023", 1)],
+    )
+    assert sorted(timelines) == ["adbe", "goog"]
+    assert timelines["adbe"].held_at(time_in_ms("01-Aug-2023")) == 4
+    assert timelines["goog"].held_at(time_in_ms("01-Aug-2023")) == 2
@@ -0,0 +1,27 @@
+import threading
+
+from utils import logger
+
+
+def test_debug_context_only_applies_to_its_own_thread(capsys):
+    inside = threading.Event()
+    done = threading.Event()
+    other_thread_debug = []
+
+    def other_thread():
+        inside.wait()
+        other_thread_debug.append(logger.is_debug())
+        logger.debug_log("not printed")
+        done.set()
+
+    thread = threading.Thread(target=other_thread)
+    thread.start()
+    with logger.debug_context(True):
+        inside.set()
+        done.wait()
+        logger.debug_log("printed")
+    thread.join()
+
+    assert other_thread_debug == [False]
+    assert not logger.is_debug()
+    assert capsys.readouterr().out == "'printed'\n"
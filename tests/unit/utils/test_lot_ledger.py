@@ -0,0 +1,70 @@
+import pytest
+from models.purchase import Purchase, Price
+from models.sale import Sale
+from utils import date_utils, lot_ledger
+
+
+def create_purchase(date: str, quantity: float) -> Purchase:
+    return Purchase(
+        date=date_utils.parse_named_mon(date),
+        purchase_fmv=Price(100.0, "USD"),
+        quantity=quantity,
+        ticker="adbe",
+    )
+
+
+def create_sale(date: str, quantity: float, lot_date: str = None) -> Sale:
+    return Sale(
+        date=date_utils.parse_named_mon(date),
+        quantity=quantity,
+        ticker="adbe",
+        lot_date=date_utils.parse_named_mon(lot_date) if lot_date else None,
+    )
+
+
+def time_in_ms(date: str) -> int:
+    return date_utils.parse_named_mon(date)["time_in_millis"]
+
+
+PURCHASES = [create_purchase("15-Jan-2023", 5), create_purchase("15-Jul-2023", 3)]
+
+
+def test_fifo_depletes_oldest_lot_first():
+    ledger = lot_ledger.LotLedger("adbe", PURCHASES, [create_sale("01-Aug-2023", 6)])
+    assert [
+        (s.purchase.date["disp_time"], s.quantity, s.sale is not None)
+        for s in ledger.slices
+    ] == [
+        ("15-Jan-2023", 5, True),
+        ("15-Jul-2023", 1, True),
+        ("15-Jul-2023", 2, False),
+    ]
+    assert ledger.slices[2].as_purchase().quantity == 2
+
+
+def test_specific_id_depletes_the_given_lot():
+    ledger = lot_ledger.LotLedger(
+        "adbe",
+        PURCHASES,
+        [create_sale("01-Aug-2023", 2, lot_date="15-Jul-2023")],
+        lot_ledger.SPECIFIC_ID_METHOD,
+    )
+    assert [(s.quantity, s.sale is not None) for s in ledger.slices] == [
+        (5, False),
+        (2, True),
+        (1, False),
+    ]
+
+
+def test_quantity_held_on_any_date():
+    ledger = lot_ledger.LotLedger("adbe", PURCHASES, [create_sale("01-Aug-2023", 6)])
+    assert ledger.quantity_held(time_in_ms("01-Jan-2023")) == 0
+    assert ledger.quantity_held(time_in_ms("15-Jan-2023")) == 5
+    assert ledger.quantity_held(time_in_ms("31-Jul-2023")) == 8
+    assert ledger.quantity_held(time_in_ms("01-Aug-2023")) == 2
+
+
+def test_selling_more_than_held_raises():
+    with pytest.raises(AssertionError) as error:
+        lot_ledger.LotLedger("adbe", PURCHASES, [create_sale("01-Jul-2023", 6)])
+    assert "exceeds the shares held" in str(error.value)
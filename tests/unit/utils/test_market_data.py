@@ -0,0 +1,68 @@
+import concurrent.futures
+import time
+
+from benchmarks import workload_generator
+from utils import date_utils, share_data_utils
+from utils.market_data import CachePolicy, MarketDataService
+
+
+def test_services_of_different_data_folders_keep_their_own_prices(tmp_path):
+    workload_generator.generate_workload(
+        str(tmp_path / "filed"), 1, 1, ["goog"], 2024, 2024, seed=1
+    )
+    workload_generator.generate_workload(
+        str(tmp_path / "latest"), 1, 1, ["goog"], 2024, 2024, seed=2
+    )
+    filed = MarketDataService(str(tmp_path / "filed" / "historic_data"))
+    latest = MarketDataService(str(tmp_path / "latest" / "historic_data"))
+    time_in_ms = date_utils.parse_named_mon("02-Jul-2024")["time_in_millis"]
+
+    filed_fmv = filed.get_fmv("goog", time_in_ms)
+    latest_fmv = latest.get_fmv("goog", time_in_ms)
+
+    assert filed_fmv != latest_fmv
+    assert filed.get_fmv("goog", time_in_ms) == filed_fmv
+    assert filed.get_rate_for_prev_mon_for_time_in_ms("USD", time_in_ms) > 0
+    assert filed.loaded_tickers() == ["goog"]
+    assert filed.loaded_currencies() == ["USD"]
+    assert latest.loaded_currencies() == []
+    filed.clear()
+    assert filed.loaded_tickers() == []
+
+
+def test_concurrent_callers_load_a_missing_series_once(tmp_path, monkeypatch):
+    workload_generator.generate_workload(str(tmp_path), 1, 1, ["goog"], 2024, 2024, seed=1)
+    market_data = MarketDataService(str(tmp_path / "historic_data"))
+    read_price_map = share_data_utils.read_price_map
+    loads = []
+
+    def slow_read_price_map(ticker, historic_share_path):
+        loads.append(ticker)
+        time.sleep(0.05)
+        return read_price_map(ticker, historic_share_path)
+
+    monkeypatch.setattr(share_data_utils, "read_price_map", slow_read_price_map)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+        all_series = list(executor.map(lambda _: market_data.get_price_series("goog"), range(8)))
+
+    assert loads == ["goog"]
+    assert all(series is all_series[0] for series in all_series)
+
+
+def test_price_budget_evicts_least_recently_used_and_reloads_compiled_prices(tmp_path, monkeypatch):
+    workload_generator.generate_workload(str(tmp_path), 1, 1, ["adbe", "goog"], 2024, 2024, seed=1)
+    compiled_folder = tmp_path / "compiled"
+    # room for a single ticker
+    market_data = MarketDataService(
+        str(tmp_path / "historic_data"), CachePolicy(1, str(compiled_folder))
+    )
+    goog = market_data.get_price_series("goog")
+    market_data.get_price_series("adbe")
+
+    assert market_data.loaded_tickers() == ["adbe"]
+    monkeypatch.setattr(share_data_utils, "read_price_map", None)
+    reloaded = market_data.get_price_series("goog")
+    assert (reloaded[0] == goog[0]).all() and (reloaded[1] == goog[1]).all()
+    assert market_data.cache_stats()["share_prices"]["evictions"] == 2
+    assert market_data.cache_stats()["share_prices"]["misses"] == 3
+    assert len(list(compiled_folder.glob("shares/*/*.npz"))) == 2
@@ -0,0 +1,34 @@
+from utils import metrics, profiler
+
+
+def test_renders_counters_and_histograms_in_prometheus_text_format(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "ENABLED", True)
+    metrics.reset()
+
+    profiler.count("purchases_parsed", 3, source_mode="morgan_stanley")
+    profiler.count("purchases_parsed", 2, source_mode="morgan_stanley")
+    with profiler.span("parse_purchases"):
+        pass
+    metrics.observe("stage_duration_seconds", 0.2, stage="compute", buckets=(0.1, 1.0))
+    metrics.inc("http_requests_total", route='/a"b')
+    metrics.write_textfile(str(tmp_path / "sefa.prom"))
+    metrics.reset()
+
+    text = (tmp_path / "sefa.prom").read_text(encoding="utf-8")
+    assert "# TYPE sefa_purchases_parsed_total counter" in text
+    assert 'sefa_purchases_parsed_total{source_mode="morgan_stanley"} 5' in text
+    assert "# TYPE sefa_stage_duration_seconds histogram" in text
+    assert 'sefa_stage_duration_seconds_count{stage="parse_purchases"} 1' in text
+    assert 'sefa_stage_duration_seconds_bucket{stage="compute",le="0.1"} 0' in text
+    assert 'sefa_stage_duration_seconds_bucket{stage="compute",le="1"} 1' in text
+    assert 'sefa_stage_duration_seconds_bucket{stage="compute",le="+Inf"} 1' in text
+    assert 'sefa_http_requests_total{route="/a\\"b"} 1' in text
+    assert list(tmp_path.iterdir()) == [tmp_path / "sefa.prom"]
+
+
+def test_nothing_is_recorded_while_disabled():
+    metrics.reset()
+    profiler.count("fmv_lookups")
+    metrics.observe("stage_duration_seconds", 1.0, stage="compute")
+
+    assert metrics.render() == ""
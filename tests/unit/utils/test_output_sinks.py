@@ -0,0 +1,62 @@
+import importlib.util
+import json
+import os
+
+import pytest
+from utils import output_sinks
+from utils.run_options import RunOptions
+
+
+def test_write_rows_streams_generator_into_every_format(tmp_path):
+    consumed = []
+
+    def rows():
+        for i in range(3):
+            consumed.append(i)
+            yield (f"row{i}", i)
+
+    paths = output_sinks.write_rows(
+        str(tmp_path),
+        "fa_entries",
+        ["Name", "Value"],
+        rows(),
+        True,
+        formats=[output_sinks.CSV_FORMAT, output_sinks.JSON_LINES_FORMAT],
+    )
+    assert consumed == [0, 1, 2]
+    assert [os.path.basename(p) for p in paths] == ["fa_entries.csv", "fa_entries.jsonl"]
+    with open(paths[0], encoding="utf-8") as f:
+        assert f.read().splitlines() == ["Name,Value", "row0,0", "row1,1", "row2,2"]
+    with open(paths[1], encoding="utf-8") as f:
+        assert [json.loads(line) for line in f] == [
+            {"Name": "row0", "Value": 0},
+            {"Name": "row1", "Value": 1},
+            {"Name": "row2", "Value": 2},
+        ]
+
+
+def test_write_rows_with_unsupported_format(tmp_path):
+    with pytest.raises(AssertionError) as error:
+        output_sinks.write_rows(str(tmp_path), "fa_entries", ["a"], [], True, ["xml"])
+    assert "Unsupported output formats = ['xml']" in str(error.value)
+
+
+def test_parquet_without_pyarrow_fails_before_writing(tmp_path, monkeypatch):
+    find_spec = importlib.util.find_spec
+    monkeypatch.setattr(
+        importlib.util,
+        "find_spec",
+        lambda name, *args: None if name == "pyarrow" else find_spec(name, *args),
+    )
+    formats = [output_sinks.CSV_FORMAT, output_sinks.PARQUET_FORMAT]
+    with pytest.raises(AssertionError) as error:
+        RunOptions(output_formats=tuple(formats))
+    assert 'needs "pyarrow" installed' in str(error.value)
+    with pytest.raises(AssertionError):
+        output_sinks.write_rows(str(tmp_path), "fa_entries", ["a"], [("x",)], True, formats)
+    assert os.listdir(tmp_path) == []
+
+
+def test_debug_artifact_is_skipped_when_disabled(tmp_path):
+    assert output_sinks.write_debug_artifact(str(tmp_path), "purchases.json", [], False) is None
+    assert not os.path.exists(tmp_path / "purchases.json")
@@ -0,0 +1,53 @@
+from benchmarks import workload_generator
+from models.purchase import Price, Purchase
+from parser.itr import faa3_parser
+from utils import date_utils, period_snapshot
+from utils.run_options import RunOptions
+from utils.market_data import MarketDataService
+
+
+def __purchases():
+    return [
+        Purchase(date_utils.parse_named_mon(date), Price(100.0, "USD"), quantity, "goog")
+        for date, quantity in [("15-Jun-2023", 5), ("02-Jul-2024", 2)]
+    ]
+
+
+def test_reports_read_the_period_values_from_the_snapshot(tmp_path, monkeypatch):
+    workload_generator.generate_workload(str(tmp_path), 1, 1, ["goog"], 2023, 2024, seed=1)
+    data_folder = str(tmp_path / "historic_data")
+    expected = faa3_parser.compute(
+        "calendar", __purchases(), 2025, market_data=MarketDataService(data_folder)
+    )
+    snapshot = faa3_parser.compute_snapshot(
+        [("calendar", 2025), ("financial", 2026)], ["goog"], MarketDataService(data_folder)
+    )
+    # the historic data does not cover the financial year 2025-2026
+    assert len(snapshot) == 1
+    period_snapshot.save(str(tmp_path / "snapshot.json"), snapshot)
+
+    options = RunOptions(snapshot=period_snapshot.load(str(tmp_path / "snapshot.json")))
+    market_data = MarketDataService(data_folder)
+    monkeypatch.setattr(market_data, "get_closing_price", None)
+    assert (
+        faa3_parser.compute(
+            "calendar", __purchases(), 2025, market_data=market_data, options=options
+        )
+        == expected
+    )
+
+
+def test_snapshot_entries_of_other_historic_data_are_not_used():
+    snapshot = period_snapshot.PeriodSnapshot()
+    values = {
+        "closing_rbi_rate": 83.0,
+        "closing_share_price": 100.0,
+        "fmv_price_on_start": 90.0,
+        "start_rbi_rate": 82.0,
+        "peak_inr_price": 9000.0,
+    }
+    snapshot.put("goog", "calendar", 2025, {"share_data": "abc"}, values)
+
+    assert snapshot.get("goog", "calendar", 2025, {"share_data": "abc"}) == values
+    assert snapshot.get("goog", "calendar", 2025, {"share_data": "xyz"}) is None
+    assert snapshot.get("goog", "financial", 2025, {"share_data": "abc"}) is None
@@ -0,0 +1,43 @@
+import json
+
+from utils import profiler
+
+
+def test_records_nested_spans_and_counters_only_while_profiling(tmp_path):
+    profiler.count("fmv_lookups")
+    with profiler.span("ignored"):
+        pass
+
+    with profiler.profiling() as report:
+        with profiler.span("parse_purchases"):
+            with profiler.span("load_share_prices"):
+                profiler.count("fmv_lookups", 3)
+        with profiler.span("parse_purchases"):
+            profiler.count("fmv_lookups")
+    profiler.count("fmv_lookups")
+    profiler.write_trace(str(tmp_path / "trace.json"), report)
+
+    assert set(report["spans"]) == {"parse_purchases", "parse_purchases/load_share_prices"}
+    assert report["spans"]["parse_purchases"]["count"] == 2
+    assert report["counters"] == {"fmv_lookups": 4}
+    assert "parse_purchases/load_share_prices" in profiler.summary_table(report)
+    with open(tmp_path / "trace.json", encoding="utf-8") as f:
+        trace = json.load(f)
+    assert [event["name"] for event in trace["traceEvents"]] == [
+        "load_share_prices",
+        "parse_purchases",
+        "parse_purchases",
+    ]
+    assert not profiler.ENABLED
+
+
+def test_profiled_decorator_and_cprofile_output(tmp_path):
+    @profiler.profiled("compute")
+    def compute(value):
+        return value * 2
+
+    with profiler.profiling(cprofile_output_abs_path=str(tmp_path / "run.prof")) as report:
+        assert compute(2) == 4
+
+    assert report["spans"]["compute"]["count"] == 1
+    assert (tmp_path / "run.prof").exists()
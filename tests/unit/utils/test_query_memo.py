@@ -0,0 +1,57 @@
+import shutil
+
+from benchmarks import workload_generator
+from parser.itr import faa3_parser
+from models.purchase import Price, Purchase
+from utils import date_utils
+from utils.market_data import MarketDataService
+
+
+def __ms(date_str: str) -> int:
+    return date_utils.parse_named_mon(date_str)["time_in_millis"]
+
+
+def test_repeated_queries_are_answered_from_the_memo(tmp_path):
+    workload_generator.generate_workload(str(tmp_path), 1, 1, ["goog"], 2024, 2024, seed=1)
+    market_data = MarketDataService(str(tmp_path / "historic_data"))
+    purchases = [
+        Purchase(date_utils.parse_named_mon("02-Jul-2024"), Price(100.0, "USD"), quantity, "goog")
+        for quantity in [1, 2]
+    ]
+
+    [first, second] = faa3_parser.compute("calendar", purchases, 2025, market_data=market_data)[
+        "goog"
+    ]
+    misses = market_data.cache_stats()["queries"]["misses"]
+    [again, _] = faa3_parser.compute("calendar", purchases, 2025, market_data=market_data)["goog"]
+
+    assert (2 * first.peak_price, 2 * first.closing_price) == (
+        second.peak_price,
+        second.closing_price,
+    )
+    assert again.peak_price == first.peak_price
+    # the second computation reuses every result of the first one
+    assert market_data.cache_stats()["queries"]["misses"] == misses
+    assert market_data.cache_stats()["queries"]["hits"] > 0
+
+
+def test_changed_prices_invalidate_the_memoized_results(tmp_path):
+    workload_generator.generate_workload(str(tmp_path), 1, 1, ["goog"], 2024, 2024, seed=1)
+    market_data = MarketDataService(str(tmp_path / "historic_data"))
+    fmv = market_data.get_fmv("goog", __ms("02-Jul-2024"))
+    peak = market_data.get_peak_price_in_inr("goog", __ms("01-Jan-2024"), __ms("31-Dec-2024"))
+
+    assert market_data.refresh_data_versions() == []
+    workload_generator.generate_workload(
+        str(tmp_path / "latest"), 1, 1, ["goog"], 2024, 2024, seed=2
+    )
+    shutil.copyfile(
+        MarketDataService(str(tmp_path / "latest" / "historic_data")).share_file_path("goog"),
+        market_data.share_file_path("goog"),
+    )
+
+    assert market_data.refresh_data_versions() == ["goog"]
+    assert market_data.get_fmv("goog", __ms("02-Jul-2024")) != fmv
+    assert (
+        market_data.get_peak_price_in_inr("goog", __ms("01-Jan-2024"), __ms("31-Dec-2024")) != peak
+    )
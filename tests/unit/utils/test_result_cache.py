@@ -0,0 +1,37 @@
+import os
+
+from utils import file_utils, result_cache
+
+
+def test_store_and_restore_round_trip(tmp_path):
+    cache_folder = str(tmp_path / "cache")
+    output_file = tmp_path / "out" / "fa_entries.csv"
+    output_file.parent.mkdir()
+    output_file.write_text("a,b\n1,2\n", encoding="utf-8")
+    key = result_cache.compute_key({"ticker": "adbe", "assessment_year": 2024})
+
+    assert result_cache.restore(cache_folder, key, str(tmp_path / "restored")) is None
+    result_cache.store(cache_folder, key, [str(output_file)])
+    restored_paths = result_cache.restore(cache_folder, key, str(tmp_path / "restored"))
+
+    assert restored_paths == [str(tmp_path / "restored" / "fa_entries.csv")]
+    with open(restored_paths[0], encoding="utf-8") as f:
+        assert f.read() == "a,b\n1,2\n"
+
+
+def test_restore_is_disabled_without_cache_folder(tmp_path):
+    assert result_cache.restore(None, "abc", str(tmp_path)) is None
+
+
+def test_key_changes_with_data_file_fingerprint(tmp_path):
+    data_file = tmp_path / "data.csv"
+    data_file.write_text("Date,Close\n2024-01-02,10\n", encoding="utf-8")
+    first_key = result_cache.compute_key(
+        {"share_data": file_utils.file_fingerprint(str(data_file))}
+    )
+    data_file.write_text("Date,Close\n2024-01-02,11\n", encoding="utf-8")
+    os.utime(data_file, ns=(1, 1))
+    second_key = result_cache.compute_key(
+        {"share_data": file_utils.file_fingerprint(str(data_file))}
+    )
+    assert first_key != second_key
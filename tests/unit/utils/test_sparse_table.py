@@ -0,0 +1,23 @@
+import random
+
+import pytest
+from utils.sparse_table import SparseTable
+
+
+def test_argmax_matches_max_over_every_range():
+    rng = random.Random(7)
+    values = [rng.choice([1.0, 2.5, 3.0, 3.0, 7.25]) for _ in range(37)]
+    table = SparseTable(values)
+    for start in range(len(values)):
+        for end in range(start, len(values)):
+            window = values[start : end + 1]
+            # first index of the max, same as max() would pick
+            assert table.argmax(start, end) == start + window.index(max(window))
+
+
+def test_argmax_with_invalid_range():
+    table = SparseTable([1.0, 2.0])
+    with pytest.raises(AssertionError):
+        table.argmax(1, 0)
+    with pytest.raises(AssertionError):
+        table.argmax(0, 2)
@@ -0,0 +1,43 @@
+import pytest
+
+from utils import ticker_mapping
+from utils.ticker_mapping import ticker_currency_info, ticker_org_info
+
+
+@pytest.fixture
+def extra_registry(tmp_path):
+    registry_file = tmp_path / "tickers.csv"
+    registry_file.write_text(
+        ",".join(ticker_mapping.REGISTRY_COLUMNS)
+        + "\n"
+        + 'infy,Infosys Limited,"Electronics City Bangalore",91,India,560100,Listed,INR\n'
+        + 'goog,Alphabet Inc.,"New address",2,United States,94043,Listed,USD\n',
+        encoding="utf-8",
+    )
+    ticker_mapping.set_registry_files(
+        [ticker_mapping.DEFAULT_REGISTRY_FILE_ABS_PATH, str(registry_file)]
+    )
+    yield
+    ticker_mapping.set_registry_files([ticker_mapping.DEFAULT_REGISTRY_FILE_ABS_PATH])
+
+
+def test_built_in_registry_is_read_lazily():
+    assert ticker_currency_info["adbe"] == "USD"
+    assert ticker_org_info["goog"].country_name == "2 - United States"
+    assert "unknown" not in ticker_currency_info
+    with pytest.raises(KeyError):
+        ticker_org_info["unknown"]
+
+
+def test_later_registry_files_add_and_override_tickers(extra_registry):
+    assert ticker_currency_info["infy"] == "INR"
+    assert ticker_org_info["infy"].country_name == "91 - India"
+    assert ticker_org_info["goog"].address == "New address"
+    assert ticker_currency_info["adbe"] == "USD"
+
+
+def test_validation_lists_every_unknown_ticker():
+    with pytest.raises(AssertionError, match=r"\['abcd', 'wxyz'\] of ESPP sheet"):
+        ticker_mapping.validate_tickers(
+            ["ADBE", "wxyz", float("nan"), "abcd", "wxyz"], "ESPP sheet"
+        )
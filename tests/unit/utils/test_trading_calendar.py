@@ -0,0 +1,67 @@
+import datetime
+
+import numpy as np
+
+from utils import date_utils, trading_calendar
+from utils.data_quality import DataQualityReport
+from utils.market_data import MarketDataService
+
+
+def __ms(date_str: str) -> int:
+    return date_utils.parse_named_mon(date_str)["time_in_millis"]
+
+
+def test_nyse_holidays_follow_the_observed_rules():
+    holidays = trading_calendar.nyse_holidays(2021)
+
+    assert datetime.date(2021, 4, 2) in holidays  # Good Friday
+    assert datetime.date(2021, 7, 5) in holidays  # 4th of July on a Sunday
+    assert datetime.date(2021, 12, 24) in holidays  # Christmas on a Saturday
+    # New Year's Day 2022 on a Saturday is not observed on 31-Dec-2021
+    assert datetime.date(2021, 12, 31) not in holidays
+    assert datetime.date(2021, 6, 18) not in holidays  # before Juneteenth was observed
+    assert datetime.date(2025, 1, 9) in trading_calendar.nyse_holidays(2025)
+
+
+def test_index_classifies_days_and_finds_neighbouring_entries():
+    dates = ["02-Jul-2024", "03-Jul-2024", "05-Jul-2024", "08-Jul-2024", "10-Jul-2024"]
+    trading_days = trading_calendar.TradingDayIndex(np.array([__ms(d) for d in dates]), "USD")
+
+    assert trading_days.kind_of(__ms("03-Jul-2024")) == trading_calendar.TRADING_DAY
+    assert trading_days.kind_of(__ms("04-Jul-2024")) == trading_calendar.MARKET_HOLIDAY
+    assert trading_days.kind_of(__ms("06-Jul-2024")) == trading_calendar.WEEKEND
+    assert trading_days.kind_of(__ms("09-Jul-2024")) == trading_calendar.DATA_GAP
+    assert trading_days.kind_of(__ms("11-Jul-2024")) == trading_calendar.OUT_OF_RANGE
+    assert trading_days.next_entry_index(__ms("06-Jul-2024")) == 3
+    assert trading_days.previous_entry_index(__ms("06-Jul-2024")) == 2
+    assert trading_days.next_entry_index(__ms("01-Jul-2024")) == 0
+    assert trading_days.next_entry_index(__ms("11-Jul-2024")) == 5
+    assert trading_days.previous_entry_index(__ms("01-Jul-2024")) == -1
+    assert trading_days.gaps == [
+        {"after": "08-Jul-2024", "before": "10-Jul-2024", "missing_days": 1}
+    ]
+
+
+def test_fmv_fallbacks_are_collected_in_the_data_quality_report(tmp_path):
+    share_folder = tmp_path / "shares" / "goog"
+    share_folder.mkdir(parents=True)
+    (share_folder / "data.csv").write_text(
+        "Date,Close\n07/08/2024,101.5\n07/05/2024,100.5\n07/03/2024,99.5\n"
+    )
+    market_data = MarketDataService(str(tmp_path))
+
+    market_data.get_fmv("goog", __ms("04-Jul-2024"))
+    market_data.get_fmv("goog", __ms("06-Jul-2024"))
+    market_data.get_fmv("goog", __ms("05-Jul-2024"))
+
+    summary = market_data.data_quality.summary()
+    assert summary["fmv_fallbacks"] == {
+        "goog": {"market_holiday": {"count": 1, "examples": ["04-Jul-2024 -> 05-Jul-2024"]}}
+    }
+    report = DataQualityReport()
+    for _ in range(10):
+        report.record_fallback(
+            "goog", trading_calendar.DATA_GAP, __ms("09-Jul-2024"), __ms("10-Jul-2024")
+        )
+    assert report.summary()["fmv_fallbacks"]["goog"]["data_gap"]["count"] == 10
+    assert len(report.summary()["fmv_fallbacks"]["goog"]["data_gap"]["examples"]) == 5
@@ -0,0 +1,115 @@
+import collections
+import threading
+import typing as t
+
+CacheStats = t.TypedDict(
+    "CacheStats",
+    {
+        "entries": int,
+        "size_bytes": int,
+        "max_bytes": t.Optional[int],
+        "hits": int,
+        "misses": int,
+        "evictions": int,
+    },
+)
+
+
+class BoundedCache:
+    """
+    Dict like cache evicting the least recently used entries once the total size of
+    its values(measured by size_of) exceeds max_bytes, unbounded while max_bytes is
+    None. The entry just stored is never evicted, even when it alone is larger than
+    the budget
+    """
+
+    def __init__(
+        self,
+        size_of: t.Callable[[t.Any], int],
+        max_bytes: t.Optional[int] = None,
+        on_evict: t.Optional[t.Callable[[str], None]] = None,
+    ):
+        self.size_of = size_of
+        self.max_bytes = max_bytes
+        self.on_evict = on_evict
+        self.__lock = threading.Lock()
+        self.__entries: "collections.OrderedDict[str, t.Tuple[t.Any, int]]" = (
+            collections.OrderedDict()
+        )
+        self.__size_bytes = 0
+        self.__hits = 0
+        self.__misses = 0
+        self.__evictions = 0
+
+    def get(self, key: str) -> t.Optional[t.Any]:
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is None:
+                self.__misses += 1
+                return None
+            self.__hits += 1
+            self.__entries.move_to_end(key)
+            return entry[0]
+
+    def peek(self, key: str) -> t.Optional[t.Any]:
+        """
+        Value of key without counting the lookup or refreshing its recency
+        """
+        entry = self.__entries.get(key)
+        return entry[0] if entry is not None else None
+
+    def __setitem__(self, key: str, value: t.Any):
+        size_bytes = self.size_of(value)
+        evicted_keys = []
+        with self.__lock:
+            previous = self.__entries.pop(key, None)
+            if previous is not None:
+                self.__size_bytes -= previous[1]
+            self.__entries[key] = (value, size_bytes)
+            self.__size_bytes += size_bytes
+            while (
+                self.max_bytes is not None
+                and self.__size_bytes > self.max_bytes
+                and len(self.__entries) > 1
+            ):
+                evicted_key, (_, evicted_size_bytes) = self.__entries.popitem(last=False)
+                self.__size_bytes -= evicted_size_bytes
+                self.__evictions += 1
+                evicted_keys.append(evicted_key)
+        if self.on_evict is not None:
+            for evicted_key in evicted_keys:
+                self.on_evict(evicted_key)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.__entries
+
+    def __iter__(self) -> t.Iterator[str]:
+        with self.__lock:
+            return iter(list(self.__entries))
+
+    def __len__(self) -> int:
+        return len(self.__entries)
+
+    def pop(self, key: str, default: t.Any = None) -> t.Any:
+        with self.__lock:
+            entry = self.__entries.pop(key, None)
+            if entry is None:
+                return default
+            self.__size_bytes -= entry[1]
+            return entry[0]
+
+    def clear(self):
+        with self.__lock:
+            self.__entries.clear()
+            self.__size_bytes = 0
+
+    def stats(self) -> CacheStats:
+        with self.__lock:
+            return {
+                "entries": len(self.__entries),
+                "size_bytes": self.__size_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.__hits,
+                "misses": self.__misses,
+                "evictions": self.__evictions,
+            }
@@ -0,0 +1,94 @@
+import threading
+import typing as t
+
+from . import date_utils, logger, profiler
+from .trading_calendar import DataGap
+
+# dates kept per ticker and kind of missing day, the rest are only counted
+MAX_EXAMPLES = 5
+
+FmvFallbacks = t.TypedDict(
+    "FmvFallbacks",
+    {
+        "count": int,
+        # "<date asked> -> <date of the FMV used>"
+        "examples": t.List[str],
+    },
+)
+
+DataQualitySummary = t.TypedDict(
+    "DataQualitySummary",
+    {
+        # ticker -> kind of the missing day -> fallbacks
+        "fmv_fallbacks": t.Dict[str, t.Dict[str, FmvFallbacks]],
+        # ticker -> weekdays without prices which are not market holidays either
+        "data_gaps": t.Dict[str, t.List[DataGap]],
+    },
+)
+
+
+class DataQualityReport:
+    """
+    Collects the lookups which had to fall back to another day's price and the
+    gaps of the loaded price series, reported once per run instead of per row
+    """
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__fallbacks: t.Dict[str, t.Dict[str, FmvFallbacks]] = {}
+        self.__data_gaps: t.Dict[str, t.List[DataGap]] = {}
+
+    def record_gaps(self, ticker: str, gaps: t.List[DataGap]):
+        with self.__lock:
+            if gaps:
+                self.__data_gaps[ticker] = list(gaps)
+            else:
+                self.__data_gaps.pop(ticker, None)
+
+    def record_fallback(
+        self, ticker: str, kind: str, desired_time_in_ms: int, used_time_in_ms: int
+    ):
+        profiler.count("fmv_holiday_fallbacks", kind=kind)
+        with self.__lock:
+            fallbacks = self.__fallbacks.setdefault(ticker, {}).setdefault(
+                kind, {"count": 0, "examples": []}
+            )
+            fallbacks["count"] += 1
+            if len(fallbacks["examples"]) < MAX_EXAMPLES:
+                fallbacks["examples"].append(
+                    f"{date_utils.display_time(desired_time_in_ms)} -> "
+                    + date_utils.display_time(used_time_in_ms)
+                )
+
+    def summary(self) -> DataQualitySummary:
+        with self.__lock:
+            return {
+                "fmv_fallbacks": {
+                    ticker: {
+                        kind: {"count": fallbacks["count"], "examples": list(fallbacks["examples"])}
+                        for kind, fallbacks in kinds.items()
+                    }
+                    for ticker, kinds in self.__fallbacks.items()
+                },
+                "data_gaps": {ticker: list(gaps) for ticker, gaps in self.__data_gaps.items()},
+            }
+
+    def clear(self):
+        with self.__lock:
+            self.__fallbacks.clear()
+            self.__data_gaps.clear()
+
+    def log(self):
+        summary = self.summary()
+        for ticker, kinds in sorted(summary["fmv_fallbacks"].items()):
+            for kind, fallbacks in sorted(kinds.items()):
+                logger.log(
+                    f"{ticker}: {fallbacks['count']} FMV lookups on a {kind.replace('_', ' ')} "
+                    + f"used the next available FMV, e.g. {', '.join(fallbacks['examples'])}"
+                )
+        for ticker, gaps in sorted(summary["data_gaps"].items()):
+            logger.log(
+                f"{ticker}: historic data misses {sum(gap['missing_days'] for gap in gaps)} "
+                + f"trading days in {len(gaps)} gaps, e.g. "
+                + ", ".join(f"{gap['after']} .. {gap['before']}" for gap in gaps[:MAX_EXAMPLES])
+            )
@@ -1,9 +1,13 @@
 import os
 import json
-import csv
+import hashlib
 import typing as t
 
 
+# overrides the historic_data folder of the repo, e.g. with generated data for load tests
+HISTORIC_DATA_FOLDER_ENV = "SEFA_HISTORIC_DATA"
+
+
 class MapEncoder(json.JSONEncoder):
     def default(self, o):
         if isinstance(o, map):
@@ -11,64 +15,80 @@ class MapEncoder(json.JSONEncoder):
         return json.JSONEncoder.default(self, o)
 
 
-def write_to_file(
-    output_folder_abs_path: str,
-    file_name: str,
-    obj,
-    override: bool,
-    print_path_to_console: bool = False,
+def historic_data_folder() -> str:
+    return os.environ.get(HISTORIC_DATA_FOLDER_ENV) or os.path.join(
+        os.path.realpath(os.path.dirname(__file__)), os.pardir, "historic_data"
+    )
+
+
+def prepare_output_file(
+    output_folder_abs_path: str, file_name: str, override: bool
 ) -> str:
+    """
+    Creates the output folder if needed and returns the absolute path of file_name in it
+    """
     if not os.path.exists(output_folder_abs_path):
         os.makedirs(output_folder_abs_path)
 
     final_file_abs_path = os.path.join(output_folder_abs_path, file_name)
-
     if os.path.exists(final_file_abs_path) and not override:
         raise AssertionError(
             f"Path {final_file_abs_path} already exists and force(-f) flag is not added to delete the path"
         )
-    with open(final_file_abs_path, "w", encoding="utf-8") as f:
-        f.write(
-            json.dumps(
-                obj,
-                indent=2,
-                cls=MapEncoder,
-                ensure_ascii=True,
-                sort_keys=True,
-                default=vars,
-            )
-        )
-        if print_path_to_console:
-            __print_file_path(final_file_abs_path)
-
     return final_file_abs_path
 
 
-def write_csv_to_file(
-    output_file_abs_path: str,
+def write_to_file(
+    output_folder_abs_path: str,
     file_name: str,
-    keys: t.List[str],
-    objs,
+    obj,
     override: bool,
     print_path_to_console: bool = False,
 ) -> str:
-    if not os.path.exists(output_file_abs_path):
-        os.makedirs(output_file_abs_path)
-
-    final_file_abs_path = os.path.join(output_file_abs_path, file_name)
-    if os.path.exists(final_file_abs_path) and not override:
-        raise AssertionError(
-            f"Path {final_file_abs_path} already exists and force(-f) flag is not added to delete the path"
+    final_file_abs_path = prepare_output_file(
+        output_folder_abs_path, file_name, override
+    )
+    with open(final_file_abs_path, "w", encoding="utf-8") as f:
+        # json.dump encodes chunk by chunk into the file instead of building
+        # the whole document as a single in-memory string
+        json.dump(
+            obj,
+            f,
+            indent=2,
+            cls=MapEncoder,
+            ensure_ascii=True,
+            sort_keys=True,
+            default=vars,
         )
-    with open(final_file_abs_path, "w", newline="", encoding="utf-8") as file:
-        writer = csv.writer(file, delimiter=",", quoting=csv.QUOTE_MINIMAL)
-        writer.writerow(keys)
-        for obj in objs:
-            writer.writerow(obj)
         if print_path_to_console:
-            __print_file_path(final_file_abs_path)
+            print_file_path(final_file_abs_path)
+
     return final_file_abs_path
 
 
-def __print_file_path(final_path: str):
+__fingerprint_cache: t.Dict[str, t.Tuple[int, int, str]] = {}
+
+
+def file_fingerprint(file_abs_path: str) -> str:
+    """
+    Returns the sha256 of the file content. The file is only re-hashed when its
+    size or modification time changes
+    """
+    stat = os.stat(file_abs_path)
+    cached = __fingerprint_cache.get(file_abs_path)
+    if cached is not None and cached[:2] == (stat.st_size, stat.st_mtime_ns):
+        return cached[2]
+    sha256 = hashlib.sha256()
+    with open(file_abs_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            sha256.update(chunk)
+    __fingerprint_cache[file_abs_path] = (
+        stat.st_size,
+        stat.st_mtime_ns,
+        sha256.hexdigest(),
+    )
+    return sha256.hexdigest()
+
+
+def print_file_path(final_path: str):
     print(f"Output file created at {final_path}")
@@ -0,0 +1,130 @@
+import bisect
+import typing as t
+
+import numpy as np
+
+from models.purchase import Purchase
+from models.sale import Sale
+from utils.sparse_table import SparseTable
+
+HoldingsOverRange = t.TypedDict(
+    "HoldingsOverRange",
+    {
+        # held at the end of the day before the range
+        "opening": float,
+        "acquired": float,
+        "sold": float,
+        # held at the end of the last day of the range
+        "closing": float,
+        # most shares held at the end of any day of the range
+        "max_held": float,
+    },
+)
+
+
+class HoldingsTimeline:
+    """
+    Quantities of one ticker acquired and sold over time, kept as prefix sums over
+    the date sorted purchase(positive) and sale(negative) events, so the quantity
+    held on a date or acquired and sold within a range is answered in O(log n)
+    through a binary search. Purchases count before the sales of the same day
+    """
+
+    def __init__(self, purchases: t.Iterable[Purchase], sales: t.Iterable[Sale] = ()):
+        deltas: t.Dict[int, t.List[float]] = {}
+        for purchase in purchases:
+            deltas.setdefault(purchase.date["time_in_millis"], [0.0, 0.0])[0] += float(
+                purchase.quantity
+            )
+        for sale in sales:
+            deltas.setdefault(sale.date["time_in_millis"], [0.0, 0.0])[1] += float(sale.quantity)
+        self.event_times: t.List[int] = sorted(deltas)
+        self.acquired_sums: t.List[float] = []
+        self.sold_sums: t.List[float] = []
+        acquired_sum = 0.0
+        sold_sum = 0.0
+        for event_time_in_ms in self.event_times:
+            acquired, sold = deltas[event_time_in_ms]
+            acquired_sum += acquired
+            sold_sum += sold
+            self.acquired_sums.append(acquired_sum)
+            self.sold_sums.append(sold_sum)
+        self.__held_table: t.Optional[SparseTable] = None
+
+    def __len__(self) -> int:
+        return len(self.event_times)
+
+    def __last_event_index(self, time_in_ms: int) -> int:
+        # index of the last event on or before time_in_ms, -1 when there is none
+        return bisect.bisect_right(self.event_times, time_in_ms) - 1
+
+    def __held_at_index(self, index: int) -> float:
+        return self.acquired_sums[index] - self.sold_sums[index] if index >= 0 else 0.0
+
+    def held_at(self, time_in_ms: int) -> float:
+        """
+        Quantity held at the end of the day of time_in_ms
+        """
+        return self.__held_at_index(self.__last_event_index(time_in_ms))
+
+    def acquired_between(self, start_time_in_ms: int, end_time_in_ms: int) -> float:
+        """
+        Quantity acquired from start to end, both inclusive
+        """
+        start_index = self.__last_event_index(start_time_in_ms - 1)
+        end_index = self.__last_event_index(end_time_in_ms)
+        return (self.acquired_sums[end_index] if end_index >= 0 else 0.0) - (
+            self.acquired_sums[start_index] if start_index >= 0 else 0.0
+        )
+
+    def sold_between(self, start_time_in_ms: int, end_time_in_ms: int) -> float:
+        """
+        Quantity sold from start to end, both inclusive
+        """
+        start_index = self.__last_event_index(start_time_in_ms - 1)
+        end_index = self.__last_event_index(end_time_in_ms)
+        return (self.sold_sums[end_index] if end_index >= 0 else 0.0) - (
+            self.sold_sums[start_index] if start_index >= 0 else 0.0
+        )
+
+    def held_over(self, start_time_in_ms: int, end_time_in_ms: int) -> HoldingsOverRange:
+        if start_time_in_ms > end_time_in_ms:
+            raise AssertionError(
+                f"start_time_in_ms = {start_time_in_ms} is greater than end_time_in_ms = "
+                + f"{end_time_in_ms}"
+            )
+        opening = self.held_at(start_time_in_ms - 1)
+        first_index = self.__last_event_index(start_time_in_ms - 1) + 1
+        end_index = self.__last_event_index(end_time_in_ms)
+        max_held = opening
+        if first_index <= end_index:
+            if self.__held_table is None:
+                # built on the first range query, held_at never needs it
+                self.__held_table = SparseTable(
+                    np.array(self.acquired_sums) - np.array(self.sold_sums)
+                )
+            max_held = max(
+                opening, self.__held_at_index(self.__held_table.argmax(first_index, end_index))
+            )
+        return {
+            "opening": opening,
+            "acquired": self.acquired_between(start_time_in_ms, end_time_in_ms),
+            "sold": self.sold_between(start_time_in_ms, end_time_in_ms),
+            "closing": self.held_at(end_time_in_ms),
+            "max_held": max_held,
+        }
+
+
+def build_timelines(
+    purchases: t.Iterable[Purchase], sales: t.Iterable[Sale] = ()
+) -> t.Dict[str, HoldingsTimeline]:
+    ticker_purchases: t.Dict[str, t.List[Purchase]] = {}
+    for purchase in purchases:
+        ticker_purchases.setdefault(purchase.ticker, []).append(purchase)
+    ticker_sales: t.Dict[str, t.List[Sale]] = {}
+    for sale in sales:
+        ticker_sales.setdefault(sale.ticker, []).append(sale)
+    return {
+        ticker: HoldingsTimeline(ticker_purchases.get(ticker, []), ticker_sales.get(ticker, []))
+        for ticker in sorted(set(ticker_purchases) | set(ticker_sales))
+    }
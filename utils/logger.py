@@ -1,7 +1,33 @@
+import contextlib
+import contextvars
 import pprint
 import json
+import typing as t
 
+# process wide default, set from the command line flags
 DEBUG = False
+# overrides DEBUG for the current thread or asyncio task only, see debug_context
+__debug_override: "contextvars.ContextVar[t.Optional[bool]]" = contextvars.ContextVar(
+    "debug_override", default=None
+)
+
+
+def is_debug() -> bool:
+    override = __debug_override.get()
+    return DEBUG if override is None else override
+
+
+@contextlib.contextmanager
+def debug_context(enabled: bool):
+    """
+    Enables or disables the debug logs of the code run within, without changing
+    them for the other threads(e.g. other requests of the HTTP service)
+    """
+    token = __debug_override.set(bool(enabled))
+    try:
+        yield
+    finally:
+        __debug_override.reset(token)
 
 
 def __print_json(json_data):
@@ -10,7 +36,7 @@ def __print_json(json_data):
 
 
 def debug_log_json(obj):
-    if DEBUG:
+    if is_debug():
         __print_json(obj)
 
 
@@ -30,7 +56,7 @@ def __print_pretty(msg):
 
 
 def debug_log(msg):
-    if DEBUG:
+    if is_debug():
         __print_pretty(msg)
 
 
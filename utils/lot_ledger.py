@@ -0,0 +1,168 @@
+import collections
+import dataclasses
+import itertools
+import typing as t
+
+from models.purchase import Purchase
+from models.sale import Sale
+from utils.holdings_timeline import HoldingsTimeline
+
+FIFO_METHOD = "fifo"
+SPECIFIC_ID_METHOD = "specific_id"
+SUPPORTED_METHODS = [FIFO_METHOD, SPECIFIC_ID_METHOD]
+
+# remaining quantities below this are float noise of fractional shares
+QUANTITY_EPSILON = 1e-9
+
+
+@dataclasses.dataclass
+class LotSlice:
+    """
+    Part of a purchase lot which is held from the purchase date until sale, sale is
+    None while the slice is still held
+    """
+
+    purchase: Purchase
+    quantity: float
+    sale: t.Optional[Sale] = None
+
+    def as_purchase(self) -> Purchase:
+        if self.quantity == self.purchase.quantity:
+            return self.purchase
+        return dataclasses.replace(self.purchase, quantity=self.quantity)
+
+    def sale_time_in_ms(self) -> t.Optional[int]:
+        return self.sale.date["time_in_millis"] if self.sale is not None else None
+
+
+class _OpenLot:
+    __slots__ = ("purchase", "remaining", "slices")
+
+    def __init__(self, purchase: Purchase):
+        self.purchase = purchase
+        self.remaining = float(purchase.quantity)
+        self.slices: t.List[LotSlice] = []
+
+
+class LotLedger:
+    """
+    Lots of one ticker depleted by its sales, either first-in-first-out or by the
+    acquisition date given in the sale(specific-ID, falling back to FIFO for sales
+    without one). Open lots are kept in a deque plus a per acquisition date index,
+    so every sale touches only the lots it depletes. The quantity held on any date
+    is answered in O(log n) by the HoldingsTimeline of the purchases and sales
+    """
+
+    def __init__(
+        self,
+        ticker: str,
+        purchases: t.Iterable[Purchase],
+        sales: t.Iterable[Sale] = (),
+        method: str = FIFO_METHOD,
+    ):
+        if method not in SUPPORTED_METHODS:
+            raise AssertionError(
+                f"Unsupported lot method = {method}, supported = {SUPPORTED_METHODS}"
+            )
+        self.ticker = ticker
+        self.method = method
+        self.__open_lots: t.Deque[_OpenLot] = collections.deque()
+        self.__open_lots_by_date: t.Dict[int, t.Deque[_OpenLot]] = {}
+
+        lots = [_OpenLot(purchase) for purchase in purchases]
+        # purchases are applied before the sales of the same day
+        events: t.List[t.Tuple[int, int, int]] = [
+            (lot.purchase.date["time_in_millis"], 0, index)
+            for index, lot in enumerate(lots)
+        ]
+        sales = list(sales)
+        events.extend(
+            (sale.date["time_in_millis"], 1, index) for index, sale in enumerate(sales)
+        )
+        events.sort()
+
+        for event_time_in_ms, event_kind, index in events:
+            if event_kind == 0:
+                lot = lots[index]
+                self.__open_lots.append(lot)
+                self.__open_lots_by_date.setdefault(
+                    event_time_in_ms, collections.deque()
+                ).append(lot)
+            else:
+                self.__deplete(sales[index])
+
+        for lot in lots:
+            if lot.remaining > QUANTITY_EPSILON:
+                lot.slices.append(LotSlice(lot.purchase, lot.remaining))
+        # slices of a lot stay together and lots keep the purchase order
+        self.slices: t.List[LotSlice] = list(
+            itertools.chain.from_iterable(lot.slices for lot in lots)
+        )
+        self.timeline = HoldingsTimeline((lot.purchase for lot in lots), sales)
+
+    def __deplete(self, sale: Sale):
+        remaining = float(sale.quantity)
+        if self.method == SPECIFIC_ID_METHOD and sale.lot_date is not None:
+            remaining = self.__take(
+                self.__open_lots_by_date.get(
+                    sale.lot_date["time_in_millis"], collections.deque()
+                ),
+                sale,
+                remaining,
+            )
+            if remaining > QUANTITY_EPSILON:
+                raise AssertionError(
+                    f"{self.ticker}: Sale of {sale.quantity} shares on {sale.date['disp_time']} "
+                    + f"exceeds the shares acquired on {sale.lot_date['disp_time']}"
+                )
+        remaining = self.__take(self.__open_lots, sale, remaining)
+        if remaining > QUANTITY_EPSILON:
+            raise AssertionError(
+                f"{self.ticker}: Sale of {sale.quantity} shares on {sale.date['disp_time']} "
+                + f"exceeds the shares held by {remaining}"
+            )
+
+    @staticmethod
+    def __take(lots: t.Deque[_OpenLot], sale: Sale, remaining: float) -> float:
+        while remaining > QUANTITY_EPSILON and lots:
+            lot = lots[0]
+            # lots depleted through the other index are dropped lazily
+            if lot.remaining <= QUANTITY_EPSILON:
+                lots.popleft()
+                continue
+            taken = min(lot.remaining, remaining)
+            lot.slices.append(LotSlice(lot.purchase, taken, sale))
+            lot.remaining -= taken
+            remaining -= taken
+            if lot.remaining <= QUANTITY_EPSILON:
+                lots.popleft()
+        return remaining
+
+    def quantity_held(self, time_in_ms: int) -> float:
+        """
+        Quantity held at the end of the day of time_in_ms
+        """
+        return self.timeline.held_at(time_in_ms)
+
+
+def build_ledgers(
+    purchases: t.Iterable[Purchase],
+    sales: t.Iterable[Sale],
+    method: str = FIFO_METHOD,
+) -> t.Dict[str, LotLedger]:
+    # grouped in a single pass, each ticker keeps the (date sorted) input order
+    ticker_purchases: t.Dict[str, t.List[Purchase]] = {}
+    for purchase in purchases:
+        ticker_purchases.setdefault(purchase.ticker, []).append(purchase)
+    ticker_sales: t.Dict[str, t.List[Sale]] = {}
+    for sale in sales:
+        ticker_sales.setdefault(sale.ticker, []).append(sale)
+    return {
+        ticker: LotLedger(
+            ticker,
+            ticker_purchases.get(ticker, []),
+            ticker_sales.get(ticker, []),
+            method,
+        )
+        for ticker in sorted(set(ticker_purchases) | set(ticker_sales))
+    }
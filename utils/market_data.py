@@ -0,0 +1,480 @@
+import os
+import threading
+import typing as t
+from dataclasses import dataclass
+
+import numpy as np
+
+from . import bounded_cache, file_utils, profiler, query_memo, share_data_utils
+from .data_quality import DataQualityReport
+from .rates import conversion_matrix, cross_rates, rate_sources, rbi_rates_utils
+from .ticker_mapping import ticker_currency_info
+from .trading_calendar import TradingDayIndex
+
+
+@dataclass
+class CachePolicy:
+    # budget of the loaded share prices, the least recently used tickers are
+    # dropped beyond it. Unbounded when None
+    max_price_bytes: t.Optional[int] = None
+    # keeps the parsed share prices as .npz files, so a dropped ticker(or one
+    # of an earlier process) is reloaded without parsing its CSV again
+    compiled_folder_abs_path: t.Optional[str] = None
+    # memoized FMV, closing price and peak query results, shared by every caller
+    # of the service. Unbounded when None
+    max_query_entries: t.Optional[int] = query_memo.DEFAULT_MAX_ENTRIES
+
+
+def price_series_bytes(price_series: share_data_utils.PriceSeries) -> int:
+    times_in_ms, fmv = price_series
+    return times_in_ms.nbytes + fmv.nbytes
+
+
+def loaded_prices_bytes(
+    loaded_prices: t.Tuple[share_data_utils.PriceSeries, TradingDayIndex]
+) -> int:
+    price_series, trading_days = loaded_prices
+    return price_series_bytes(price_series) + trading_days.nbytes()
+
+
+# the queries whose results depend on the INR rates too
+RATE_QUERIES = {"inr_series", "peak_inr"}
+
+
+class MarketDataService:
+    """
+    Share prices and INR rates of one historic_data folder, loaded on first use and
+    kept for the life of the instance(share prices within the memory budget of the
+    cache policy). Every parser takes one, so several datasets
+    (e.g. the data a return was filed with and the latest data) can be held in
+    memory by a single process.
+    It can be shared by threads: a missing series is loaded by the first caller
+    while the others asking for the same one wait for it, loaded series are read
+    without locking
+    """
+
+    def __init__(
+        self,
+        data_folder_abs_path: t.Optional[str] = None,
+        cache_policy: t.Optional[CachePolicy] = None,
+        rate_policy: str = rate_sources.RBI_PREV_MONTH_POLICY,
+    ):
+        self.data_folder_abs_path = data_folder_abs_path or file_utils.historic_data_folder()
+        self.cache_policy = cache_policy or CachePolicy()
+        # the INR rates get_rate, get_rates and inr_series resolve with
+        self.rate_policy = rate_policy
+        self.rate_source_type = rate_sources.source_type(rate_policy)
+        # ticker -> (price series, trading day index built from it)
+        self.price_series_cache = bounded_cache.BoundedCache(
+            loaded_prices_bytes,
+            self.cache_policy.max_price_bytes,
+            on_evict=lambda _: profiler.count("cache_evictions", cache="share_prices"),
+        )
+        # a few KB per currency, never evicted
+        self.rate_map_cache = bounded_cache.BoundedCache(lambda _: 0)
+        # INR rates of every currency under the rate policy, a few KB per currency
+        self.conversion_matrix_cache = bounded_cache.BoundedCache(
+            lambda matrix: matrix.nbytes()
+        )
+        self.rate_source_cache = bounded_cache.BoundedCache(lambda _: 0)
+        self.query_memo = query_memo.QueryMemo(self.cache_policy.max_query_entries)
+        # fingerprints of the files the loaded data was read from, part of the
+        # keys of the memoized query results
+        self.__share_versions: t.Dict[str, str] = {}
+        self.__rates_version: t.Optional[str] = None
+        # fallbacks and gaps met by the lookups, logged once by the caller
+        self.data_quality = DataQualityReport()
+        self.__lock = threading.Lock()
+        self.__loading_locks: t.Dict[t.Tuple[str, str], threading.Lock] = {}
+
+    def share_file_path(self, ticker: str) -> str:
+        return share_data_utils.historic_share_file_path(self.data_folder_abs_path, ticker)
+
+    def rates_file_path(self) -> str:
+        return rbi_rates_utils.rates_file_path(self.data_folder_abs_path)
+
+    def cross_rates_file_path(self) -> str:
+        return cross_rates.cross_rates_file_path(self.data_folder_abs_path)
+
+    def rate_file_paths(self) -> t.List[str]:
+        """
+        Files the INR rates of the rate policy are derived from
+        """
+        cross_rates_file_abs_path = self.cross_rates_file_path()
+        return self.rate_source_type.file_paths(self.data_folder_abs_path) + (
+            [cross_rates_file_abs_path] if os.path.exists(cross_rates_file_abs_path) else []
+        )
+
+    def data_versions(self, tickers: t.Iterable[str]) -> t.Dict[str, t.Any]:
+        """
+        Fingerprints of the INR rates and of the share prices of tickers(None when
+        missing), results computed with other ones are outdated
+        """
+        return {
+            "rate_policy": self.rate_policy,
+            "rates": [
+                file_utils.file_fingerprint(rate_file_abs_path)
+                for rate_file_abs_path in self.rate_file_paths()
+            ],
+            "shares": {
+                ticker: (
+                    file_utils.file_fingerprint(self.share_file_path(ticker))
+                    if os.path.exists(self.share_file_path(ticker))
+                    else None
+                )
+                for ticker in sorted(tickers)
+            },
+        }
+
+    def loaded_tickers(self) -> t.List[str]:
+        return sorted(self.price_series_cache)
+
+    def loaded_currencies(self) -> t.List[str]:
+        return sorted(self.rate_map_cache)
+
+    def cache_stats(self) -> t.Dict[str, bounded_cache.CacheStats]:
+        return {
+            "share_prices": self.price_series_cache.stats(),
+            "rbi_rates": self.rate_map_cache.stats(),
+            "conversion_matrices": self.conversion_matrix_cache.stats(),
+            "queries": self.query_memo.stats(),
+        }
+
+    def clear(self):
+        with self.__lock:
+            self.price_series_cache.clear()
+            self.rate_map_cache.clear()
+            self.conversion_matrix_cache.clear()
+            self.rate_source_cache.clear()
+            self.query_memo.clear()
+            self.__share_versions.clear()
+            self.__rates_version = None
+            self.data_quality.clear()
+
+    def __load_once(
+        self,
+        cache_name: str,
+        cache: bounded_cache.BoundedCache,
+        key: str,
+        load: t.Callable[[], t.Any],
+    ) -> t.Tuple[t.Any, bool]:
+        """
+        Returns the value of key in cache and whether it was missing. Only one
+        caller runs load for a key, the value is stored once complete so readers
+        never see a partial one
+        """
+        value = cache.get(key)
+        if value is not None:
+            return value, False
+        with self.__lock:
+            loading_lock = self.__loading_locks.setdefault((cache_name, key), threading.Lock())
+        with loading_lock:
+            # loaded by another caller meanwhile
+            value = cache.peek(key)
+            if value is None:
+                value = load()
+                cache[key] = value
+        with self.__lock:
+            self.__loading_locks.pop((cache_name, key), None)
+        return value, True
+
+    def __compiled_file_path(self, ticker: str) -> t.Optional[str]:
+        if self.cache_policy.compiled_folder_abs_path is None:
+            return None
+        # named by the content of the CSV, so an updated CSV is compiled again
+        fingerprint = file_utils.file_fingerprint(self.share_file_path(ticker))
+        return os.path.join(
+            self.cache_policy.compiled_folder_abs_path,
+            "shares",
+            ticker.lower(),
+            f"{fingerprint}.npz",
+        )
+
+    def __read_price_series(self, ticker: str) -> share_data_utils.PriceSeries:
+        compiled_file_abs_path = self.__compiled_file_path(ticker)
+        if compiled_file_abs_path is not None and os.path.exists(compiled_file_abs_path):
+            profiler.count("cache_lookups", cache="compiled_share_prices", result="hit")
+            return share_data_utils.read_compiled_series(compiled_file_abs_path)
+        with profiler.span("load_share_prices"):
+            price_series = share_data_utils.to_price_series(
+                share_data_utils.read_price_map(ticker, self.share_file_path(ticker))
+            )
+        if compiled_file_abs_path is not None:
+            profiler.count("cache_lookups", cache="compiled_share_prices", result="miss")
+            share_data_utils.write_compiled_series(compiled_file_abs_path, price_series)
+        return price_series
+
+    def __load_prices(
+        self, ticker: str
+    ) -> t.Tuple[share_data_utils.PriceSeries, TradingDayIndex]:
+        share_version = file_utils.file_fingerprint(self.share_file_path(ticker))
+        price_series = self.__read_price_series(ticker)
+        self.__share_versions[ticker] = share_version
+        with profiler.span("build_trading_day_index"):
+            trading_days = TradingDayIndex(
+                price_series[0], ticker_currency_info.get(ticker, "USD")
+            )
+        self.data_quality.record_gaps(ticker, trading_days.gaps)
+        return price_series, trading_days
+
+    def __get_prices(
+        self, ticker: str
+    ) -> t.Tuple[share_data_utils.PriceSeries, TradingDayIndex]:
+        loaded_prices, missed = self.__load_once(
+            "share_prices",
+            self.price_series_cache,
+            ticker,
+            lambda: self.__load_prices(ticker),
+        )
+        profiler.count("cache_lookups", cache="share_prices", result="miss" if missed else "hit")
+        return loaded_prices
+
+    def get_price_series(self, ticker: str) -> share_data_utils.PriceSeries:
+        return self.__get_prices(ticker)[0]
+
+    def get_trading_days(self, ticker: str) -> TradingDayIndex:
+        return self.__get_prices(ticker)[1]
+
+    def __share_version(self, ticker: str) -> str:
+        share_version = self.__share_versions.get(ticker)
+        if share_version is None:
+            self.__get_prices(ticker)
+            share_version = self.__share_versions[ticker]
+        return share_version
+
+    def __inr_version(self, ticker: str) -> str:
+        if self.__rates_version is None:
+            self.conversion_matrix()
+        return f"{self.__share_version(ticker)}/{self.__rates_version}"
+
+    def get_fmv(self, ticker: str, purchase_time_in_ms: int) -> float:
+        def fmv_at() -> float:
+            price_series, trading_days = self.__get_prices(ticker)
+            return share_data_utils.fmv_at(
+                ticker, price_series, trading_days, purchase_time_in_ms, self.data_quality
+            )
+
+        return self.query_memo.get_or_compute(
+            "fmv", ticker, self.__share_version(ticker), (purchase_time_in_ms,), fmv_at
+        )
+
+    def get_closing_price(self, ticker: str, end_time_in_ms: int) -> float:
+        def closing_price_at() -> float:
+            price_series, trading_days = self.__get_prices(ticker)
+            return share_data_utils.closing_price_at(
+                ticker, price_series, trading_days, end_time_in_ms
+            )
+
+        return self.query_memo.get_or_compute(
+            "closing_price",
+            ticker,
+            self.__share_version(ticker),
+            (end_time_in_ms,),
+            closing_price_at,
+        )
+
+    def get_peak_fmv(self, ticker: str, start_time_in_ms: int, end_time_in_ms: int) -> float:
+        return self.query_memo.get_or_compute(
+            "peak_fmv",
+            ticker,
+            self.__share_version(ticker),
+            (start_time_in_ms, end_time_in_ms),
+            lambda: share_data_utils.peak_fmv(
+                ticker, self.get_price_series(ticker), start_time_in_ms, end_time_in_ms
+            ),
+        )
+
+    def inr_series(
+        self, ticker: str, time_ranges: t.List[t.Tuple[int, int]]
+    ) -> share_data_utils.InrSeries:
+        """
+        Per-day INR series of ticker within time_ranges, built once per process for
+        the same ranges(e.g. the periods of every employee of a company)
+        """
+        currency_code = ticker_currency_info[ticker]
+        return self.query_memo.get_or_compute(
+            "inr_series",
+            ticker,
+            self.__inr_version(ticker),
+            tuple(tuple(time_range) for time_range in time_ranges),
+            lambda: share_data_utils.InrSeries(
+                ticker,
+                time_ranges,
+                self.get_price_series(ticker),
+                self.rate_source(currency_code).rates_at,
+            ),
+        )
+
+    def get_peak_price_in_inr(
+        self,
+        ticker: str,
+        start_time_in_ms: int,
+        end_time_in_ms: int,
+        inr_series: t.Optional[t.Callable[[], share_data_utils.InrSeries]] = None,
+    ) -> float:
+        """
+        Memoized peak INR value of ticker between start and end, inr_series returns
+        a series covering them(e.g. the one of all the periods being computed) when
+        the peak is not known yet, by default one of just this range is built
+        """
+        if start_time_in_ms > end_time_in_ms:
+            raise AssertionError(
+                f"start_time_in_ms = {start_time_in_ms} is greater "
+                + f"than equal to end_time_in_ms = {end_time_in_ms}"
+            )
+
+        def peak() -> share_data_utils.TimedFmvWithInrRate:
+            if inr_series is not None:
+                return inr_series().peak(start_time_in_ms, end_time_in_ms)
+            range_inr_series = self.inr_series(ticker, [(start_time_in_ms, end_time_in_ms)])
+            share_data_utils.debug_log_inr_series(
+                range_inr_series, start_time_in_ms, end_time_in_ms
+            )
+            return range_inr_series.peak(start_time_in_ms, end_time_in_ms)
+
+        return share_data_utils.peak_price_in_inr(
+            ticker,
+            start_time_in_ms,
+            end_time_in_ms,
+            self.query_memo.get_or_compute(
+                "peak_inr",
+                ticker,
+                self.__inr_version(ticker),
+                (start_time_in_ms, end_time_in_ms),
+                peak,
+            ),
+        )
+
+    def __current_rates_version(self) -> str:
+        return self.rate_policy + ":" + ",".join(
+            file_utils.file_fingerprint(rate_file_abs_path)
+            for rate_file_abs_path in self.rate_file_paths()
+        )
+
+    def refresh_data_versions(self) -> t.List[str]:
+        """
+        Drops the loaded prices and memoized query results of every ticker whose
+        file changed since it was loaded(and everything derived from the INR rates
+        when a rates file changed). Returns the changed tickers, with "rates" for the
+        rates. Long running callers run it before each job
+        """
+        changed = []
+        for ticker, share_version in list(self.__share_versions.items()):
+            share_file_abs_path = self.share_file_path(ticker)
+            if (
+                os.path.exists(share_file_abs_path)
+                and file_utils.file_fingerprint(share_file_abs_path) == share_version
+            ):
+                continue
+            self.__share_versions.pop(ticker, None)
+            self.price_series_cache.pop(ticker)
+            self.query_memo.invalidate(ticker)
+            changed.append(ticker)
+        rates_version = self.__rates_version
+        if rates_version is not None:
+            try:
+                is_changed = self.__current_rates_version() != rates_version
+            except (AssertionError, OSError):
+                is_changed = True
+            if is_changed:
+                self.__rates_version = None
+                self.conversion_matrix_cache.clear()
+                self.rate_source_cache.clear()
+                self.rate_map_cache.clear()
+                self.query_memo.invalidate(queries=RATE_QUERIES)
+                changed.append("rates")
+        return changed
+
+    def load_rates(self, currency_code: str) -> rbi_rates_utils.RbiYearMonthRateMap:
+        rate_map, missed = self.__load_once(
+            "rbi_rates",
+            self.rate_map_cache,
+            currency_code,
+            lambda: rbi_rates_utils.read_rate_map(self.rates_file_path(), currency_code),
+        )
+        profiler.count("cache_lookups", cache="rbi_rates", result="miss" if missed else "hit")
+        return rate_map
+
+    def __load_conversion_matrix(self) -> conversion_matrix.ConversionMatrix:
+        rates_version = self.__current_rates_version()
+        cross_rates_file_abs_path = self.cross_rates_file_path()
+        matrix = conversion_matrix.build(
+            self.rate_policy,
+            self.rate_source_type.bucket_unit,
+            self.rate_source_type.read_all(self.data_folder_abs_path),
+            (
+                cross_rates.read_cross_rates(cross_rates_file_abs_path)
+                if os.path.exists(cross_rates_file_abs_path)
+                else {}
+            ),
+        )
+        self.__rates_version = rates_version
+        return matrix
+
+    def conversion_matrix(self) -> conversion_matrix.ConversionMatrix:
+        """
+        INR rates of every currency the rate policy publishes, plus the ones derived
+        through a pivot currency from rates/cross/rates.csv
+        """
+        matrix, missed = self.__load_once(
+            "conversion_matrices",
+            self.conversion_matrix_cache,
+            self.rate_policy,
+            self.__load_conversion_matrix,
+        )
+        profiler.count(
+            "cache_lookups", cache="conversion_matrices", result="miss" if missed else "hit"
+        )
+        return matrix
+
+    def rate_source(self, currency_code: str) -> rate_sources.RateSource:
+        """
+        Rates of currency_code under the rate policy, callers doing many lookups
+        should keep the source instead of going through get_rate every time
+        """
+        rate_source, _ = self.__load_once(
+            "rate_sources",
+            self.rate_source_cache,
+            currency_code,
+            lambda: conversion_matrix.MatrixRateSource(currency_code, self.conversion_matrix()),
+        )
+        return rate_source
+
+    def get_rate(self, currency_code: str, time_in_ms: int) -> float:
+        return self.rate_source(currency_code).rate_at(time_in_ms)
+
+    def get_rates(self, currency_code: str, times_in_ms: np.ndarray) -> np.ndarray:
+        return self.rate_source(currency_code).rates_at(times_in_ms)
+
+    def get_rate_at_month(self, currency_code: str, month: int, year: int) -> float:
+        return rbi_rates_utils.rate_at_month(
+            self.load_rates(currency_code), currency_code, month, year
+        )
+
+    def get_rate_for_prev_mon_for_time_in_ms(self, currency_code: str, time_in_ms: int) -> float:
+        return rbi_rates_utils.rate_for_prev_mon_for_time_in_ms(
+            self.load_rates(currency_code), currency_code, time_in_ms
+        )
+
+    def get_rates_for_prev_mon_for_times_in_ms(
+        self, currency_code: str, times_in_ms: np.ndarray
+    ) -> np.ndarray:
+        return rbi_rates_utils.rates_for_prev_mon_for_times_in_ms(
+            self.load_rates(currency_code), currency_code, times_in_ms
+        )
+
+
+__default_service: t.Optional[MarketDataService] = None
+__default_service_lock = threading.Lock()
+
+
+def default_service() -> MarketDataService:
+    """
+    Service of the repo's historic_data(or SEFA_HISTORIC_DATA), shared by the
+    callers which do not pass their own
+    """
+    global __default_service
+    with __default_service_lock:
+        if __default_service is None:
+            __default_service = MarketDataService()
+        return __default_service
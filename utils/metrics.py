@@ -0,0 +1,237 @@
+import math
+import os
+import tempfile
+import threading
+import typing as t
+
+# nothing is recorded unless enabled, set by `run.py --metrics-file`, the watch
+# daemon and the HTTP service
+ENABLED = False
+
+METRIC_PREFIX = "sefa_"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# seconds, from a single lookup to a whole batch
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# help text of the metrics, the others are exported without one
+DESCRIPTIONS = {
+    "files_parsed_total": "Broker exports parsed, by source mode",
+    "purchases_parsed_total": "Purchases read from the broker exports, by source mode",
+    "fa_entries_computed_total": "FA entries(FAA3 rows) computed, by calendar mode",
+    "cache_lookups_total": "Lookups of the in memory and on disk caches, by cache and hit or miss",
+    "cache_evictions_total": (
+        "Entries dropped from the in memory caches to stay within their memory or entry budget"
+    ),
+    "fmv_lookups_total": "Share FMV lookups",
+    "closing_price_lookups_total": "Closing share price lookups",
+    "peak_lookups_total": "Peak INR value lookups",
+    "rbi_rate_lookups_total": "RBI rate lookups",
+    "inr_rate_lookups_total": "Dates converted to INR by the conversion matrix, by rate policy",
+    "lots_computed_total": "Lots whose FA values were computed",
+    "fmv_holiday_fallbacks_total": (
+        "FMV lookups on a weekday without prices(market holiday or data gap) which used the next "
+        + "available day, by kind"
+    ),
+    "stage_duration_seconds": "Time taken by each stage of the pipeline",
+    "http_requests_total": "HTTP requests served, by route and status",
+    "http_request_duration_seconds": "Time taken to answer the HTTP requests, by route",
+    "jobs_total": "Report jobs finished, by status",
+    "watch_files_total": "Files handled by the watch daemon, by result",
+}
+
+Labels = t.Tuple[t.Tuple[str, str], ...]
+
+
+class Histogram:
+    def __init__(self, buckets: t.Sequence[float]):
+        self.buckets = tuple(buckets)
+        # cumulative counts are computed while rendering
+        self.bucket_counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        for index, upper_bound in enumerate(self.buckets):
+            if value <= upper_bound:
+                self.bucket_counts[index] += 1
+                break
+
+    def merge(self, other: "Histogram"):
+        if other.buckets != self.buckets:
+            raise AssertionError(
+                f"Can't merge a histogram of buckets {other.buckets} into {self.buckets}"
+            )
+        self.bucket_counts = [
+            count + other_count
+            for count, other_count in zip(self.bucket_counts, other.bucket_counts)
+        ]
+        self.count += other.count
+        self.sum += other.sum
+
+
+# counters and histograms recorded by another process, e.g. a job worker
+Snapshot = t.TypedDict(
+    "Snapshot",
+    {
+        "counters": t.Dict[str, t.Dict[Labels, float]],
+        "histograms": t.Dict[str, t.Dict[Labels, Histogram]],
+    },
+)
+
+__lock = threading.Lock()
+__counters: t.Dict[str, t.Dict[Labels, float]] = {}
+__histograms: t.Dict[str, t.Dict[Labels, Histogram]] = {}
+
+
+def __labels(labels: t.Dict[str, t.Any]) -> Labels:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def enable():
+    global ENABLED
+    ENABLED = True
+
+
+def disable():
+    global ENABLED
+    ENABLED = False
+
+
+def reset():
+    with __lock:
+        __counters.clear()
+        __histograms.clear()
+
+
+def take_snapshot() -> Snapshot:
+    """
+    Everything recorded since the previous snapshot, the registry is emptied so a
+    long lived worker process sends every value once
+    """
+    global __counters, __histograms
+    with __lock:
+        snapshot: Snapshot = {"counters": __counters, "histograms": __histograms}
+        __counters = {}
+        __histograms = {}
+    return snapshot
+
+
+def merge(snapshot: Snapshot):
+    """
+    Adds the values of a snapshot taken by another process to this registry
+    """
+    with __lock:
+        for name, counter_series in snapshot["counters"].items():
+            series = __counters.setdefault(name, {})
+            for key, value in counter_series.items():
+                series[key] = series.get(key, 0) + value
+        for name, histogram_series in snapshot["histograms"].items():
+            series = __histograms.setdefault(name, {})
+            for key, histogram in histogram_series.items():
+                if key not in series:
+                    series[key] = Histogram(histogram.buckets)
+                series[key].merge(histogram)
+
+
+def inc(name: str, amount: float = 1, **labels):
+    """
+    Adds amount to the counter name(without the sefa_ prefix, ending with _total)
+    """
+    if not ENABLED:
+        return
+    with __lock:
+        series = __counters.setdefault(name, {})
+        key = __labels(labels)
+        series[key] = series.get(key, 0) + amount
+
+
+def observe(name: str, value: float, buckets: t.Sequence[float] = DEFAULT_BUCKETS, **labels):
+    if not ENABLED:
+        return
+    with __lock:
+        series = __histograms.setdefault(name, {})
+        key = __labels(labels)
+        if key not in series:
+            series[key] = Histogram(buckets)
+        series[key].observe(value)
+
+
+def __escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def __format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{__escape(value)}"' for name, value in labels) + "}"
+
+
+def __format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def __header(name: str, metric_type: str) -> t.List[str]:
+    lines = []
+    if name in DESCRIPTIONS:
+        lines.append(f"# HELP {METRIC_PREFIX}{name} {DESCRIPTIONS[name]}")
+    lines.append(f"# TYPE {METRIC_PREFIX}{name} {metric_type}")
+    return lines
+
+
+def render() -> str:
+    """
+    Every metric in the Prometheus text exposition format
+    """
+    lines: t.List[str] = []
+    with __lock:
+        for name in sorted(__counters):
+            lines.extend(__header(name, "counter"))
+            for labels, value in sorted(__counters[name].items()):
+                lines.append(
+                    f"{METRIC_PREFIX}{name}{__format_labels(labels)} {__format_value(value)}"
+                )
+        for name in sorted(__histograms):
+            lines.extend(__header(name, "histogram"))
+            for labels, histogram in sorted(__histograms[name].items()):
+                cumulative_count = 0
+                for upper_bound, bucket_count in zip(histogram.buckets, histogram.bucket_counts):
+                    cumulative_count += bucket_count
+                    bucket_labels = labels + (("le", __format_value(upper_bound)),)
+                    lines.append(
+                        f"{METRIC_PREFIX}{name}_bucket{__format_labels(bucket_labels)} "
+                        + f"{cumulative_count}"
+                    )
+                lines.append(
+                    f"{METRIC_PREFIX}{name}_bucket{__format_labels(labels + (('le', '+Inf'),))} "
+                    + f"{histogram.count}"
+                )
+                lines.append(
+                    f"{METRIC_PREFIX}{name}_sum{__format_labels(labels)} "
+                    + f"{__format_value(histogram.sum)}"
+                )
+                lines.append(
+                    f"{METRIC_PREFIX}{name}_count{__format_labels(labels)} {histogram.count}"
+                )
+    return "".join(line + "\n" for line in lines)
+
+
+def write_textfile(file_abs_path: str):
+    """
+    Replaces file_abs_path with the rendered metrics atomically, so a scraper(e.g.
+    the textfile collector of node_exporter) never reads a partial file
+    """
+    folder_abs_path = os.path.dirname(os.path.abspath(file_abs_path))
+    os.makedirs(folder_abs_path, exist_ok=True)
+    file_descriptor, temp_file_abs_path = tempfile.mkstemp(dir=folder_abs_path, suffix=".tmp")
+    try:
+        with os.fdopen(file_descriptor, "w", encoding="utf-8") as f:
+            f.write(render())
+        os.replace(temp_file_abs_path, file_abs_path)
+    except BaseException:
+        if os.path.exists(temp_file_abs_path):
+            os.remove(temp_file_abs_path)
+        raise
@@ -0,0 +1,196 @@
+import abc
+import csv
+import importlib.util
+import json
+import typing as t
+
+from utils import file_utils
+
+CSV_FORMAT = "csv"
+JSON_LINES_FORMAT = "jsonl"
+PARQUET_FORMAT = "parquet"
+SUPPORTED_FORMATS = [CSV_FORMAT, JSON_LINES_FORMAT, PARQUET_FORMAT]
+# optional modules needed by some formats
+__format_modules = {PARQUET_FORMAT: "pyarrow"}
+
+
+class RowSink(abc.ABC):
+    """
+    Streams rows of a single table into one output file. Rows are written as they
+    arrive so the whole table is never held in memory as a single string
+    """
+
+    extension = ""
+
+    def __init__(self, file_abs_path: str, keys: t.List[str]):
+        self.file_abs_path = file_abs_path
+        self.keys = keys
+
+    @abc.abstractmethod
+    def write_row(self, row: t.Sequence):
+        pass
+
+    @abc.abstractmethod
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+
+class CsvRowSink(RowSink):
+    extension = "csv"
+
+    def __init__(self, file_abs_path: str, keys: t.List[str]):
+        super().__init__(file_abs_path, keys)
+        self.__file = open(file_abs_path, "w", newline="", encoding="utf-8")
+        self.__writer = csv.writer(self.__file, delimiter=",", quoting=csv.QUOTE_MINIMAL)
+        self.__writer.writerow(keys)
+
+    def write_row(self, row: t.Sequence):
+        self.__writer.writerow(row)
+
+    def close(self):
+        self.__file.close()
+
+
+class JsonLinesRowSink(RowSink):
+    extension = "jsonl"
+
+    def __init__(self, file_abs_path: str, keys: t.List[str]):
+        super().__init__(file_abs_path, keys)
+        self.__file = open(file_abs_path, "w", encoding="utf-8")
+
+    def write_row(self, row: t.Sequence):
+        self.__file.write(json.dumps(dict(zip(self.keys, row)), ensure_ascii=True))
+        self.__file.write("\n")
+
+    def close(self):
+        self.__file.close()
+
+
+class ParquetRowSink(RowSink):
+    """
+    Columnar output backed by `pyarrow`, which is only needed when this format is
+    selected. Rows are buffered per row group instead of per file
+    """
+
+    extension = "parquet"
+    ROW_GROUP_SIZE = 4096
+
+    def __init__(self, file_abs_path: str, keys: t.List[str]):
+        super().__init__(file_abs_path, keys)
+        import pyarrow  # pylint: disable=import-outside-toplevel
+        import pyarrow.parquet  # pylint: disable=import-outside-toplevel
+
+        self.__pa = pyarrow
+        self.__writer = None
+        self.__buffer: t.List[t.Sequence] = []
+
+    def write_row(self, row: t.Sequence):
+        self.__buffer.append(row)
+        if len(self.__buffer) >= self.ROW_GROUP_SIZE:
+            self.__flush()
+
+    def __flush(self):
+        if not self.__buffer:
+            return
+        table = self.__pa.Table.from_pylist(
+            [dict(zip(self.keys, row)) for row in self.__buffer]
+        )
+        if self.__writer is None:
+            self.__writer = self.__pa.parquet.ParquetWriter(
+                self.file_abs_path, table.schema
+            )
+        self.__writer.write_table(table)
+        self.__buffer = []
+
+    def close(self):
+        self.__flush()
+        if self.__writer is None:
+            # no rows at all, still leave a readable file with the column names
+            self.__writer = self.__pa.parquet.ParquetWriter(
+                self.file_abs_path,
+                self.__pa.schema([(key, self.__pa.string()) for key in self.keys]),
+            )
+        self.__writer.close()
+
+
+__sink_types: t.Dict[str, t.Type[RowSink]] = {
+    CSV_FORMAT: CsvRowSink,
+    JSON_LINES_FORMAT: JsonLinesRowSink,
+    PARQUET_FORMAT: ParquetRowSink,
+}
+
+
+def validate_formats(formats: t.Iterable[str]):
+    """
+    Fails before any output is written when a format is unknown or the module it
+    needs is not installed
+    """
+    selected_formats = list(formats)
+    unsupported_formats = [f for f in selected_formats if f not in __sink_types]
+    if unsupported_formats:
+        raise AssertionError(
+            f"Unsupported output formats = {unsupported_formats}, supported = {SUPPORTED_FORMATS}"
+        )
+    for output_format in selected_formats:
+        module = __format_modules.get(output_format)
+        if module is not None and importlib.util.find_spec(module) is None:
+            raise AssertionError(
+                f'Output format = {output_format} needs "{module}" installed. '
+                + f'Please run: "python3 -m pip install {module}"'
+            )
+
+
+def write_rows(
+    output_folder_abs_path: str,
+    base_file_name: str,
+    keys: t.List[str],
+    rows: t.Iterable[t.Sequence],
+    override: bool,
+    formats: t.Sequence[str] = (CSV_FORMAT,),
+    print_path_to_console: bool = False,
+) -> t.List[str]:
+    """
+    Writes rows once into every selected format(only CSV by default), e.g.
+    base_file_name = fa_entries with formats = [csv, jsonl] creates fa_entries.csv
+    and fa_entries.jsonl. `rows` is consumed a single time, so it can be a generator
+    """
+    selected_formats = list(formats)
+    validate_formats(selected_formats)
+    sinks: t.List[RowSink] = []
+    try:
+        for output_format in dict.fromkeys(selected_formats):
+            sink_type = __sink_types[output_format]
+            final_file_abs_path = file_utils.prepare_output_file(
+                output_folder_abs_path,
+                f"{base_file_name}.{sink_type.extension}",
+                override,
+            )
+            sinks.append(sink_type(final_file_abs_path, keys))
+        for row in rows:
+            for sink in sinks:
+                sink.write_row(row)
+    finally:
+        for sink in sinks:
+            sink.close()
+    if print_path_to_console:
+        for sink in sinks:
+            file_utils.print_file_path(sink.file_abs_path)
+    return [sink.file_abs_path for sink in sinks]
+
+
+def write_debug_artifact(
+    output_folder_abs_path: str, file_name: str, obj, enabled: bool = True
+) -> t.Optional[str]:
+    """
+    Writes intermediate JSON artifacts unless they are switched off(see
+    RunOptions.write_debug_artifacts)
+    """
+    if not enabled:
+        return None
+    return file_utils.write_to_file(output_folder_abs_path, file_name, obj, True)
@@ -0,0 +1,94 @@
+import json
+import os
+import typing as t
+
+from utils import file_utils, profiler
+
+# bump it whenever the stored values are computed differently
+SNAPSHOT_VERSION = 1
+
+SnapshotValues = t.TypedDict(
+    "SnapshotValues",
+    {
+        "closing_rbi_rate": float,
+        "closing_share_price": float,
+        "fmv_price_on_start": float,
+        "start_rbi_rate": float,
+        # INR value of a single share at its peak within the whole period
+        "peak_inr_price": float,
+    },
+)
+
+
+class PeriodSnapshot:
+    """
+    Market values every FA report of a (ticker, calendar_mode, assessment_year)
+    starts from, computed once for all the employees of a company. Like the values
+    of Faa3State, an entry is only used with the data_versions it was computed with
+    """
+
+    def __init__(self, entries: t.Optional[t.Dict[str, t.Dict[str, t.Any]]] = None):
+        self.entries = entries or {}
+
+    @staticmethod
+    def key(ticker: str, calendar_mode: str, assessment_year: int) -> str:
+        return f"{calendar_mode}_{assessment_year}/{ticker}"
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(
+        self,
+        ticker: str,
+        calendar_mode: str,
+        assessment_year: int,
+        data_versions: t.Dict[str, t.Any],
+    ) -> t.Optional[SnapshotValues]:
+        entry = self.entries.get(self.key(ticker, calendar_mode, assessment_year))
+        # round trip through JSON so that e.g. dataclasses compare equal to stored dicts
+        is_hit = entry is not None and entry["data_versions"] == json.loads(
+            json.dumps(data_versions, default=vars)
+        )
+        profiler.count("cache_lookups", cache="period_snapshot", result="hit" if is_hit else "miss")
+        return entry["values"] if is_hit else None
+
+    def put(
+        self,
+        ticker: str,
+        calendar_mode: str,
+        assessment_year: int,
+        data_versions: t.Dict[str, t.Any],
+        values: SnapshotValues,
+    ):
+        self.entries[self.key(ticker, calendar_mode, assessment_year)] = {
+            "data_versions": json.loads(json.dumps(data_versions, default=vars)),
+            "values": values,
+        }
+
+    def to_json(self) -> t.Dict[str, t.Any]:
+        return {"version": SNAPSHOT_VERSION, "entries": self.entries}
+
+
+def load(snapshot_file_abs_path: str) -> PeriodSnapshot:
+    """
+    Loads a snapshot saved by save, an empty snapshot is returned when it was
+    computed by another version
+    """
+    if not os.path.exists(snapshot_file_abs_path):
+        raise AssertionError(f"Period snapshot {snapshot_file_abs_path} is NOT present")
+    with open(snapshot_file_abs_path, encoding="utf-8") as f:
+        stored = json.load(f)
+    if stored.get("version") != SNAPSHOT_VERSION:
+        print(f"Ignoring {snapshot_file_abs_path} as it was computed by another version")
+        return PeriodSnapshot()
+    return PeriodSnapshot(stored["entries"])
+
+
+def save(snapshot_file_abs_path: str, snapshot: PeriodSnapshot) -> str:
+    return file_utils.write_to_file(
+        os.path.dirname(os.path.abspath(snapshot_file_abs_path)),
+        os.path.basename(snapshot_file_abs_path),
+        snapshot.to_json(),
+        True,
+        print_path_to_console=True,
+    )
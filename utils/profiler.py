@@ -0,0 +1,238 @@
+import contextlib
+import cProfile
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import typing as t
+
+from utils import metrics
+
+# collecting spans and counters costs a call per lookup, so nothing is recorded
+# unless enabled, set by `run.py --profile` or profiling(). Counters and spans are
+# exported as metrics too while those are enabled
+ENABLED = False
+
+SpanStats = t.TypedDict(
+    "SpanStats", {"count": int, "total_s": float, "max_s": float}
+)
+
+TraceEvent = t.TypedDict(
+    "TraceEvent",
+    {"name": str, "ph": str, "ts": float, "dur": float, "pid": int, "tid": int},
+)
+
+__lock = threading.Lock()
+__local = threading.local()
+__span_stats: t.Dict[str, SpanStats] = {}
+__counters: t.Dict[str, float] = {}
+__trace_events: t.List[TraceEvent] = []
+__start_time = time.perf_counter()
+
+
+def reset():
+    """
+    Drops the spans, counters and trace events recorded so far
+    """
+    global __start_time
+    with __lock:
+        __span_stats.clear()
+        __counters.clear()
+        __trace_events.clear()
+        __start_time = time.perf_counter()
+    if tracemalloc.is_tracing():
+        tracemalloc.reset_peak()
+
+
+def enable(trace_memory: bool = False):
+    """
+    Starts recording, trace_memory additionally traces the python allocations for
+    the peak heap size, which slows the run down noticeably
+    """
+    global ENABLED
+    ENABLED = True
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def disable():
+    global ENABLED
+    ENABLED = False
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def count(name: str, amount: float = 1, **labels):
+    """
+    Adds amount to the counter name, labels split it e.g. by source_mode. The
+    metric is exported as <name>_total
+    """
+    if metrics.ENABLED:
+        metrics.inc(f"{name}_total", amount, **labels)
+    if not ENABLED:
+        return
+    key = (
+        name + "{" + ",".join(f"{label}={value}" for label, value in sorted(labels.items())) + "}"
+        if labels
+        else name
+    )
+    with __lock:
+        __counters[key] = __counters.get(key, 0) + amount
+
+
+@contextlib.contextmanager
+def span(name: str):
+    """
+    Times the enclosed block as a stage of the run, nested spans are named after
+    their parents like parse_input/load_share_prices
+    """
+    if not (ENABLED or metrics.ENABLED):
+        yield
+        return
+    stack = getattr(__local, "stack", None)
+    if stack is None:
+        stack = __local.stack = []
+    stack.append(name)
+    full_name = "/".join(stack)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        stack.pop()
+        metrics.observe("stage_duration_seconds", duration, stage=full_name)
+        if ENABLED:
+            with __lock:
+                stats = __span_stats.setdefault(
+                    full_name, {"count": 0, "total_s": 0.0, "max_s": 0.0}
+                )
+                stats["count"] += 1
+                stats["total_s"] += duration
+                stats["max_s"] = max(stats["max_s"], duration)
+                __trace_events.append(
+                    {
+                        "name": name,
+                        "ph": "X",
+                        "ts": (start - __start_time) * 1e6,
+                        "dur": duration * 1e6,
+                        "pid": os.getpid(),
+                        "tid": threading.get_ident(),
+                    }
+                )
+
+
+def profiled(name: str):
+    """
+    Decorator version of span
+    """
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def peak_rss_mb() -> t.Optional[float]:
+    try:
+        import resource
+    except ImportError:
+        # not available on windows
+        return None
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on linux, bytes on macOS
+    return peak_rss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def snapshot() -> t.Dict[str, t.Any]:
+    """
+    Spans, counters and peak memory recorded so far, e.g. for a batch runner to
+    store along with its own results
+    """
+    with __lock:
+        spans = {name: dict(stats) for name, stats in __span_stats.items()}
+        counters = dict(__counters)
+    return {
+        "spans": spans,
+        "counters": counters,
+        "peak_rss_mb": peak_rss_mb(),
+        "peak_traced_mb": (
+            tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+            if tracemalloc.is_tracing()
+            else None
+        ),
+    }
+
+
+def summary_table(report: t.Optional[t.Dict[str, t.Any]] = None) -> str:
+    report = report or snapshot()
+    lines = [f"{'stage':<60} {'count':>7} {'total_s':>10} {'max_s':>10}"]
+    for name, stats in sorted(report["spans"].items()):
+        lines.append(
+            f"{name:<60} {stats['count']:>7} {stats['total_s']:>10.4f} {stats['max_s']:>10.4f}"
+        )
+    if report["counters"]:
+        lines.append("")
+        lines.append(f"{'counter':<60} {'value':>7}")
+        for name, value in sorted(report["counters"].items()):
+            lines.append(f"{name:<60} {value:>7g}")
+    lines.append("")
+    if report["peak_rss_mb"] is not None:
+        lines.append(f"Peak RSS = {report['peak_rss_mb']:.1f} MB")
+    if report["peak_traced_mb"] is not None:
+        lines.append(f"Peak traced python memory = {report['peak_traced_mb']:.1f} MB")
+    return "\n".join(lines)
+
+
+def write_trace(file_abs_path: str, report: t.Optional[t.Dict[str, t.Any]] = None):
+    """
+    Writes the spans in the trace event format, which chrome://tracing and
+    Perfetto open, along with the summary(report or a new snapshot)
+    """
+    with __lock:
+        trace_events = list(__trace_events)
+    parent_folder = os.path.dirname(file_abs_path)
+    if parent_folder:
+        os.makedirs(parent_folder, exist_ok=True)
+    with open(file_abs_path, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "traceEvents": trace_events,
+                "displayTimeUnit": "ms",
+                "summary": report or snapshot(),
+            },
+            f,
+            indent=2,
+        )
+
+
+@contextlib.contextmanager
+def profiling(
+    trace_memory: bool = False, cprofile_output_abs_path: t.Optional[str] = None
+) -> t.Iterator[t.Dict[str, t.Any]]:
+    """
+    Records the enclosed block, the yielded dict is filled with its snapshot on
+    exit. cProfile stats of the block are dumped to cprofile_output_abs_path when
+    given(open them with `python -m pstats` or snakeviz)
+    """
+    report: t.Dict[str, t.Any] = {}
+    reset()
+    enable(trace_memory)
+    c_profile = cProfile.Profile() if cprofile_output_abs_path else None
+    if c_profile is not None:
+        c_profile.enable()
+    try:
+        yield report
+    finally:
+        if c_profile is not None:
+            c_profile.disable()
+            c_profile.dump_stats(cprofile_output_abs_path)
+        report.update(snapshot())
+        disable()
@@ -0,0 +1,60 @@
+import typing as t
+
+from . import bounded_cache, profiler
+
+# e.g. every lot of every employee of a company asking for the same vest date
+DEFAULT_MAX_ENTRIES = 100_000
+
+
+class QueryMemo:
+    """
+    Results of market data queries keyed by the query, its arguments and the
+    version of the data it was answered from(e.g. the fingerprint of the share
+    prices file), so results of older data are never returned. Entries of a ticker
+    are dropped explicitly by invalidate once its data changes, the least recently
+    used ones once there are more than max_entries
+    """
+
+    def __init__(self, max_entries: t.Optional[int] = DEFAULT_MAX_ENTRIES):
+        self.cache = bounded_cache.BoundedCache(
+            lambda _: 1,
+            max_entries,
+            on_evict=lambda _: profiler.count("cache_evictions", cache="queries"),
+        )
+
+    def get_or_compute(
+        self,
+        query: str,
+        ticker: str,
+        data_version: str,
+        args: t.Tuple,
+        compute: t.Callable[[], t.Any],
+    ) -> t.Any:
+        key = (ticker, query, data_version, args)
+        # results are never None, so a missing entry is None
+        value = self.cache.get(key)
+        profiler.count(
+            "cache_lookups", cache="queries", query=query, result="miss" if value is None else "hit"
+        )
+        if value is None:
+            value = compute()
+            self.cache[key] = value
+        return value
+
+    def invalidate(self, ticker: t.Optional[str] = None, queries: t.Optional[t.Set[str]] = None):
+        """
+        Drops the entries of ticker(every ticker when None) of queries(every query
+        when None)
+        """
+        for key in self.cache:
+            key_ticker, key_query, _, _ = key
+            if (ticker is None or key_ticker == ticker) and (
+                queries is None or key_query in queries
+            ):
+                self.cache.pop(key)
+
+    def clear(self):
+        self.cache.clear()
+
+    def stats(self) -> bounded_cache.CacheStats:
+        return self.cache.stats()
@@ -0,0 +1,166 @@
+import datetime
+import math
+import typing as t
+
+import numpy as np
+
+from .. import date_utils, profiler
+from .cross_rates import CrossRateSource, CrossRates
+from .rate_sources import RateSource
+
+
+def buckets_since_epoch(times_in_ms: np.ndarray, bucket_unit: str) -> np.ndarray:
+    return (
+        np.asarray(times_in_ms, dtype=np.int64)
+        .astype("datetime64[ms]")
+        .astype(f"datetime64[{bucket_unit}]")
+        .astype(np.int64)
+    )
+
+
+class ConversionMatrix:
+    """
+    INR rate of every currency(rows) for every month or day(columns) of the
+    covered range, computed once from the rate sources so converting any series
+    is an index lookup and a multiply
+    """
+
+    def __init__(
+        self,
+        policy: str,
+        bucket_unit: str,
+        first_bucket: int,
+        currency_codes: t.List[str],
+        inr_rates: np.ndarray,
+    ):
+        self.policy = policy
+        self.bucket_unit = bucket_unit
+        self.first_bucket = first_bucket
+        self.currency_codes = currency_codes
+        self.inr_rates = inr_rates
+        self.__rows = {currency_code: index for index, currency_code in enumerate(currency_codes)}
+
+    def nbytes(self) -> int:
+        return self.inr_rates.nbytes
+
+    def row(self, currency_code: str) -> np.ndarray:
+        if currency_code not in self.__rows:
+            raise AssertionError(
+                f"No {self.policy} rates for currency code {currency_code}, known = "
+                + f"{self.currency_codes}, other currencies need a row in rates/cross/rates.csv"
+            )
+        return self.inr_rates[self.__rows[currency_code]]
+
+    def known_rates_at(self, currency_code: str, times_in_ms: np.ndarray) -> np.ndarray:
+        row = self.row(currency_code)
+        buckets = buckets_since_epoch(times_in_ms, self.bucket_unit) - self.first_bucket
+        is_covered = (buckets >= 0) & (buckets < len(row))
+        return np.where(is_covered, row[np.clip(buckets, 0, len(row) - 1)], np.nan)
+
+    def known_rate_at(self, currency_code: str, time_in_ms: int) -> float:
+        """
+        Scalar version of known_rates_at, without the array conversions
+        """
+        row = self.row(currency_code)
+        if self.bucket_unit == "D":
+            bucket = time_in_ms // date_utils.ONE_DAY_IN_MS
+        else:
+            dt = datetime.datetime.utcfromtimestamp(time_in_ms / 1000)
+            bucket = (dt.year - 1970) * 12 + dt.month - 1
+        bucket -= self.first_bucket
+        return float(row[bucket]) if 0 <= bucket < len(row) else math.nan
+
+    def to_inr(
+        self, currency_code: str, times_in_ms: np.ndarray, amounts: np.ndarray
+    ) -> np.ndarray:
+        return np.asarray(amounts, dtype=np.float64) * MatrixRateSource(
+            currency_code, self
+        ).rates_at(times_in_ms)
+
+
+class MatrixRateSource(RateSource):
+    """
+    Rates of one row of a ConversionMatrix
+    """
+
+    def __init__(self, currency_code: str, matrix: ConversionMatrix):
+        super().__init__(currency_code)
+        self.policy = matrix.policy
+        self.bucket_unit = matrix.bucket_unit
+        self.matrix = matrix
+        # fails early for a currency without rates
+        matrix.row(currency_code)
+
+    @classmethod
+    def file_paths(cls, data_folder_abs_path: str) -> t.List[str]:
+        raise AssertionError("Matrix rate sources are built from other sources, see build")
+
+    @classmethod
+    def read_all(cls, data_folder_abs_path: str) -> t.Dict[str, RateSource]:
+        raise AssertionError("Matrix rate sources are built from other sources, see build")
+
+    def time_range(self) -> t.Tuple[int, int]:
+        # one column per bucket from the first one
+        first_bucket = self.matrix.first_bucket
+        first_time_in_ms, next_time_in_ms = (
+            np.array([first_bucket, first_bucket + self.matrix.inr_rates.shape[1]], dtype=np.int64)
+            .astype(f"datetime64[{self.bucket_unit}]")
+            .astype("datetime64[ms]")
+            .astype(np.int64)
+        )
+        return int(first_time_in_ms), int(next_time_in_ms) - 1
+
+    def known_rates_at(self, times_in_ms: np.ndarray) -> np.ndarray:
+        profiler.count("inr_rate_lookups", len(times_in_ms), policy=self.policy)
+        return self.matrix.known_rates_at(self.currency_code, times_in_ms)
+
+    def rate_at(self, time_in_ms: int) -> float:
+        profiler.count("inr_rate_lookups", policy=self.policy)
+        rate = self.matrix.known_rate_at(self.currency_code, time_in_ms)
+        if math.isnan(rate):
+            # raises with the message of the bulk lookup
+            return super().rate_at(time_in_ms)
+        return rate
+
+
+def build(
+    policy: str,
+    bucket_unit: str,
+    direct_sources: t.Dict[str, RateSource],
+    cross_rates: t.Dict[str, CrossRates],
+) -> ConversionMatrix:
+    """
+    Samples the direct sources and the cross rates of the currencies they lack(the
+    ones whose pivot is a direct source) once per bucket of their combined range
+    """
+    sources = dict(direct_sources)
+    for currency_code, currency_cross_rates in sorted(cross_rates.items()):
+        if currency_code not in sources and currency_cross_rates.pivot in direct_sources:
+            sources[currency_code] = CrossRateSource(
+                currency_code, direct_sources[currency_cross_rates.pivot], currency_cross_rates
+            )
+    currency_codes = sorted(sources)
+    if not currency_codes:
+        return ConversionMatrix(policy, bucket_unit, 0, [], np.empty((0, 0)))
+    with profiler.span("build_conversion_matrix"):
+        time_ranges = [sources[currency_code].time_range() for currency_code in currency_codes]
+        first_bucket, last_bucket = buckets_since_epoch(
+            np.array(
+                [min(start for start, _ in time_ranges), max(end for _, end in time_ranges)],
+                dtype=np.int64,
+            ),
+            bucket_unit,
+        )
+        bucket_times_in_ms = (
+            np.arange(first_bucket, last_bucket + 1, dtype=np.int64)
+            .astype(f"datetime64[{bucket_unit}]")
+            .astype("datetime64[ms]")
+            .astype(np.int64)
+        )
+        inr_rates = np.vstack(
+            [
+                sources[currency_code].known_rates_at(bucket_times_in_ms)
+                for currency_code in currency_codes
+            ]
+        )
+    return ConversionMatrix(policy, bucket_unit, int(first_bucket), currency_codes, inr_rates)
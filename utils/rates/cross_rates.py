@@ -0,0 +1,109 @@
+import os
+import typing as t
+from dataclasses import dataclass
+
+from utils.runtime_utils import warn_missing_module
+
+warn_missing_module("pandas")
+import pandas as pd
+import numpy as np
+
+from .. import date_utils, logger, profiler
+from .rate_sources import RateSource
+
+CROSS_RATES_COLUMNS = ["Date", "Currency", "Pivot", "Rate"]
+# a cross rate older than this(from the day of the pivot rate) is treated as missing
+MAX_CROSS_RATE_AGE_IN_DAYS = 7
+
+
+@dataclass
+class CrossRates:
+    """
+    Units of the pivot currency per unit of a currency, sorted by time
+    """
+
+    pivot: str
+    times_in_ms: np.ndarray
+    rates: np.ndarray
+
+
+def cross_rates_file_path(data_folder_abs_path: str) -> str:
+    return os.path.join(data_folder_abs_path, "rates", "cross", "rates.csv")
+
+
+def read_cross_rates(cross_rates_file_abs_path: str) -> t.Dict[str, CrossRates]:
+    """
+    Rows of Date(YYYY-MM-DD), Currency, Pivot and Rate, e.g. 2024-07-31,CHF,USD,1.1386
+    """
+    print(f"Parsing cross rates from {cross_rates_file_abs_path}")
+    with profiler.span("load_cross_rates"):
+        df = pd.read_csv(cross_rates_file_abs_path)
+        missing_columns = [column for column in CROSS_RATES_COLUMNS if column not in df.columns]
+        if missing_columns:
+            raise AssertionError(
+                f"Cross rates {cross_rates_file_abs_path} lacks the columns {missing_columns}"
+            )
+        df = pd.DataFrame(
+            {
+                "day": pd.to_datetime(df["Date"], errors="coerce").dt.normalize(),
+                "currency": df["Currency"].astype(str).str.strip().str.upper(),
+                "pivot": df["Pivot"].astype(str).str.strip().str.upper(),
+                "rate": pd.to_numeric(df["Rate"], errors="coerce"),
+            }
+        ).dropna()
+        df = df[df["rate"] > 0].sort_values("day", kind="stable")
+    cross_rates: t.Dict[str, CrossRates] = {}
+    for currency_code, currency_df in df.groupby("currency"):
+        pivots = currency_df["pivot"].unique()
+        if len(pivots) != 1:
+            raise AssertionError(
+                f"Cross rates of {currency_code} in {cross_rates_file_abs_path} use several pivots "
+                + f"{list(pivots)}"
+            )
+        currency_df = currency_df.drop_duplicates("day", keep="last")
+        cross_rates[str(currency_code)] = CrossRates(
+            str(pivots[0]),
+            currency_df["day"].to_numpy(dtype="datetime64[ms]").astype(np.int64),
+            currency_df["rate"].to_numpy(dtype=np.float64),
+        )
+        logger.debug_log(f"{currency_code}: {len(currency_df)} cross rates through {pivots[0]}")
+    return cross_rates
+
+
+class CrossRateSource(RateSource):
+    """
+    INR rates of a currency RBI or SBI do not publish, derived as the INR rate of
+    the pivot currency times the cross rate published on the day the pivot rate was
+    """
+
+    def __init__(self, currency_code: str, pivot_source: RateSource, cross_rates: CrossRates):
+        super().__init__(currency_code)
+        self.policy = pivot_source.policy
+        self.bucket_unit = pivot_source.bucket_unit
+        self.pivot_source = pivot_source
+        self.cross_rates = cross_rates
+
+    @classmethod
+    def file_paths(cls, data_folder_abs_path: str) -> t.List[str]:
+        return [cross_rates_file_path(data_folder_abs_path)]
+
+    @classmethod
+    def read_all(cls, data_folder_abs_path: str) -> t.Dict[str, RateSource]:
+        raise AssertionError(
+            "Cross rate sources need the source of their pivot, see conversion_matrix.build"
+        )
+
+    def time_range(self) -> t.Tuple[int, int]:
+        return self.pivot_source.time_range()
+
+    def known_rates_at(self, times_in_ms: np.ndarray) -> np.ndarray:
+        reference_times_in_ms = self.pivot_source.reference_times(times_in_ms)
+        indexes = (
+            np.searchsorted(self.cross_rates.times_in_ms, reference_times_in_ms, side="right") - 1
+        )
+        is_missing = (indexes < 0) | (
+            reference_times_in_ms - self.cross_rates.times_in_ms[np.maximum(indexes, 0)]
+            > MAX_CROSS_RATE_AGE_IN_DAYS * date_utils.ONE_DAY_IN_MS
+        )
+        cross = np.where(is_missing, np.nan, self.cross_rates.rates[np.maximum(indexes, 0)])
+        return self.pivot_source.known_rates_at(times_in_ms) * cross
@@ -0,0 +1,256 @@
+import abc
+import os
+import typing as t
+
+from utils.runtime_utils import warn_missing_module
+
+warn_missing_module("pandas")
+import pandas as pd
+import numpy as np
+
+from .. import date_utils, logger, profiler
+from . import rbi_rates_utils
+
+# last RBI reference rate of the month before the one of the date, as the rules
+# of schedule FA ask for
+RBI_PREV_MONTH_POLICY = "rbi_prev_month"
+# SBI telegraphic transfer buying rate of the date(or the last one published before it)
+SBI_TT_BUY_POLICY = "sbi_tt_buy"
+RATE_POLICIES = [RBI_PREV_MONTH_POLICY, SBI_TT_BUY_POLICY]
+
+# daily rates older than this are treated as missing instead of being carried forward
+MAX_DAILY_RATE_AGE_IN_DAYS = 7
+
+
+class RateSource(abc.ABC):
+    """
+    INR rates of one currency under one rate policy, resolved for any time in
+    milliseconds, one at a time or for a whole array of times
+    """
+
+    policy = ""
+    # rates are constant within a month("M") or a day("D")
+    bucket_unit = "D"
+
+    def __init__(self, currency_code: str):
+        self.currency_code = currency_code
+
+    @classmethod
+    @abc.abstractmethod
+    def file_paths(cls, data_folder_abs_path: str) -> t.List[str]:
+        pass
+
+    @classmethod
+    @abc.abstractmethod
+    def read_all(cls, data_folder_abs_path: str) -> t.Dict[str, "RateSource"]:
+        """
+        Sources of every currency present in the files of the policy
+        """
+
+    @abc.abstractmethod
+    def time_range(self) -> t.Tuple[int, int]:
+        """
+        First and last time a rate can be resolved for
+        """
+
+    def reference_times(self, times_in_ms: np.ndarray) -> np.ndarray:
+        """
+        Times of the published rates used for times_in_ms, e.g. to look up a cross
+        rate of the same day
+        """
+        return np.asarray(times_in_ms, dtype=np.int64)
+
+    @abc.abstractmethod
+    def known_rates_at(self, times_in_ms: np.ndarray) -> np.ndarray:
+        """
+        Rates at times_in_ms, NaN where there is none
+        """
+
+    def rates_at(self, times_in_ms: np.ndarray) -> np.ndarray:
+        rates = self.known_rates_at(times_in_ms)
+        is_missing = np.isnan(rates)
+        if is_missing.any():
+            raise AssertionError(
+                f"No {self.policy} rate for currency code {self.currency_code} for "
+                + date_utils.display_time(int(np.asarray(times_in_ms)[np.argmax(is_missing)]))
+            )
+        return rates
+
+    def rate_at(self, time_in_ms: int) -> float:
+        return float(self.rates_at(np.array([time_in_ms], dtype=np.int64))[0])
+
+
+class RbiPrevMonthRateSource(RateSource):
+    policy = RBI_PREV_MONTH_POLICY
+    bucket_unit = "M"
+
+    def __init__(self, currency_code: str, rate_map: rbi_rates_utils.RbiYearMonthRateMap):
+        super().__init__(currency_code)
+        self.rate_map = rate_map
+
+    @classmethod
+    def file_paths(cls, data_folder_abs_path: str) -> t.List[str]:
+        return [rbi_rates_utils.rates_file_path(data_folder_abs_path)]
+
+    @classmethod
+    def read_all(cls, data_folder_abs_path: str) -> t.Dict[str, RateSource]:
+        [rbi_rates_file_abs_path] = cls.file_paths(data_folder_abs_path)
+        return {
+            currency_code: cls(currency_code, rate_map)
+            for currency_code, rate_map in rbi_rates_utils.read_rate_table(
+                rbi_rates_file_abs_path
+            ).items()
+            if rate_map
+        }
+
+    def time_range(self) -> t.Tuple[int, int]:
+        months = [
+            year * 12 + month - 1
+            for year, month_map in self.rate_map.items()
+            for month in month_map
+        ]
+        # the rate of a month is used throughout the next one
+        first_time_in_ms, next_time_in_ms = (
+            np.array([min(months) + 1, max(months) + 2], dtype=np.int64) - 1970 * 12
+        ).astype("datetime64[M]").astype("datetime64[ms]").astype(np.int64)
+        return int(first_time_in_ms), int(next_time_in_ms) - 1
+
+    def reference_times(self, times_in_ms: np.ndarray) -> np.ndarray:
+        # the last day of the previous month
+        return (
+            np.asarray(times_in_ms, dtype=np.int64)
+            .astype("datetime64[ms]")
+            .astype("datetime64[M]")
+            .astype("datetime64[ms]")
+            .astype(np.int64)
+            - date_utils.ONE_DAY_IN_MS
+        )
+
+    def known_rates_at(self, times_in_ms: np.ndarray) -> np.ndarray:
+        months_since_epoch = (
+            np.asarray(times_in_ms, dtype="int64")
+            .astype("datetime64[ms]")
+            .astype("datetime64[M]")
+            .astype("int64")
+        )
+        unique_months, inverse = np.unique(months_since_epoch - 1, return_inverse=True)
+        unique_rates = np.array(
+            [
+                self.rate_map.get(1970 + int(month // 12), {})
+                .get(int(month % 12) + 1, {})
+                .get("rate", np.nan)
+                for month in unique_months
+            ],
+            dtype=np.float64,
+        )
+        return unique_rates[inverse]
+
+
+class DailyRateSource(RateSource):
+    """
+    As-of rates of a daily series, a time resolves to the rate of its day or the
+    last one published before it through a binary search over the sorted days
+    """
+
+    def __init__(self, currency_code: str, times_in_ms: np.ndarray, rates: np.ndarray):
+        super().__init__(currency_code)
+        self.times_in_ms = times_in_ms
+        self.rates = rates
+
+    def time_range(self) -> t.Tuple[int, int]:
+        return (
+            int(self.times_in_ms[0]),
+            int(self.times_in_ms[-1])
+            + (MAX_DAILY_RATE_AGE_IN_DAYS + 1) * date_utils.ONE_DAY_IN_MS
+            - 1,
+        )
+
+    def known_rates_at(self, times_in_ms: np.ndarray) -> np.ndarray:
+        times_in_ms = np.asarray(times_in_ms, dtype=np.int64)
+        indexes = np.searchsorted(self.times_in_ms, times_in_ms, side="right") - 1
+        # a rate must exist on or before every time and must not be stale
+        is_missing = (indexes < 0) | (
+            times_in_ms - self.times_in_ms[np.maximum(indexes, 0)]
+            > MAX_DAILY_RATE_AGE_IN_DAYS * date_utils.ONE_DAY_IN_MS
+        )
+        return np.where(is_missing, np.nan, self.rates[np.maximum(indexes, 0)])
+
+
+class SbiTtBuyRateSource(DailyRateSource):
+    """
+    SBI reference rates in the CSV layout of the sbi-fx-ratekeeper project, i.e.
+    DATE and TT BUY columns among others, one file per currency
+    """
+
+    policy = SBI_TT_BUY_POLICY
+    FILE_PREFIX = "SBI_REFERENCE_RATES_"
+
+    @classmethod
+    def file_paths(cls, data_folder_abs_path: str) -> t.List[str]:
+        sbi_folder_abs_path = os.path.join(data_folder_abs_path, "rates", "sbi")
+        sbi_rates_file_abs_paths = sorted(
+            os.path.join(sbi_folder_abs_path, file_name)
+            for file_name in (
+                os.listdir(sbi_folder_abs_path) if os.path.isdir(sbi_folder_abs_path) else []
+            )
+            if file_name.startswith(cls.FILE_PREFIX) and file_name.endswith(".csv")
+        )
+        if not sbi_rates_file_abs_paths:
+            raise AssertionError(
+                f"SBI rates {os.path.join(sbi_folder_abs_path, cls.FILE_PREFIX)}<currency>.csv are "
+                + "NOT present"
+            )
+        return sbi_rates_file_abs_paths
+
+    @classmethod
+    def read_all(cls, data_folder_abs_path: str) -> t.Dict[str, RateSource]:
+        sources: t.Dict[str, RateSource] = {}
+        for sbi_rates_file_abs_path in cls.file_paths(data_folder_abs_path):
+            currency_code = os.path.basename(sbi_rates_file_abs_path)[
+                len(cls.FILE_PREFIX) : -len(".csv")
+            ]
+            sources[currency_code.upper()] = cls.read(
+                sbi_rates_file_abs_path, currency_code.upper()
+            )
+        return sources
+
+    @classmethod
+    def read(cls, sbi_rates_file_abs_path: str, currency_code: str) -> "SbiTtBuyRateSource":
+        print(f"Parsing sbi rate for currency code = {currency_code}")
+        with profiler.span("load_sbi_rates"):
+            logger.debug_log(f"Parsing SBI rates from {sbi_rates_file_abs_path}")
+            df = pd.read_csv(sbi_rates_file_abs_path)
+            columns = {column.strip().upper(): column for column in df.columns}
+            if "DATE" not in columns or "TT BUY" not in columns:
+                raise AssertionError(
+                    f"No DATE and TT BUY columns in {sbi_rates_file_abs_path}; "
+                    + f"cols={list(df.columns)}"
+                )
+            days = pd.to_datetime(df[columns["DATE"]], errors="coerce").dt.normalize()
+            rates = pd.to_numeric(df[columns["TT BUY"]], errors="coerce")
+            # days without a published rate are present as 0
+            valid = pd.DataFrame({"day": days, "rate": rates}).dropna()
+            valid = valid[valid["rate"] > 0]
+            # the last rate published on a day wins
+            valid = valid.sort_values("day", kind="stable").drop_duplicates("day", keep="last")
+        if valid.empty:
+            raise AssertionError(f"No {currency_code} rates in {sbi_rates_file_abs_path}")
+        return cls(
+            currency_code,
+            valid["day"].to_numpy(dtype="datetime64[ms]").astype(np.int64),
+            valid["rate"].to_numpy(dtype=np.float64),
+        )
+
+
+__source_types: t.Dict[str, t.Type[RateSource]] = {
+    RBI_PREV_MONTH_POLICY: RbiPrevMonthRateSource,
+    SBI_TT_BUY_POLICY: SbiTtBuyRateSource,
+}
+
+
+def source_type(rate_policy: str) -> t.Type[RateSource]:
+    if rate_policy not in __source_types:
+        raise AssertionError(
+            f"Unsupported rate_policy = {rate_policy}, supported = {RATE_POLICIES}"
+        )
+    return __source_types[rate_policy]
@@ -1,13 +1,15 @@
 from dataclasses import dataclass
 import os
+import re
 from utils.runtime_utils import warn_missing_module
 
 warn_missing_module("pandas")
 import pandas as pd
+import numpy as np
 from datetime import datetime
 import typing as t
 
-from .. import date_utils, logger
+from .. import date_utils, logger, profiler
 
 
 @dataclass
@@ -19,117 +21,168 @@ class RbiRateObj:
 RbiYearMonthRateMap = t.Dict[int, t.Dict[int, RbiRateObj]]
 RbiCurrencyToRateMap = t.Dict[str, RbiYearMonthRateMap]
 
-rate_map_cache: RbiCurrencyToRateMap = {}
-
-
-def __init_map(currency_code: str) -> RbiYearMonthRateMap:
-    if currency_code not in rate_map_cache:
-        print(f"Parsing rbi rate for currency code = {currency_code}")
-        currency_rate_map: RbiYearMonthRateMap = {}
-        script_path = os.path.realpath(os.path.dirname(__file__))
-        # prefer rates.xls but fall back to BankWise.xls if present
-        rbi_dir = os.path.join(script_path, os.pardir, os.pardir, "historic_data", "rates", "rbi")
-        rbi_rates_file_abs_path = os.path.join(rbi_dir, "rates.xls")
-        if not os.path.exists(rbi_rates_file_abs_path):
-            alt = os.path.join(rbi_dir, "BankWise.xls")
-            if os.path.exists(alt):
-                rbi_rates_file_abs_path = alt
-        if not os.path.exists(rbi_rates_file_abs_path):
-            raise AssertionError(
-                f"RBI rates.xls {rbi_rates_file_abs_path} is NOT present"
-            )
 
-        with pd.ExcelFile(rbi_rates_file_abs_path, engine="openpyxl") as xl:
-            logger.debug_log(f"Parsing RBI rates from {rbi_rates_file_abs_path}")
-            # if file is the provided rates.xls with a 'Reference Rates' sheet
-            try:
-                sheet_pd = xl.parse(sheet_name="Reference Rates", skiprows=0, header=2)
-                # expected columns: Date, Currency Pairs, Rate
-                for _, data in sheet_pd.iterrows():
-                    try:
-                        if data.get("Currency Pairs") == f"INR / 1 {currency_code.upper()}":
-                            rate_time = datetime.strptime(str(data["Date"]), "%d %b %Y")
-                            rate_val = data.get("Rate")
-                            # normalize rate
-                            if isinstance(rate_val, str):
-                                rate_val = float(rate_val.replace(",", ""))
-                            if (
-                                rate_time.year not in currency_rate_map
-                                or rate_time.month not in currency_rate_map[rate_time.year]
-                                or currency_rate_map[rate_time.year][rate_time.month]["time_in_millis"]
-                                < date_utils.epoch_in_ms(rate_time)
-                            ):
-                                currency_rate_map[rate_time.year] = currency_rate_map.get(rate_time.year, {})
-                                currency_rate_map[rate_time.year][rate_time.month] = {
-                                    "time_in_millis": date_utils.epoch_in_ms(rate_time),
-                                    "rate": float(rate_val),
-                                }
-                    except Exception:
-                        # skip malformed rows
-                        continue
-            except ValueError:
-                # fallback: some sources provide a simple table like BankWise.xls with Date,USD,GBP,EURO,YEN
-                sheet_pd = xl.parse(sheet_name=0)
-                # find the column matching currency
-                col_map = {c.strip().upper(): c for c in sheet_pd.columns}
-                target_col = None
-                # map common currency codes/names
-                for key in (currency_code.upper(), "USD", "GBP", "EURO", "YEN"):
-                    if key in col_map:
-                        target_col = col_map[key]
-                        break
-                if target_col is None:
-                    # try common headers like 'USD'
-                    for c in sheet_pd.columns:
-                        if currency_code.upper() in c.upper() or c.strip().upper() in ("USD","GBP","EURO","YEN"):
-                            target_col = c
-                            break
-                if target_col is None:
-                    raise AssertionError(f"No column for currency {currency_code} in {rbi_rates_file_abs_path}")
-
-                for _, data in sheet_pd.iterrows():
-                    try:
-                        raw_date = data.get("Date") or data.get("date") or data.get(sheet_pd.columns[0])
-                        # support dd/mm/YYYY or dd-mm-YYYY or dd/mm/yy
-                        parsed = None
-                        for fmt in ("%d/%m/%Y", "%d-%m-%Y", "%d/%m/%y", "%d-%b-%Y"):
-                            try:
-                                rate_time = datetime.strptime(str(raw_date), fmt)
-                                parsed = True
-                                break
-                            except Exception:
-                                continue
-                        if not parsed:
-                            # try if it's already a datetime
-                            if isinstance(raw_date, datetime):
-                                rate_time = raw_date
-                            else:
-                                continue
-
-                        rate_val = data.get(target_col)
-                        if isinstance(rate_val, str):
-                            rate_val = float(rate_val.replace(",", "").replace("$", ""))
-                        if (
-                            rate_time.year not in currency_rate_map
-                            or rate_time.month not in currency_rate_map[rate_time.year]
-                            or currency_rate_map[rate_time.year][rate_time.month]["time_in_millis"]
-                            < date_utils.epoch_in_ms(rate_time)
-                        ):
-                            currency_rate_map[rate_time.year] = currency_rate_map.get(rate_time.year, {})
-                            currency_rate_map[rate_time.year][rate_time.month] = {
-                                "time_in_millis": date_utils.epoch_in_ms(rate_time),
-                                "rate": float(rate_val),
-                            }
-                    except Exception:
-                        continue
-
-            rate_map_cache[currency_code] = currency_rate_map
-
-    return rate_map_cache[currency_code]
-
-
-def get_rate_at_month(currency_code: str, month: int, year: int) -> float:
-    rbi_year_month_rate_map = __init_map(currency_code)
+def rates_file_path(data_folder_abs_path: str) -> str:
+    # prefer rates.xls but fall back to BankWise.xls if present
+    rbi_dir = os.path.join(data_folder_abs_path, "rates", "rbi")
+    rbi_rates_file_abs_path = os.path.join(rbi_dir, "rates.xls")
+    if not os.path.exists(rbi_rates_file_abs_path):
+        alt = os.path.join(rbi_dir, "BankWise.xls")
+        if os.path.exists(alt):
+            rbi_rates_file_abs_path = alt
+    if not os.path.exists(rbi_rates_file_abs_path):
+        raise AssertionError(
+            f"RBI rates.xls {rbi_rates_file_abs_path} is NOT present"
+        )
+    return rbi_rates_file_abs_path
+
+
+# the pairs of the Reference Rates sheet, e.g. INR / 1 USD or INR / 100 JPY
+__CURRENCY_PAIR_PATTERN = re.compile(r"^INR\s*/\s*(\d+)\s+([A-Z]{3})$")
+# the headers of the BankWise.xls columns which are not currency codes
+__BANKWISE_CURRENCY_CODES = {"EURO": "EUR", "YEN": "JPY"}
+
+
+def __put_rate(currency_rate_map: RbiYearMonthRateMap, rate_time: datetime, rate_val: float):
+    """
+    Keeps the latest rate of every month
+    """
+    if (
+        rate_time.year not in currency_rate_map
+        or rate_time.month not in currency_rate_map[rate_time.year]
+        or currency_rate_map[rate_time.year][rate_time.month]["time_in_millis"]
+        < date_utils.epoch_in_ms(rate_time)
+    ):
+        currency_rate_map[rate_time.year] = currency_rate_map.get(rate_time.year, {})
+        currency_rate_map[rate_time.year][rate_time.month] = {
+            "time_in_millis": date_utils.epoch_in_ms(rate_time),
+            "rate": float(rate_val),
+        }
+
+
+def __read_reference_rates(sheet_pd: pd.DataFrame) -> RbiCurrencyToRateMap:
+    # expected columns: Date, Currency Pairs, Rate
+    currency_to_rate_map: RbiCurrencyToRateMap = {}
+    for _, data in sheet_pd.iterrows():
+        try:
+            pair_match = __CURRENCY_PAIR_PATTERN.match(str(data.get("Currency Pairs")).strip())
+            if pair_match is None:
+                continue
+            units, currency_code = int(pair_match.group(1)), pair_match.group(2)
+            rate_time = datetime.strptime(str(data["Date"]), "%d %b %Y")
+            rate_val = data.get("Rate")
+            # normalize rate
+            if isinstance(rate_val, str):
+                rate_val = float(rate_val.replace(",", ""))
+            __put_rate(
+                currency_to_rate_map.setdefault(currency_code, {}),
+                rate_time,
+                float(rate_val) / units,
+            )
+        except Exception:
+            # skip malformed rows
+            continue
+    return currency_to_rate_map
+
+
+def __read_bankwise_rates(
+    sheet_pd: pd.DataFrame, rbi_rates_file_abs_path: str, currency_code: str
+) -> RbiYearMonthRateMap:
+    currency_rate_map: RbiYearMonthRateMap = {}
+    # find the column matching currency
+    col_map = {c.strip().upper(): c for c in sheet_pd.columns}
+    target_col = None
+    # map common currency codes/names
+    for key in (currency_code.upper(), "USD", "GBP", "EURO", "YEN"):
+        if key in col_map:
+            target_col = col_map[key]
+            break
+    if target_col is None:
+        # try common headers like 'USD'
+        for c in sheet_pd.columns:
+            if currency_code.upper() in c.upper() or c.strip().upper() in (
+                "USD",
+                "GBP",
+                "EURO",
+                "YEN",
+            ):
+                target_col = c
+                break
+    if target_col is None:
+        raise AssertionError(f"No column for currency {currency_code} in {rbi_rates_file_abs_path}")
+
+    for _, data in sheet_pd.iterrows():
+        try:
+            raw_date = data.get("Date") or data.get("date") or data.get(sheet_pd.columns[0])
+            # support dd/mm/YYYY or dd-mm-YYYY or dd/mm/yy
+            parsed = None
+            for fmt in ("%d/%m/%Y", "%d-%m-%Y", "%d/%m/%y", "%d-%b-%Y"):
+                try:
+                    rate_time = datetime.strptime(str(raw_date), fmt)
+                    parsed = True
+                    break
+                except Exception:
+                    continue
+            if not parsed:
+                # try if it's already a datetime
+                if isinstance(raw_date, datetime):
+                    rate_time = raw_date
+                else:
+                    continue
+
+            rate_val = data.get(target_col)
+            if isinstance(rate_val, str):
+                rate_val = float(rate_val.replace(",", "").replace("$", ""))
+            __put_rate(currency_rate_map, rate_time, rate_val)
+        except Exception:
+            continue
+    return currency_rate_map
+
+
+def read_rate_map(rbi_rates_file_abs_path: str, currency_code: str) -> RbiYearMonthRateMap:
+    print(f"Parsing rbi rate for currency code = {currency_code}")
+    with profiler.span("load_rbi_rates"), pd.ExcelFile(
+        rbi_rates_file_abs_path, engine="openpyxl"
+    ) as xl:
+        logger.debug_log(f"Parsing RBI rates from {rbi_rates_file_abs_path}")
+        # if file is the provided rates.xls with a 'Reference Rates' sheet
+        try:
+            sheet_pd = xl.parse(sheet_name="Reference Rates", skiprows=0, header=2)
+        except ValueError:
+            # fallback: some sources provide a simple table like BankWise.xls with
+            # Date,USD,GBP,EURO,YEN
+            return __read_bankwise_rates(
+                xl.parse(sheet_name=0), rbi_rates_file_abs_path, currency_code
+            )
+        return __read_reference_rates(sheet_pd).get(currency_code.upper(), {})
+
+
+def read_rate_table(rbi_rates_file_abs_path: str) -> RbiCurrencyToRateMap:
+    """
+    Rate maps of every currency present in the file, read in a single pass
+    """
+    print("Parsing rbi rates of every currency")
+    with profiler.span("load_rbi_rates"), pd.ExcelFile(
+        rbi_rates_file_abs_path, engine="openpyxl"
+    ) as xl:
+        logger.debug_log(f"Parsing RBI rates from {rbi_rates_file_abs_path}")
+        try:
+            sheet_pd = xl.parse(sheet_name="Reference Rates", skiprows=0, header=2)
+        except ValueError:
+            sheet_pd = xl.parse(sheet_name=0)
+            return {
+                __BANKWISE_CURRENCY_CODES.get(column.strip().upper(), column.strip().upper()): (
+                    __read_bankwise_rates(sheet_pd, rbi_rates_file_abs_path, column.strip())
+                )
+                for column in sheet_pd.columns[1:]
+            }
+        return __read_reference_rates(sheet_pd)
+
+
+def rate_at_month(
+    rbi_year_month_rate_map: RbiYearMonthRateMap, currency_code: str, month: int, year: int
+) -> float:
+    profiler.count("rbi_rate_lookups")
     rate_excel_path = os.path.join("historic_data", "rates", "rbi", "rates.xls")
     if year not in rbi_year_month_rate_map:
         raise ValueError(
@@ -144,9 +197,37 @@ for month {month}/{year}"
     return rbi_month_rate_map[month]["rate"]
 
 
-def get_rate_for_prev_mon_for_time_in_ms(currency_code: str, time_in_ms: int) -> float:
+def rate_for_prev_mon_for_time_in_ms(
+    rbi_year_month_rate_map: RbiYearMonthRateMap, currency_code: str, time_in_ms: int
+) -> float:
     dt = datetime.utcfromtimestamp(time_in_ms / 1000)
     month = dt.month
     year = dt.year
     rate_month, rate_year = (month - 1, year) if month != 1 else (12, year - 1)
-    return get_rate_at_month(currency_code, rate_month, rate_year)
+    return rate_at_month(rbi_year_month_rate_map, currency_code, rate_month, rate_year)
+
+
+def rates_for_prev_mon_for_times_in_ms(
+    rbi_year_month_rate_map: RbiYearMonthRateMap, currency_code: str, times_in_ms: np.ndarray
+) -> np.ndarray:
+    """
+    Bulk version of rate_for_prev_mon_for_time_in_ms, the rate map is only
+    queried once for every distinct month present in times_in_ms
+    """
+    months_since_epoch = (
+        np.asarray(times_in_ms, dtype="int64")
+        .astype("datetime64[ms]")
+        .astype("datetime64[M]")
+        .astype("int64")
+    )
+    unique_months, inverse = np.unique(months_since_epoch - 1, return_inverse=True)
+    unique_rates = np.array(
+        [
+            rate_at_month(
+                rbi_year_month_rate_map, currency_code, int(month % 12) + 1, 1970 + int(month // 12)
+            )
+            for month in unique_months
+        ],
+        dtype=np.float64,
+    )
+    return unique_rates[inverse]
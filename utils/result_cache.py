@@ -0,0 +1,76 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import typing as t
+
+# version of the cached layout, bump it whenever the computation changes so old
+# entries are not reused
+CACHE_VERSION = 1
+
+
+def compute_key(key_parts: t.Dict[str, t.Any]) -> str:
+    """
+    Hashes everything the cached output depends on. key_parts has to be JSON
+    serializable, dataclasses are serialized by their fields
+    """
+    serialized = json.dumps(
+        {"cache_version": CACHE_VERSION, **key_parts},
+        sort_keys=True,
+        ensure_ascii=True,
+        default=vars,
+    )
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+
+def __entry_folder(cache_folder_abs_path: str, key: str) -> str:
+    return os.path.join(cache_folder_abs_path, key[:2], key)
+
+
+def restore(
+    cache_folder_abs_path: t.Optional[str], key: str, output_folder_abs_path: str
+) -> t.Optional[t.List[str]]:
+    """
+    Copies the cached files of key into output_folder_abs_path and returns their
+    paths, returns None on a cache miss
+    """
+    if cache_folder_abs_path is None:
+        return None
+    entry_folder = __entry_folder(cache_folder_abs_path, key)
+    if not os.path.isdir(entry_folder):
+        return None
+    if not os.path.exists(output_folder_abs_path):
+        os.makedirs(output_folder_abs_path)
+    restored_paths = []
+    for file_name in sorted(os.listdir(entry_folder)):
+        restored_path = os.path.join(output_folder_abs_path, file_name)
+        shutil.copyfile(os.path.join(entry_folder, file_name), restored_path)
+        restored_paths.append(restored_path)
+    return restored_paths
+
+
+def store(cache_folder_abs_path: t.Optional[str], key: str, file_abs_paths: t.List[str]):
+    """
+    Saves copies of the files under key. The entry becomes visible atomically so
+    that concurrent runs never restore a partially written entry
+    """
+    if cache_folder_abs_path is None:
+        return
+    entry_folder = __entry_folder(cache_folder_abs_path, key)
+    if os.path.isdir(entry_folder):
+        return
+    parent_folder = os.path.dirname(entry_folder)
+    os.makedirs(parent_folder, exist_ok=True)
+    staging_folder = tempfile.mkdtemp(prefix=f".{key}.", dir=parent_folder)
+    for file_abs_path in file_abs_paths:
+        shutil.copyfile(
+            file_abs_path,
+            os.path.join(staging_folder, os.path.basename(file_abs_path)),
+        )
+    try:
+        os.rename(staging_folder, entry_folder)
+    except OSError:
+        # another run stored the same entry in the meantime
+        shutil.rmtree(staging_folder, ignore_errors=True)
+
@@ -0,0 +1,36 @@
+import typing as t
+from dataclasses import dataclass
+
+from utils import lot_ledger, output_sinks
+from utils.period_snapshot import PeriodSnapshot
+
+
+@dataclass(frozen=True)
+class RunOptions:
+    """
+    Settings of one run(or one request of a service), passed explicitly to the
+    parsers and faa3_parser so that independent datasets computed in the same
+    process can't affect each other
+    """
+
+    # formats in which the tabular outputs(e.g. fa_entries) are written
+    output_formats: t.Tuple[str, ...] = (output_sinks.CSV_FORMAT,)
+    # intermediate artifacts like purchases.json and raw_fa_entries.json are only
+    # useful while debugging, production batches can switch them off
+    write_debug_artifacts: bool = True
+    # folder holding the cached outputs, caching is disabled while it is None
+    cache_folder_abs_path: t.Optional[str] = None
+    # reuse the values stored by the previous run in the output folder and only
+    # compute new or changed lots
+    incremental: bool = False
+    # how sales deplete the purchase lots
+    lot_method: str = lot_ledger.FIFO_METHOD
+    # precomputed market values of the periods
+    snapshot: t.Optional[PeriodSnapshot] = None
+    # debug logs of the parsers and faa3_parser, enabled with logger.debug_context so
+    # the other runs of the same process keep their own
+    debug: bool = False
+
+    def __post_init__(self):
+        # a missing module must fail the run before any output is written
+        output_sinks.validate_formats(self.output_formats)
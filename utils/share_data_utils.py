@@ -2,44 +2,15 @@ from utils.runtime_utils import warn_missing_module
 
 warn_missing_module("pandas")
 import pandas as pd
+import numpy as np
 import os
+import tempfile
 import typing as t
 
-from . import date_utils, logger
-from .ticker_mapping import ticker_currency_info
-from .rates import rbi_rates_utils
-
-
-def __validate_dates(
-    historic_entry_time_in_ms: int,
-    desired_purchase_time_in_ms: int,
-    used_fmv_time_in_ms: int,
-):
-    if historic_entry_time_in_ms > desired_purchase_time_in_ms:
-        raise AssertionError(
-            f"Historical FMV date {date_utils.log_timestamp(historic_entry_time_in_ms)} "
-            + "can NOT be newer than purchase date "
-            + f"= {date_utils.log_timestamp(desired_purchase_time_in_ms)}"
-        )
-    days_diff = (
-        date_utils.last_work_day_in_ms(desired_purchase_time_in_ms)
-        - historic_entry_time_in_ms
-    ) / (24 * 60 * 60 * 1000)
-
-    date_utils.last_work_day_in_ms(desired_purchase_time_in_ms)
-
-    if days_diff > 0:
-        msg = (
-            f"Historical FMV at {date_utils.log_timestamp(desired_purchase_time_in_ms)} "
-            + "was NOT available(maybe due to Public Holiday or weekends) last available data is "
-            + f"{int(days_diff)} days old(on {date_utils.display_time(historic_entry_time_in_ms)})"
-        )
-        logger.log(msg)
-        logger.log(
-            f"Hence using the next available FMV at {date_utils.log_timestamp(used_fmv_time_in_ms)}"
-        )
-        # if days_diff > 2:
-        #     raise Exception(msg)
+from . import date_utils, logger, profiler
+from .data_quality import DataQualityReport
+from .sparse_table import SparseTable
+from .trading_calendar import TradingDayIndex, WEEKEND
 
 
 TimedFmv = t.TypedDict("TimedFmv", {"entry_time_in_millis": int, "fmv": float})
@@ -55,201 +26,300 @@ TimedFmvWithInrRate = t.TypedDict(
 )
 
 
-price_map_cache: t.Dict[str, t.List[TimedFmv]] = {}
+def historic_share_file_path(data_folder_abs_path: str, ticker: str) -> str:
+    return os.path.join(data_folder_abs_path, "shares", ticker.lower(), "data.csv")
 
 
-def __init_map(ticker: str) -> t.List[TimedFmv]:
-    if ticker not in price_map_cache:
-        print(f"Parsing FMV price map for ticker = {ticker}")
-        ticker_price_map: t.List[TimedFmv] = []
-        script_path = os.path.realpath(os.path.dirname(__file__))
-        historic_share_path = os.path.join(
-            script_path,
-            os.pardir,
-            "historic_data",
-            "shares",
-            ticker.lower(),
-            "data.csv",
+def read_price_map(ticker: str, historic_share_path: str) -> t.List[TimedFmv]:
+    print(f"Parsing FMV price map for ticker = {ticker}")
+    ticker_price_map: t.List[TimedFmv] = []
+    if not os.path.exists(historic_share_path):
+        raise AssertionError(
+            f"Historic share data for share {ticker} NOT present at {historic_share_path}"
         )
-        if not os.path.exists(historic_share_path):
-            raise AssertionError(
-                f"Historic share data for share {ticker} NOT present at {historic_share_path}"
-            )
-        df = pd.read_csv(historic_share_path)
+    df = pd.read_csv(historic_share_path)
 
-        # locate columns flexibly (some CSVs use 'Close/Last')
-        date_col = next((c for c in df.columns if c.strip().lower() == "date"), "Date")
-        close_col = next(
-            (c for c in df.columns if "close" in c.strip().lower()),
-            None,
+    # locate columns flexibly (some CSVs use 'Close/Last')
+    date_col = next((c for c in df.columns if c.strip().lower() == "date"), "Date")
+    close_col = next(
+        (c for c in df.columns if "close" in c.strip().lower()),
+        None,
+    )
+    if close_col is None:
+        raise AssertionError(
+            f"No close column found in {historic_share_path}; cols={list(df.columns)}"
         )
-        if close_col is None:
-            raise AssertionError(f"No close column found in {historic_share_path}; cols={list(df.columns)}")
-
-        for _, data in df.iterrows():
-            raw_date = data[date_col]
-            # support common date formats: MM/DD/YYYY, YYYY-MM-DD, and named months
-            parsed = None
-            for parser in (date_utils.parse_mm_dd, date_utils.parse_yyyy_mm_dd, date_utils.parse_named_mon):
-                try:
-                    parsed = parser(str(raw_date))
-                    break
-                except Exception:
-                    continue
-            if parsed is None:
-                raise ValueError(f"Unable to parse date '{raw_date}' in {historic_share_path}")
-
-            entry_time_in_ms = parsed["time_in_millis"]
-
-            # normalize close value: strip $ and commas and convert to float
-            raw_close = data[close_col]
-            if isinstance(raw_close, str):
-                raw_close = raw_close.strip().replace("$", "").replace(",", "")
+
+    for _, data in df.iterrows():
+        raw_date = data[date_col]
+        # support common date formats: MM/DD/YYYY, YYYY-MM-DD, and named months
+        parsed = None
+        for parser in (
+            date_utils.parse_mm_dd,
+            date_utils.parse_yyyy_mm_dd,
+            date_utils.parse_named_mon,
+        ):
             try:
-                fmv = float(raw_close)
+                parsed = parser(str(raw_date))
+                break
             except Exception:
-                raise ValueError(f"Unable to parse close value '{data[close_col]}' for date {raw_date}")
+                continue
+        if parsed is None:
+            raise ValueError(f"Unable to parse date '{raw_date}' in {historic_share_path}")
 
-            ticker_price_map.append({"entry_time_in_millis": entry_time_in_ms, "fmv": fmv})
+        entry_time_in_ms = parsed["time_in_millis"]
 
-        price_map_cache[ticker] = ticker_price_map
+        # normalize close value: strip $ and commas and convert to float
+        raw_close = data[close_col]
+        if isinstance(raw_close, str):
+            raw_close = raw_close.strip().replace("$", "").replace(",", "")
+        try:
+            fmv = float(raw_close)
+        except Exception:
+            raise ValueError(f"Unable to parse close value '{data[close_col]}' for date {raw_date}")
 
-    return price_map_cache[ticker]
+        ticker_price_map.append({"entry_time_in_millis": entry_time_in_ms, "fmv": fmv})
 
+    return ticker_price_map
 
-def get_fmv(ticker: str, purchase_time_in_ms: int) -> float:
-    logger.debug_log(
-        f"{ticker}: Querying FMV at {date_utils.display_time(purchase_time_in_ms)}"
+
+PriceSeries = t.Tuple[np.ndarray, np.ndarray]
+
+
+def to_price_series(price_map: t.List[TimedFmv]) -> PriceSeries:
+    """
+    Returns (entry times in ms, fmv) arrays of the price map sorted in ascending
+    time order. CSVs may be newest-first, so this is the order every lookup relies on
+    """
+    times_in_ms = np.fromiter(
+        (price["entry_time_in_millis"] for price in price_map),
+        dtype=np.int64,
+        count=len(price_map),
     )
-    previous_entry_data = None
-    # Ensure we iterate the price map in ascending time order so that
-    # `previous_entry_data` semantically represents the last available
-    # historical price before `purchase_time_in_ms`. CSVs may be newest-first
-    # which would break the previous logic.
-    for entry_data in sorted(__init_map(ticker), key=lambda e: e["entry_time_in_millis"]):
-        entry_time_in_ms = entry_data["entry_time_in_millis"]
-        if entry_time_in_ms >= purchase_time_in_ms:
-            if entry_time_in_ms > purchase_time_in_ms:
-                # if there's no previous entry, can't validate; return nearest available FMV
-                if previous_entry_data is None:
-                    return entry_data["fmv"]
-                previous_entry_time_in_ms = previous_entry_data["entry_time_in_millis"]
-                __validate_dates(
-                    previous_entry_time_in_ms, purchase_time_in_ms, entry_time_in_ms
-                )
-                return entry_data["fmv"]
-            return entry_data["fmv"]
-
-        previous_entry_data = entry_data
-    ticker_share_price = os.path.join("historic_data", "shares", ticker, "data.csv")
-    raise AssertionError(
-        f"No FMV data for share ticker {ticker} in {ticker_share_price} for date "
-        + f"{date_utils.log_timestamp(purchase_time_in_ms)}"
+    fmv = np.fromiter(
+        (price["fmv"] for price in price_map), dtype=np.float64, count=len(price_map)
     )
+    order = np.argsort(times_in_ms, kind="stable")
+    return times_in_ms[order], fmv[order]
 
 
-def get_closing_price(ticker: str, end_time_in_ms: int) -> float:
-    price_map = list(
-        filter(
-            lambda price: price["entry_time_in_millis"] <= end_time_in_ms,
-            sorted(
-                __init_map(ticker),
-                key=lambda price: price["entry_time_in_millis"],
-                reverse=True,
-            ),
-        )
+def write_compiled_series(file_abs_path: str, price_series: PriceSeries):
+    """
+    Stores the price series as a .npz file, replaced atomically so concurrent
+    processes never read a partial one
+    """
+    os.makedirs(os.path.dirname(file_abs_path), exist_ok=True)
+    times_in_ms, fmv = price_series
+    file_descriptor, temp_file_abs_path = tempfile.mkstemp(
+        dir=os.path.dirname(file_abs_path), suffix=".tmp"
     )
+    try:
+        with os.fdopen(file_descriptor, "wb") as f:
+            np.savez(f, times_in_ms=times_in_ms, fmv=fmv)
+        os.replace(temp_file_abs_path, file_abs_path)
+    except BaseException:
+        if os.path.exists(temp_file_abs_path):
+            os.remove(temp_file_abs_path)
+        raise
+
+
+def read_compiled_series(file_abs_path: str) -> PriceSeries:
+    with np.load(file_abs_path) as compiled:
+        return compiled["times_in_ms"], compiled["fmv"]
+
+
+def fmv_at(
+    ticker: str,
+    price_series: PriceSeries,
+    trading_days: TradingDayIndex,
+    purchase_time_in_ms: int,
+    data_quality: t.Optional[DataQualityReport] = None,
+) -> float:
+    """
+    FMV of the first historical entry on or after the purchase time, a purchase on
+    a market holiday or data gap is recorded in data_quality
+    """
+    logger.debug_log(
+        f"{ticker}: Querying FMV at {date_utils.display_time(purchase_time_in_ms)}"
+    )
+    profiler.count("fmv_lookups")
+    times_in_ms, fmv = price_series
+    index = trading_days.next_entry_index(purchase_time_in_ms)
+    # a purchase later in the day than the entry of that day
+    if index < len(times_in_ms) and times_in_ms[index] < purchase_time_in_ms:
+        index += 1
+    if index == len(times_in_ms):
+        raise AssertionError(
+            f"No FMV data for share ticker {ticker} for date "
+            + f"{date_utils.log_timestamp(purchase_time_in_ms)}"
+        )
+    entry_time_in_ms = int(times_in_ms[index])
+    # if there's no previous entry, the day can't be classified
+    if entry_time_in_ms > purchase_time_in_ms and index > 0 and data_quality is not None:
+        kind = trading_days.kind_of(purchase_time_in_ms)
+        if kind != WEEKEND:
+            data_quality.record_fallback(ticker, kind, purchase_time_in_ms, entry_time_in_ms)
+    return float(fmv[index])
 
-    return price_map[0]["fmv"]
+
+def closing_price_at(
+    ticker: str, price_series: PriceSeries, trading_days: TradingDayIndex, end_time_in_ms: int
+) -> float:
+    profiler.count("closing_price_lookups")
+    _, fmv = price_series
+    # last historical entry on or before the end time
+    index = trading_days.previous_entry_index(end_time_in_ms)
+    if index < 0:
+        raise AssertionError(
+            f"No closing price for ticker={ticker} on or before "
+            + f"{date_utils.display_time(end_time_in_ms)}"
+        )
+    return float(fmv[index])
 
 
-def get_peak_price_in_inr(
-    ticker: str, start_time_in_ms: int, end_time_in_ms: int
+def peak_fmv(
+    ticker: str, price_series: PriceSeries, start_time_in_ms: int, end_time_in_ms: int
 ) -> float:
+    """Return peak FMV in the share's currency (USD) between start and end (inclusive).
+
+    This mirrors the filtering used by InrSeries but returns the USD FMV without
+    converting to INR. Caller can decide which FX rate to apply.
+    """
     if start_time_in_ms > end_time_in_ms:
         raise AssertionError(
             f"start_time_in_ms = {start_time_in_ms} is greater "
             + f"than equal to end_time_in_ms = {end_time_in_ms}"
         )
 
-    # filter and sort ascending (older -> newer) so per-day INR calculations are consistent
-    price_map = [
-        p
-        for p in sorted(__init_map(ticker), key=lambda price: price["entry_time_in_millis"])
-        if p["entry_time_in_millis"] >= start_time_in_ms and p["entry_time_in_millis"] <= end_time_in_ms
-    ]
-
-    if not price_map:
+    times_in_ms, fmv = price_series
+    start_index = int(np.searchsorted(times_in_ms, start_time_in_ms, side="left"))
+    end_index = int(np.searchsorted(times_in_ms, end_time_in_ms, side="right"))
+    if start_index >= end_index:
         raise AssertionError(
-            f"No price data for ticker={ticker} between {date_utils.display_time(start_time_in_ms)} and {date_utils.display_time(end_time_in_ms)}"
+            f"No price data for ticker={ticker} between "
+            + f"{date_utils.display_time(start_time_in_ms)} and "
+            + f"{date_utils.display_time(end_time_in_ms)}"
         )
 
-    # build list of per-day values with INR conversion applied per-day
-    enriched = []
-    for price in price_map:
-        inr_rate = rbi_rates_utils.get_rate_for_prev_mon_for_time_in_ms(
-            ticker_currency_info[ticker], price["entry_time_in_millis"]
-        )
-        enriched.append({
-            **price,
-            "inr_rate": inr_rate,
-            "effective_inr": price["fmv"] * inr_rate,
-        })
+    return float(fmv[start_index:end_index].max())
 
-    # debug output: full per-day breakdown
-    logger.debug_log_json(
-        {
-            "ticker": ticker,
-            "start_time": date_utils.display_time(start_time_in_ms),
-            "end_time": date_utils.display_time(end_time_in_ms),
-            "per_day": [
-                {
-                    "date": date_utils.display_time(p["entry_time_in_millis"]),
-                    "fmv_usd": p["fmv"],
-                    "inr_rate": p["inr_rate"],
-                    "effective_inr": p["effective_inr"],
-                }
-                for p in enriched
-            ],
+
+class InrSeries:
+    """
+    Per-day FMV of a ticker converted to INR(with the previous month's RBI rate of
+    each day) for all the days within time_ranges. Peak queries over any sub range
+    of one of those ranges are O(1), so a single instance can be shared by every
+    lot and every reporting period of the ticker
+    """
+
+    @profiler.profiled("build_inr_series")
+    def __init__(
+        self,
+        ticker: str,
+        time_ranges: t.List[t.Tuple[int, int]],
+        price_series: PriceSeries,
+        inr_rates_of_times: t.Callable[[np.ndarray], np.ndarray],
+    ):
+        times_in_ms, fmv = price_series
+        in_range = np.zeros(len(times_in_ms), dtype=bool)
+        for start_time_in_ms, end_time_in_ms in time_ranges:
+            in_range |= (times_in_ms >= start_time_in_ms) & (
+                times_in_ms <= end_time_in_ms
+            )
+        self.ticker = ticker
+        self.time_ranges = list(time_ranges)
+        self.times_in_ms = times_in_ms[in_range]
+        self.fmv = fmv[in_range]
+        # the previous month's RBI rate of every day
+        self.inr_rate = (
+            inr_rates_of_times(self.times_in_ms)
+            if len(self.times_in_ms) > 0
+            else np.zeros(0, dtype=np.float64)
+        )
+        self.effective_inr = self.fmv * self.inr_rate
+        self.__peak_index = SparseTable(self.effective_inr)
+
+    def peak(self, start_time_in_ms: int, end_time_in_ms: int) -> TimedFmvWithInrRate:
+        """
+        Returns the day with the highest FMV * INR rate between start and end(inclusive)
+        """
+        profiler.count("peak_lookups")
+        if start_time_in_ms > end_time_in_ms:
+            raise AssertionError(
+                f"start_time_in_ms = {start_time_in_ms} is greater "
+                + f"than equal to end_time_in_ms = {end_time_in_ms}"
+            )
+        if not any(
+            range_start <= start_time_in_ms and end_time_in_ms <= range_end
+            for range_start, range_end in self.time_ranges
+        ):
+            raise AssertionError(
+                f"Range {date_utils.display_time(start_time_in_ms)} to "
+                + f"{date_utils.display_time(end_time_in_ms)} is outside of the "
+                + f"ranges loaded for ticker={self.ticker}"
+            )
+        start_index = int(np.searchsorted(self.times_in_ms, start_time_in_ms, side="left"))
+        end_index = int(np.searchsorted(self.times_in_ms, end_time_in_ms, side="right")) - 1
+        if start_index > end_index:
+            raise AssertionError(
+                f"No price data for ticker={self.ticker} between "
+                + f"{date_utils.display_time(start_time_in_ms)} and "
+                + f"{date_utils.display_time(end_time_in_ms)}"
+            )
+        index = self.__peak_index.argmax(start_index, end_index)
+        return {
+            "entry_time_in_millis": int(self.times_in_ms[index]),
+            "fmv": float(self.fmv[index]),
+            "inr_rate": float(self.inr_rate[index]),
         }
-    )
 
-    # pick the day with highest effective_inr
-    max_value = max(enriched, key=lambda p: p["effective_inr"])
-    peak_price_in_inr = max_value["effective_inr"]
+    def peak_price_in_inr(self, start_time_in_ms: int, end_time_in_ms: int) -> float:
+        return peak_price_in_inr(
+            self.ticker,
+            start_time_in_ms,
+            end_time_in_ms,
+            self.peak(start_time_in_ms, end_time_in_ms),
+        )
+
 
+def peak_price_in_inr(
+    ticker: str, start_time_in_ms: int, end_time_in_ms: int, max_value: TimedFmvWithInrRate
+) -> float:
+    peak_price_in_inr = max_value["fmv"] * max_value["inr_rate"]
     logger.log(
         f"Peak price for ticker = {ticker} from {date_utils.display_time(start_time_in_ms)} "
         + f"to {date_utils.display_time(end_time_in_ms)} is {peak_price_in_inr} "
-        + f"INR (USD {max_value['fmv']} on {date_utils.display_time(max_value['entry_time_in_millis'])} at rate {max_value['inr_rate']})"
+        + f"INR (USD {max_value['fmv']} on "
+        + f"{date_utils.display_time(max_value['entry_time_in_millis'])} at rate "
+        + f"{max_value['inr_rate']})"
     )
-
     return peak_price_in_inr
 
 
-def get_peak_fmv(ticker: str, start_time_in_ms: int, end_time_in_ms: int) -> float:
-    """Return peak FMV in the share's currency (USD) between start and end (inclusive).
-
-    This mirrors the filtering used in get_peak_price_in_inr but returns the USD FMV
-    without converting to INR. Caller can decide which FX rate to apply.
+def debug_log_inr_series(inr_series: InrSeries, start_time_in_ms: int, end_time_in_ms: int):
     """
-    if start_time_in_ms > end_time_in_ms:
-        raise AssertionError(
-            f"start_time_in_ms = {start_time_in_ms} is greater "
-            + f"than equal to end_time_in_ms = {end_time_in_ms}"
-        )
-
-    price_map = list(
-        filter(
-            lambda price: price["entry_time_in_millis"] <= end_time_in_ms
-            and price["entry_time_in_millis"] >= start_time_in_ms,
-            sorted(__init_map(ticker), key=lambda price: price["entry_time_in_millis"], reverse=True),
-        )
+    Full per-day breakdown of the INR series between start and end
+    """
+    if not logger.is_debug():
+        return
+    logger.debug_log_json(
+        {
+            "ticker": inr_series.ticker,
+            "start_time": date_utils.display_time(start_time_in_ms),
+            "end_time": date_utils.display_time(end_time_in_ms),
+            "per_day": [
+                {
+                    "date": date_utils.display_time(int(time_in_ms)),
+                    "fmv_usd": float(fmv),
+                    "inr_rate": float(inr_rate),
+                    "effective_inr": float(effective_inr),
+                }
+                for time_in_ms, fmv, inr_rate, effective_inr in zip(
+                    inr_series.times_in_ms,
+                    inr_series.fmv,
+                    inr_series.inr_rate,
+                    inr_series.effective_inr,
+                )
+            ],
+        }
     )
-    if not price_map:
-        raise AssertionError(
-            f"No price data for ticker={ticker} between {date_utils.display_time(start_time_in_ms)} and {date_utils.display_time(end_time_in_ms)}"
-        )
-
-    max_value = max(price_map, key=lambda price: price["fmv"])
-    return max_value["fmv"]
@@ -0,0 +1,42 @@
+import typing as t
+
+import numpy as np
+
+
+class SparseTable:
+    """
+    Range arg-max index over a static array. Building takes O(n log n) and every
+    query afterwards is O(1), so the same table can answer the peak of many
+    overlapping date ranges. On ties the first(oldest) index is returned, which
+    matches the behaviour of python's max() over the same values
+    """
+
+    def __init__(self, values: np.ndarray):
+        self.values = np.asarray(values, dtype=np.float64)
+        levels: t.List[np.ndarray] = [np.arange(len(self.values))]
+        width = 1
+        while width * 2 <= len(self.values):
+            previous = levels[-1]
+            left = previous[: len(previous) - width]
+            right = previous[width:]
+            levels.append(
+                np.where(self.values[right] > self.values[left], right, left)
+            )
+            width *= 2
+        self.__levels = levels
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def argmax(self, start_index: int, end_index: int) -> int:
+        """
+        Index of the max value within [start_index, end_index], both inclusive
+        """
+        if start_index > end_index or start_index < 0 or end_index >= len(self.values):
+            raise AssertionError(
+                f"Invalid range [{start_index}, {end_index}] for {len(self.values)} values"
+            )
+        level = (end_index - start_index + 1).bit_length() - 1
+        left = int(self.__levels[level][start_index])
+        right = int(self.__levels[level][end_index - (1 << level) + 1])
+        return right if self.values[right] > self.values[left] else left
@@ -1,89 +1,146 @@
+import csv
+import os
+import threading
 import typing as t
+from collections.abc import Mapping
+from dataclasses import dataclass
 
 from models.org import Organization
 
-ticker_org_info: t.Dict[str, Organization] = {
-    "adbe": Organization(
-        name="Adobe Incorporation",
-        address="345 Park Avenue San Jose, CA",
-        country_name="2 - United States",
-        zip_code="95110",
-        nature="Listed",
-    ),
-    "ntnx": Organization(
-        name="Nutanix, Inc.",
-        address="1740 Technology Drive San Jose, CA",
-        country_name="2 - United States",
-        zip_code="95110",
-        nature="Listed",
-    ),
-    "goog": Organization(
-        name="Alphabet Inc.",
-        address="1600 Amphitheatre Parkway Mountain View, CA",
-        country_name="2 - United States",
-        zip_code="94043",
-        nature="Listed",
-    ),
-    "msft": Organization(
-        name="Microsoft Corporation",
-        address="One Microsoft Way Redmond, WA",
-        country_name="2 - United States",
-        zip_code="98052",
-        nature="Listed",
-    ),
-    "crm": Organization(
-        name="Salesforce.com, Inc.",
-        address="415 Mission Street San Francisco, CA",
-        country_name="2 - United States",
-        zip_code="94105",
-        nature="Listed",
-    ),
-    "amzn": Organization(
-        name="Amazon.com, Inc.",
-        address="410 Terry Avenue North Seattle, WA",
-        country_name="2 - United States",
-        zip_code="98109",
-        nature="Listed",
-    ),
-    "meta": Organization(
-        name="Meta Platforms, Inc.",
-        address="1 Hacker Way Menlo Park, CA",
-        country_name="2 - United States",
-        zip_code="94025",
-        nature="Listed",
-    ),
-    "tsla": Organization(
-        name="Tesla, Inc.",
-        address="1 Tesla Road Austin, TX",
-        country_name="2 - United States",
-        zip_code="78725",
-        nature="Listed",
-    ),
-    "nvda": Organization(
-        name="NVIDIA Corporation",
-        address="2788 San Tomas Expressway Santa Clara, CA",
-        country_name="2 - United States",
-        zip_code="95051",
-        nature="Listed",
-    ),
-    "aapl": Organization(
-        name="Apple Inc.",
-        address="One Apple Park Way Cupertino, CA",
-        country_name="2 - United States",
-        zip_code="95014",
-        nature="Listed",
-    ),
-}
-
-ticker_currency_info: t.Dict[str, str] = {
-    "adbe": "USD",
-    "ntnx": "USD",
-    "goog": "USD",
-    "msft": "USD",
-    "crm": "USD",
-    "amzn": "USD",
-    "meta": "USD",
-    "tsla": "USD",
-    "nvda": "USD",
-    "aapl": "USD",
-}
+DEFAULT_REGISTRY_FILE_ABS_PATH = os.path.join(
+    os.path.realpath(os.path.dirname(__file__)), "tickers.csv"
+)
+REGISTRY_COLUMNS = [
+    "ticker",
+    "name",
+    "address",
+    "country_code",
+    "country_name",
+    "zip_code",
+    "nature",
+    "currency",
+]
+
+
+@dataclass
+class TickerInfo:
+    org: Organization
+    currency: str
+
+
+# the rows of later files override the ones of earlier files, e.g. a file with the
+# companies onboarded this season on top of the checked in tickers.csv
+__registry_file_abs_paths: t.List[str] = [DEFAULT_REGISTRY_FILE_ABS_PATH]
+__registry: t.Optional[t.Dict[str, TickerInfo]] = None
+__lock = threading.Lock()
+
+
+def set_registry_files(registry_file_abs_paths: t.List[str]):
+    """
+    Selects the registry files, they are read on the next lookup
+    """
+    global __registry_file_abs_paths, __registry
+    with __lock:
+        __registry_file_abs_paths = list(registry_file_abs_paths)
+        __registry = None
+
+
+def registry_files() -> t.List[str]:
+    return list(__registry_file_abs_paths)
+
+
+def read_registry(registry_file_abs_path: str) -> t.Dict[str, TickerInfo]:
+    if not os.path.exists(registry_file_abs_path):
+        raise AssertionError(f"Ticker registry {registry_file_abs_path} is NOT present")
+    tickers: t.Dict[str, TickerInfo] = {}
+    with open(registry_file_abs_path, newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        missing_columns = [
+            column for column in REGISTRY_COLUMNS if column not in (reader.fieldnames or [])
+        ]
+        if missing_columns:
+            raise AssertionError(
+                f"Ticker registry {registry_file_abs_path} lacks the columns {missing_columns}"
+            )
+        for row in reader:
+            tickers[row["ticker"].strip().lower()] = TickerInfo(
+                Organization(
+                    country_name=f"{row['country_code'].strip()} - {row['country_name'].strip()}",
+                    name=row["name"].strip(),
+                    address=row["address"].strip(),
+                    nature=row["nature"].strip(),
+                    zip_code=row["zip_code"].strip(),
+                ),
+                row["currency"].strip().upper(),
+            )
+    return tickers
+
+
+def registry() -> t.Dict[str, TickerInfo]:
+    """
+    Every registered ticker, the files are read once on the first lookup
+    """
+    global __registry
+    current_registry = __registry
+    if current_registry is not None:
+        return current_registry
+    with __lock:
+        if __registry is None:
+            merged: t.Dict[str, TickerInfo] = {}
+            for registry_file_abs_path in __registry_file_abs_paths:
+                merged.update(read_registry(registry_file_abs_path))
+            __registry = merged
+        return __registry
+
+
+def unknown_tickers(tickers: t.Iterable[str]) -> t.List[str]:
+    known = registry()
+    # empty cells of the sheets are read as NaN
+    return sorted(
+        {
+            ticker.strip().lower()
+            for ticker in tickers
+            if isinstance(ticker, str) and ticker.strip().lower() not in known
+        }
+    )
+
+
+def validate_tickers(tickers: t.Iterable[str], source: str):
+    """
+    Raises a single error listing every ticker of source missing in the registry,
+    before anything is looked up for them
+    """
+    unknown = unknown_tickers(tickers)
+    if unknown:
+        raise AssertionError(
+            f"Tickers {unknown} of {source} are not present in the ticker registry "
+            + f"{registry_files()}, add a row for each of them(columns {REGISTRY_COLUMNS})"
+        )
+
+
+class RegistryView(Mapping):
+    """
+    Read only ticker -> value view of the registry
+    """
+
+    def __init__(self, value_of: t.Callable[[TickerInfo], t.Any]):
+        self.value_of = value_of
+
+    def __getitem__(self, ticker: str) -> t.Any:
+        ticker_info = registry().get(ticker)
+        if ticker_info is None:
+            raise KeyError(
+                f"Ticker {ticker} is not present in the ticker registry {registry_files()}"
+            )
+        return self.value_of(ticker_info)
+
+    def __iter__(self) -> t.Iterator[str]:
+        return iter(registry())
+
+    def __len__(self) -> int:
+        return len(registry())
+
+
+ticker_org_info: t.Mapping[str, Organization] = RegistryView(lambda ticker_info: ticker_info.org)
+
+ticker_currency_info: t.Mapping[str, str] = RegistryView(lambda ticker_info: ticker_info.currency)
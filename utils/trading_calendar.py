@@ -0,0 +1,212 @@
+import datetime
+import functools
+import typing as t
+
+import numpy as np
+
+from . import date_utils
+
+TRADING_DAY = "trading"
+WEEKEND = "weekend"
+MARKET_HOLIDAY = "market_holiday"
+DATA_GAP = "data_gap"
+OUT_OF_RANGE = "out_of_range"
+
+# day kinds as stored in TradingDayIndex.day_kinds
+DAY_KINDS = [TRADING_DAY, WEEKEND, MARKET_HOLIDAY, DATA_GAP]
+
+# closures of the NYSE outside of its regular holidays
+NYSE_SPECIAL_CLOSURES = {
+    datetime.date(1985, 9, 27),  # Hurricane Gloria
+    datetime.date(1994, 4, 27),  # National Day of Mourning, Richard Nixon
+    datetime.date(2001, 9, 11),  # September 11 attacks
+    datetime.date(2001, 9, 12),
+    datetime.date(2001, 9, 13),
+    datetime.date(2001, 9, 14),
+    datetime.date(2004, 6, 11),  # National Day of Mourning, Ronald Reagan
+    datetime.date(2007, 1, 2),  # National Day of Mourning, Gerald Ford
+    datetime.date(2012, 10, 29),  # Hurricane Sandy
+    datetime.date(2012, 10, 30),
+    datetime.date(2018, 12, 5),  # National Day of Mourning, George H. W. Bush
+    datetime.date(2025, 1, 9),  # National Day of Mourning, Jimmy Carter
+}
+
+DataGap = t.TypedDict(
+    "DataGap",
+    {
+        # last and next day with prices around the gap
+        "after": str,
+        "before": str,
+        "missing_days": int,
+    },
+)
+
+
+def __nth_weekday(year: int, month: int, weekday: int, n: int) -> datetime.date:
+    first_day = datetime.date(year, month, 1)
+    return first_day + datetime.timedelta(days=(weekday - first_day.weekday()) % 7 + 7 * (n - 1))
+
+
+def __last_weekday(year: int, month: int, weekday: int) -> datetime.date:
+    next_month = datetime.date(year + month // 12, month % 12 + 1, 1)
+    last_day = next_month - datetime.timedelta(days=1)
+    return last_day - datetime.timedelta(days=(last_day.weekday() - weekday) % 7)
+
+
+def __easter(year: int) -> datetime.date:
+    # anonymous Gregorian algorithm
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return datetime.date(year, month, day + 1)
+
+
+def __observed(day: datetime.date) -> datetime.date:
+    if day.weekday() == 5:
+        return day - datetime.timedelta(days=1)
+    if day.weekday() == 6:
+        return day + datetime.timedelta(days=1)
+    return day
+
+
+@functools.lru_cache(maxsize=None)
+def nyse_holidays(year: int) -> t.FrozenSet[datetime.date]:
+    """
+    Full day closures of the NYSE in year, by its current holiday rules
+    """
+    holidays = {
+        __nth_weekday(year, 1, 0, 3),  # Martin Luther King Jr. Day
+        __nth_weekday(year, 2, 0, 3),  # Washington's Birthday
+        __easter(year) - datetime.timedelta(days=2),  # Good Friday
+        __last_weekday(year, 5, 0),  # Memorial Day
+        __observed(datetime.date(year, 7, 4)),
+        __nth_weekday(year, 9, 0, 1),  # Labor Day
+        __nth_weekday(year, 11, 3, 4),  # Thanksgiving
+        __observed(datetime.date(year, 12, 25)),
+    }
+    # not moved to the Friday before when on a Saturday
+    new_year = datetime.date(year, 1, 1)
+    if new_year.weekday() != 5:
+        holidays.add(__observed(new_year))
+    if year >= 2022:
+        holidays.add(__observed(datetime.date(year, 6, 19)))  # Juneteenth
+    holidays.update(day for day in NYSE_SPECIAL_CLOSURES if day.year == year)
+    return frozenset(holidays)
+
+
+def market_holidays(currency_code: str, year: int) -> t.FrozenSet[datetime.date]:
+    """
+    Holidays of the exchange the shares of currency_code trade on, only the US
+    exchanges are known, others only close on weekends
+    """
+    return nyse_holidays(year) if currency_code == "USD" else frozenset()
+
+
+def epoch_day(day: datetime.date) -> int:
+    return (day - datetime.date(1970, 1, 1)).days
+
+
+class TradingDayIndex:
+    """
+    Every calendar day between the first and the last price of a ticker, each
+    classified as a trading day(with a price), weekend, market holiday or data gap
+    and mapped to the previous and next day with a price, so those lookups are O(1)
+    """
+
+    def __init__(self, times_in_ms: np.ndarray, currency_code: str):
+        days = np.asarray(times_in_ms, dtype=np.int64) // date_utils.ONE_DAY_IN_MS
+        self.entry_count = len(days)
+        self.first_day = int(days[0]) if len(days) else 0
+        day_count = int(days[-1]) - self.first_day + 1 if len(days) else 0
+        all_days = self.first_day + np.arange(day_count, dtype=np.int64)
+        # entry index of the first price on or after / last price on or before each day
+        self.next_entry = np.searchsorted(days, all_days, side="left").astype(np.int32)
+        self.previous_entry = (np.searchsorted(days, all_days, side="right") - 1).astype(np.int32)
+
+        has_price = np.zeros(day_count, dtype=bool)
+        has_price[days - self.first_day] = True
+        # 1970-01-01 was a Thursday
+        is_weekend = (all_days + 3) % 7 >= 5
+        is_holiday = np.zeros(day_count, dtype=bool)
+        if day_count:
+            first_date = datetime.date(1970, 1, 1) + datetime.timedelta(days=self.first_day)
+            last_date = first_date + datetime.timedelta(days=day_count - 1)
+            for year in range(first_date.year, last_date.year + 1):
+                for holiday in market_holidays(currency_code, year):
+                    offset = epoch_day(holiday) - self.first_day
+                    if 0 <= offset < day_count:
+                        is_holiday[offset] = True
+        self.day_kinds = np.select(
+            [has_price, is_weekend, is_holiday],
+            [
+                DAY_KINDS.index(TRADING_DAY),
+                DAY_KINDS.index(WEEKEND),
+                DAY_KINDS.index(MARKET_HOLIDAY),
+            ],
+            default=DAY_KINDS.index(DATA_GAP),
+        ).astype(np.int8)
+        self.gaps = self.__find_gaps(days)
+
+    def __find_gaps(self, days: np.ndarray) -> t.List[DataGap]:
+        gaps: t.List[DataGap] = []
+        data_gap_kind = DAY_KINDS.index(DATA_GAP)
+        for index in np.nonzero(np.diff(days) > 1)[0]:
+            start, end = int(days[index]), int(days[index + 1])
+            missing_days = int(
+                np.count_nonzero(
+                    self.day_kinds[start - self.first_day + 1 : end - self.first_day]
+                    == data_gap_kind
+                )
+            )
+            if missing_days:
+                gaps.append(
+                    {
+                        "after": date_utils.display_time(start * date_utils.ONE_DAY_IN_MS),
+                        "before": date_utils.display_time(end * date_utils.ONE_DAY_IN_MS),
+                        "missing_days": missing_days,
+                    }
+                )
+        return gaps
+
+    def nbytes(self) -> int:
+        return self.next_entry.nbytes + self.previous_entry.nbytes + self.day_kinds.nbytes
+
+    def __offset(self, time_in_ms: int) -> int:
+        return time_in_ms // date_utils.ONE_DAY_IN_MS - self.first_day
+
+    def next_entry_index(self, time_in_ms: int) -> int:
+        """
+        Index of the first price on or after the day of time_in_ms, entry_count
+        when there is none
+        """
+        offset = self.__offset(time_in_ms)
+        if offset < 0:
+            return 0
+        if offset >= len(self.next_entry):
+            return self.entry_count
+        return int(self.next_entry[offset])
+
+    def previous_entry_index(self, time_in_ms: int) -> int:
+        """
+        Index of the last price on or before the day of time_in_ms, -1 when there
+        is none
+        """
+        offset = self.__offset(time_in_ms)
+        if offset < 0:
+            return -1
+        if offset >= len(self.previous_entry):
+            return self.entry_count - 1
+        return int(self.previous_entry[offset])
+
+    def kind_of(self, time_in_ms: int) -> str:
+        offset = self.__offset(time_in_ms)
+        if offset < 0 or offset >= len(self.day_kinds):
+            return OUT_OF_RANGE
+        return DAY_KINDS[self.day_kinds[offset]]